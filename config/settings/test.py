@@ -1,6 +1,7 @@
 """
 With these settings, tests run faster.
 """
+import tempfile
 
 from .base import *  # noqa
 from .base import env
@@ -26,5 +27,11 @@ PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
+# MEDIA
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#media-root
+# files saved by the tests (PidProviderBadRequest, etc) are not written to core/media
+MEDIA_ROOT = tempfile.mkdtemp(prefix="core_media_")
+
 # Your stuff...
 # ------------------------------------------------------------------------------
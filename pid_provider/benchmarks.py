@@ -0,0 +1,747 @@
+"""
+Benchmarks do pid_provider
+
+Executados por `python manage.py pid_provider_benchmark <name>`
+"""
+import os
+import gc
+import statistics
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from packtools.sps.models.article_doi_with_lang import DoiWithLang
+from packtools.sps.models.article_titles import ArticleTitles
+from packtools.sps.models.dates import ArticleDates
+from packtools.sps.models.front_articlemeta_issue import ArticleMetaIssue
+from packtools.sps.models.front_journal_meta import ISSN
+from packtools.sps.models.related_articles import RelatedItems
+
+from pid_provider import xml_sps_adapter
+from pid_provider.controller import PidProvider
+from pid_provider.models import (
+    PidProviderXML,
+    V2Sequence,
+    XMLIssue,
+    XMLJournal,
+    XMLVersion,
+    _execute_in_autocommit,
+)
+from xmlsps import xml_sps_lib
+from xmlsps.xml_sps_metadata import extract_metadata
+
+User = get_user_model()
+
+# prefixo fictício (ISSN 0000-0000, ano 9999), removido após a execução
+BENCHMARK_ISSN = "0000-0000"
+BENCHMARK_YEAR = "9999"
+BENCHMARK_V2_PREFIX = f"S{BENCHMARK_ISSN}{BENCHMARK_YEAR}"
+
+# casos do benchmark de registro (registration)
+NEW = "new"  # documentos ainda não registrados
+UNCHANGED = "unchanged"  # documentos registrados, sem alteração
+UPDATED = "updated"  # documentos registrados, com alteração do conteúdo
+AOP_TO_ISSUE = "aop_to_issue"  # documentos registrados como AOP, publicados
+REGISTRATION_CASES = (NEW, UNCHANGED, UPDATED, AOP_TO_ISSUE)
+
+
+def _run_concurrently(func, workers):
+    """
+    Executa `func(worker_index)` em `workers` threads simultâneas
+
+    Returns
+    -------
+    tuple (list of results, elapsed seconds)
+    """
+
+    def _run(index):
+        try:
+            return func(index)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_run, range(workers)))
+    return results, time.perf_counter() - start
+
+
+def v2_allocation(registrants=8, allocations=200, batch_size=1):
+    """
+    Mede a vazão de V2Sequence.allocate com `registrants` registradores
+    concorrentes, cada um alocando `allocations` v2 em lotes de `batch_size`
+
+    Returns
+    -------
+    dict
+    """
+
+    def _allocate(index):
+        allocated = []
+        while len(allocated) < allocations:
+            allocated.extend(
+                V2Sequence.allocate(
+                    BENCHMARK_V2_PREFIX, min(batch_size, allocations - len(allocated))
+                )
+            )
+        return allocated
+
+    try:
+        results, elapsed = _run_concurrently(_allocate, registrants)
+    finally:
+        _execute_in_autocommit(
+            f"DELETE FROM {V2Sequence._meta.db_table} WHERE prefix = %s",
+            [BENCHMARK_V2_PREFIX],
+        )
+
+    allocated = [v2 for result in results for v2 in result]
+    return dict(
+        name="v2_allocation",
+        registrants=registrants,
+        allocations=allocations,
+        batch_size=batch_size,
+        total=len(allocated),
+        duplicated=len(allocated) - len(set(allocated)),
+        elapsed=elapsed,
+        per_second=len(allocated) / elapsed,
+    )
+
+
+def xml_parsing(zip_xml_file_path, workers=None):
+    """
+    Mede o tempo de obtenção dos dados de registro (extract_record) dos XML
+    de um arquivo compactado, em série (workers=0) ou com `workers` processos
+    (xml_sps_adapter.get_xml_adapters_from_zip_file)
+
+    Returns
+    -------
+    dict
+    """
+    start = time.perf_counter()
+    if workers:
+        total = 0
+        for item in xml_sps_adapter.get_xml_adapters_from_zip_file(
+            zip_xml_file_path, max_workers=workers
+        ):
+            total += 1
+    else:
+        total = 0
+        for item in xml_sps_lib.get_xml_items(zip_xml_file_path):
+            xml_sps_adapter.extract_record(
+                xml_sps_adapter.PidProviderXMLAdapter(item["xml_with_pre"])
+            )
+            total += 1
+    elapsed = time.perf_counter() - start
+    return dict(
+        name="xml_parsing",
+        workers=workers or 0,
+        total=total,
+        elapsed=elapsed,
+        per_second=total / elapsed,
+    )
+
+
+def make_xml(index, issue=True, paragraphs=10, revision=0):
+    """
+    XML SPS sintético do documento `index` da revista fictícia BENCHMARK_ISSN
+
+    Parameters
+    ----------
+    issue : bool
+        False para a versão AOP (sem volume, número e paginação)
+    paragraphs : int
+        quantidade de parágrafos do body (tamanho do documento)
+    revision : int
+        altera o conteúdo do body, mantendo a identificação do documento
+    """
+    issue_xml = ""
+    if issue:
+        issue_xml = (
+            f'<pub-date date-type="collection"><year>{BENCHMARK_YEAR}</year>'
+            "</pub-date><volume>1</volume><issue>1</issue>"
+            f"<fpage>{index + 1}</fpage><lpage>{index + 2}</lpage>"
+        )
+    body = "".join(
+        f"<p>Benchmark document {index} revision {revision} paragraph {p}.</p>"
+        for p in range(paragraphs)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE article PUBLIC "-//NLM//DTD JATS (Z39.96) Journal Publishing '
+        'DTD v1.1 20151215//EN" "https://jats.nlm.nih.gov/publishing/1.1/'
+        'JATS-journalpublishing1.dtd">\n'
+        '<article xmlns:xlink="http://www.w3.org/1999/xlink" '
+        'article-type="research-article" dtd-version="1.1" '
+        'specific-use="sps-1.9" xml:lang="en">'
+        "<front><journal-meta>"
+        f'<issn pub-type="epub">{BENCHMARK_ISSN}</issn>'
+        "</journal-meta><article-meta>"
+        f'<article-id pub-id-type="doi">10.0000/benchmark.{index}</article-id>'
+        "<title-group>"
+        f"<article-title>Benchmark document {index}</article-title>"
+        '</title-group><contrib-group><contrib contrib-type="author"><name>'
+        f"<surname>Author{index}</surname><given-names>A</given-names>"
+        "</name></contrib></contrib-group>"
+        f'<pub-date date-type="pub"><day>01</day><month>01</month>'
+        f"<year>{BENCHMARK_YEAR}</year></pub-date>"
+        f"{issue_xml}</article-meta></front>"
+        f"<body><sec><title>Benchmark</title>{body}</sec></body></article>"
+    )
+
+
+def make_package(path, indexes, **kwargs):
+    """
+    Cria o arquivo compactado `path` com os XML sintéticos (make_xml)
+    dos documentos `indexes`
+    """
+    with ZipFile(path, "w", compression=ZIP_DEFLATED) as zf:
+        for index in indexes:
+            zf.writestr(f"benchmark-{index}.xml", make_xml(index, **kwargs))
+    return path
+
+
+class LocalFilesStorage:
+    """
+    Substituto local do MinIO (FilesStorageManager.push_xml_content):
+    grava os XML em `directory`
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def push_xml_content(self, filename, subdirs, content, finger_print):
+        name, ext = os.path.splitext(filename)
+        path = os.path.join(self.directory, name, finger_print)
+        os.makedirs(path, exist_ok=True)
+        path = os.path.join(path, filename)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(content)
+        return {"uri": f"file://{path}"}
+
+
+class BenchmarkPidProvider(PidProvider):
+    def __init__(self, files_storage):
+        self.files_storage = files_storage
+
+    @property
+    def push_xml_content(self):
+        return self.files_storage.push_xml_content
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def _register_package(pid_provider, zip_xml_file_path, user):
+    """
+    Registra os XML de `zip_xml_file_path` (provide_pid_for_xml_zip)
+
+    Returns
+    -------
+    dict
+    """
+    latencies = []
+    record_status = {}
+    counter = _QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        last = start
+        for result in pid_provider.provide_pid_for_xml_zip(zip_xml_file_path, user):
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+            status = result.get("record_status") or "error"
+            record_status[status] = record_status.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    total = len(latencies)
+    return dict(
+        documents=total,
+        record_status=record_status,
+        elapsed=elapsed,
+        per_second=total / elapsed if elapsed else None,
+        p50=_percentile(latencies, 50),
+        p95=_percentile(latencies, 95),
+        queries_per_document=counter.count / total if total else None,
+    )
+
+
+def _delete_benchmark_records():
+    docs = PidProviderXML.objects.filter(journal__issn_electronic=BENCHMARK_ISSN)
+    PidProviderXML.invalidate_cache(list(docs.values_list("v3", flat=True)))
+    XMLVersion.objects.filter(xml_doc_pid__in=docs).delete()
+    docs.delete()
+    XMLIssue.objects.filter(journal__issn_electronic=BENCHMARK_ISSN).delete()
+    XMLJournal.objects.filter(issn_electronic=BENCHMARK_ISSN).delete()
+    V2Sequence.objects.filter(prefix__startswith=f"S{BENCHMARK_ISSN}").delete()
+    XMLJournal.interned.clear()
+    XMLIssue.interned.clear()
+
+
+def registration(documents=100, paragraphs=10, cases=REGISTRATION_CASES):
+    """
+    Mede a vazão, a latência (p50, p95, em segundos) e a quantidade de
+    consultas ao banco de dados por documento de
+    PidProvider.provide_pid_for_xml_zip, para pacotes sintéticos (make_package)
+    com `documents` XML, em cada um dos casos `cases` (REGISTRATION_CASES)
+
+    Os XML são gravados localmente (LocalFilesStorage) e os registros
+    da revista fictícia BENCHMARK_ISSN são removidos antes e após a execução
+
+    Returns
+    -------
+    list of dict
+    """
+    user, created = User.objects.get_or_create(username="pid_provider_benchmark")
+    results = []
+    _delete_benchmark_records()
+    with tempfile.TemporaryDirectory() as directory:
+        pid_provider = BenchmarkPidProvider(
+            LocalFilesStorage(os.path.join(directory, "storage"))
+        )
+
+        def _package(name, indexes, **kwargs):
+            return make_package(
+                os.path.join(directory, f"{name}.zip"),
+                indexes,
+                paragraphs=paragraphs,
+                **kwargs,
+            )
+
+        def _run(case, zip_xml_file_path):
+            result = _register_package(pid_provider, zip_xml_file_path, user)
+            if case in cases:
+                results.append(dict(name="registration", case=case, **result))
+
+        try:
+            published = range(documents)
+            aop = range(documents, 2 * documents)
+            _run(NEW, _package(NEW, published))
+            if UNCHANGED in cases:
+                _run(UNCHANGED, _package(NEW, published))
+            if UPDATED in cases:
+                _run(UPDATED, _package(UPDATED, published, revision=1))
+            if AOP_TO_ISSUE in cases:
+                # registra as versões AOP, não contabilizadas
+                _register_package(pid_provider, _package("aop", aop, issue=False), user)
+                _run(AOP_TO_ISSUE, _package(AOP_TO_ISSUE, aop))
+        finally:
+            _delete_benchmark_records()
+    return results
+
+
+def z_field_storage(rows=1000000, lookups=1000):
+    """
+    Compara, no PostgreSQL, o tamanho do índice e a latência das consultas
+    de `rows` sha256 armazenados em hexadecimal (varchar 64, como os campos
+    z_* eram armazenados) e em bytes (bytea 32, como são armazenados),
+    em tabelas temporárias
+
+    Returns
+    -------
+    list of dict
+    """
+    storages = {
+        "varchar(64)": "encode(sha256(i::text::bytea), 'hex')",
+        "bytea": "sha256(i::text::bytea)",
+    }
+    results = []
+    with connection.cursor() as cursor:
+        for index, (column_type, value) in enumerate(storages.items()):
+            table = f"pid_provider_benchmark_z_{index}"
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {table} (z {column_type})")
+            cursor.execute(
+                f"INSERT INTO {table} SELECT {value} FROM generate_series(1, %s) i",
+                [rows],
+            )
+            cursor.execute(f"CREATE INDEX {table}_z ON {table} (z)")
+            cursor.execute(f"ANALYZE {table}")
+            cursor.execute(f"SELECT pg_relation_size('{table}_z')")
+            index_size = cursor.fetchone()[0]
+
+            step = max(rows // lookups, 1)
+            cursor.execute(
+                f"SELECT {value} FROM generate_series(1, %s, %s) i", [rows, step]
+            )
+            values = [row[0] for row in cursor.fetchall()]
+            latencies = []
+            for item in values:
+                start = time.perf_counter()
+                cursor.execute(f"SELECT 1 FROM {table} WHERE z = %s", [item])
+                cursor.fetchone()
+                latencies.append(time.perf_counter() - start)
+            cursor.execute(f"DROP TABLE {table}")
+
+            results.append(
+                dict(
+                    name="z_field_storage",
+                    column_type=column_type,
+                    rows=rows,
+                    index_size=index_size,
+                    lookups=len(latencies),
+                    p50=_percentile(latencies, 50),
+                    p95=_percentile(latencies, 95),
+                )
+            )
+    return results
+
+
+# índices de PidProviderXML comuns às duas versões comparadas em
+# pid_provider_xml_indexes (chave primária, ForeignKey e identificadores)
+COMMON_INDEXES = (
+    "(journal_id)",
+    "(issue_id)",
+    "(article_id)",
+    "(current_version_id)",
+    "(sync_failure_id)",
+    "(creator_id)",
+    "(updated_by_id)",
+    "(v3)",
+    "(aop_identity_key)",
+    "(aop_identity_key) WHERE issue_id IS NULL",
+    "(updated, id)",
+)
+# índices de uma coluna, anteriores à migração 0010
+SINGLE_COLUMN_INDEXES = (
+    "(identity_key varchar_pattern_ops)",
+    "(pkg_name)",
+    "(journal_id)",
+    "(issue_id)",
+    "(elocation_id)",
+    "(fpage)",
+    "(fpage_seq)",
+    "(lpage)",
+    "(article_pub_year)",
+    "(main_doi)",
+    "(z_article_titles_texts)",
+    "(z_surnames)",
+    "(z_collab)",
+    "(z_links)",
+    "(z_partial_body)",
+    "(synchronized)",
+)
+# índices parciais e de padrão, a partir da migração 0010
+QUERY_INDEXES = (
+    "(v2 varchar_pattern_ops)",
+    "(id) WHERE NOT synchronized",
+)
+
+
+def pid_provider_xml_indexes(rows=100000, batch_size=1000, lookups=1000):
+    """
+    Compara, no PostgreSQL, a vazão de inserção (em lotes de `batch_size`)
+    de `rows` registros de PidProviderXML sintéticos e a latência das
+    consultas por identity_key, aop_identity_key (AOP) e v2, em tabelas
+    temporárias com os índices de uma coluna (SINGLE_COLUMN_INDEXES)
+    e com os índices das consultas (QUERY_INDEXES)
+
+    Returns
+    -------
+    list of dict
+    """
+    values = (
+        "i, now(), now(), substr(md5(i::text), 1, 23), "
+        "'S0000-00002020' || lpad(i::text, 9, '0'), 'pkg-' || i, "
+        "(i %% 300)::text, ((i %% 300) + 5)::text, '2020', '10.0000/' || i, "
+        "sha256(('t' || i)::bytea), sha256(('s' || i)::bytea), "
+        "encode(sha256(('i' || i)::bytea), 'hex'), "
+        "encode(sha256(('a' || i)::bytea), 'hex'), "
+        "i %% 50, CASE WHEN i %% 10 = 0 THEN NULL ELSE i / 100 END, i %% 20 <> 0"
+    )
+    columns = (
+        "id, created, updated, v3, v2, pkg_name, fpage, lpage, "
+        "article_pub_year, main_doi, z_article_titles_texts, z_surnames, "
+        "identity_key, aop_identity_key, journal_id, issue_id, synchronized"
+    )
+    step = max(rows // lookups, 1)
+    queries = {
+        "identity_key": (
+            "identity_key = encode(sha256(('i' || %s)::bytea), 'hex')",
+            range(1, rows + 1, step),
+        ),
+        "aop_identity_key": (
+            "aop_identity_key = encode(sha256(('a' || %s)::bytea), 'hex') "
+            "AND issue_id IS NULL",
+            range(10, rows + 1, max(step // 10, 1) * 10),
+        ),
+        "v2": (
+            "v2 = 'S0000-00002020' || lpad(%s::text, 9, '0')",
+            range(1, rows + 1, step),
+        ),
+    }
+    index_sets = {
+        "single_column": COMMON_INDEXES + SINGLE_COLUMN_INDEXES,
+        "query": COMMON_INDEXES + QUERY_INDEXES,
+    }
+
+    results = []
+    with connection.cursor() as cursor:
+        for name, indexes in index_sets.items():
+            table = f"pid_provider_benchmark_{name}"
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {table} "
+                f"(LIKE {PidProviderXML._meta.db_table} INCLUDING DEFAULTS)"
+            )
+            cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+            cursor.execute(f"CREATE UNIQUE INDEX ON {table} (identity_key)")
+            for index in indexes:
+                cursor.execute(f"CREATE INDEX ON {table} {index}")
+
+            start = time.perf_counter()
+            for first in range(1, rows + 1, batch_size):
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}) SELECT {values} "
+                    "FROM generate_series(%s, %s) i",
+                    [first, min(first + batch_size - 1, rows)],
+                )
+            elapsed = time.perf_counter() - start
+            cursor.execute(f"ANALYZE {table}")
+            cursor.execute("SELECT pg_indexes_size(%s)", [table])
+            indexes_size = cursor.fetchone()[0]
+
+            result = dict(
+                name="pid_provider_xml_indexes",
+                indexes=name,
+                rows=rows,
+                insert_elapsed=elapsed,
+                inserts_per_second=rows / elapsed,
+                indexes_size=indexes_size,
+            )
+            for query_name, (condition, items) in queries.items():
+                latencies = []
+                for item in items:
+                    start = time.perf_counter()
+                    cursor.execute(f"SELECT id FROM {table} WHERE {condition}", [item])
+                    cursor.fetchall()
+                    latencies.append(time.perf_counter() - start)
+                result[f"{query_name}_p50"] = _percentile(latencies, 50)
+                result[f"{query_name}_p95"] = _percentile(latencies, 95)
+            cursor.execute(f"DROP TABLE {table}")
+            results.append(result)
+    return results
+
+
+def make_large_xml(size):
+    """
+    XML sintético com aproximadamente `size` bytes, com fórmulas (MathML)
+    e tabelas
+    """
+    paragraph = (
+        "<p>Equation <inline-formula><mml:math><mml:mrow><mml:msup>"
+        "<mml:mi>x</mml:mi><mml:mn>2</mml:mn></mml:msup><mml:mo>+</mml:mo>"
+        "<mml:mi>y</mml:mi></mml:mrow></mml:math></inline-formula> and table "
+        "<table><tr><td>1</td><td>2</td><td>3</td></tr>"
+        "<tr><td>4</td><td>5</td><td>6</td></tr></table></p>"
+    )
+    prolog = (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE article PUBLIC "-//NLM//DTD JATS (Z39.96) Journal Publishing '
+        'DTD v1.1 20151215//EN" "https://jats.nlm.nih.gov/publishing/1.1/'
+        'JATS-journalpublishing1.dtd">\n'
+        '<article xmlns:mml="http://www.w3.org/1998/Math/MathML"><body>'
+    )
+    repetitions = max((size - len(prolog)) // len(paragraph), 1)
+    return (prolog + paragraph * repetitions + "</body></article>").encode("utf-8")
+
+
+def xml_loading(size=50 * 1024 * 1024):
+    """
+    Compara a memória alocada em Python (pico medido por tracemalloc,
+    que não inclui a árvore do lxml, igual nos dois casos) e a duração
+    da obtenção de XMLWithPre de um XML de `size` bytes, a partir do conteúdo
+    decodificado (str) e do conteúdo em bytes
+
+    Returns
+    -------
+    list of dict
+    """
+    content = make_large_xml(size)
+    loaders = {
+        "str": lambda: xml_sps_lib.get_xml_with_pre(content.decode("utf-8")),
+        "bytes": lambda: xml_sps_lib.get_xml_with_pre(content),
+        "memoryview": lambda: xml_sps_lib.get_xml_with_pre(memoryview(content)),
+    }
+    results = []
+    for name, load in loaders.items():
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        xml_with_pre = load()
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del xml_with_pre
+        results.append(
+            dict(
+                name="xml_loading",
+                input=name,
+                size=len(content),
+                peak_memory=peak,
+                elapsed=elapsed,
+            )
+        )
+    return results
+
+
+def _packtools_metadata(xmltree):
+    # dados de XMLMetadata obtidos com os modelos de packtools,
+    # cada um com a sua leitura da árvore
+    article_meta_issue = ArticleMetaIssue(xmltree)
+    return (
+        {item["type"]: item["value"] for item in ISSN(xmltree).data},
+        DoiWithLang(xmltree).main_doi,
+        xmltree.findtext('.//subj-group[@subj-group-type="heading"]/subject'),
+        article_meta_issue.volume,
+        article_meta_issue.number,
+        article_meta_issue.suppl,
+        article_meta_issue.fpage,
+        article_meta_issue.fpage_seq,
+        article_meta_issue.lpage,
+        article_meta_issue.elocation_id,
+        article_meta_issue.collection_date,
+        ArticleDates(xmltree).article_date,
+        [item["text"] for item in ArticleTitles(xmltree).data if item["text"]],
+        RelatedItems(xmltree).related_articles,
+    )
+
+
+def xml_metadata(zip_xml_file_path=None, repeat=100):
+    """
+    Compara a duração, por documento, da obtenção dos dados usados pelo
+    pid provider com os modelos de packtools e com uma única leitura
+    da árvore (xml_sps_metadata.extract_metadata)
+
+    Arguments
+    ---------
+    zip_xml_file_path : str
+        arquivo compactado com XML (xmlsps/fixtures/artigo.xml.zip, se ausente)
+    repeat : int
+        quantidade de extrações de cada XML
+
+    Returns
+    -------
+    list of dict
+    """
+    xmltrees = [
+        item["xml_with_pre"].xmltree
+        for item in xml_sps_lib.get_xml_items(
+            zip_xml_file_path or "xmlsps/fixtures/artigo.xml.zip"
+        )
+    ]
+    extractors = {
+        "packtools": _packtools_metadata,
+        "extract_metadata": extract_metadata,
+    }
+    results = []
+    for name, extract in extractors.items():
+        start = time.perf_counter()
+        for i in range(repeat):
+            for xmltree in xmltrees:
+                extract(xmltree)
+        elapsed = time.perf_counter() - start
+        total = repeat * len(xmltrees)
+        results.append(
+            dict(
+                name="xml_metadata",
+                extractor=name,
+                documents=len(xmltrees),
+                total=total,
+                elapsed=elapsed,
+                microseconds_per_document=elapsed / total * 1000000,
+            )
+        )
+    return results
+
+
+def make_package_with_assets(path, size, asset_size=10 * 1024 * 1024):
+    """
+    Pacote SPS sintético com um XML e arquivos (PDF e imagens) de conteúdo
+    aleatório, que não se comprime, totalizando aproximadamente `size` bytes
+    """
+    with ZipFile(path, "w", compression=ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr("document.xml", make_xml(0))
+        for index in range(max(size // asset_size, 1)):
+            ext = "pdf" if index % 2 else "tif"
+            zf.writestr(f"document-{index}.{ext}", os.urandom(asset_size))
+
+
+def _rebuild_zip_file_xml(xml_sps_file_path, xml_file_path, content):
+    # reescrita do pacote pelo zipfile, que descompacta e recompacta
+    # todos os arquivos
+    tmp_path = xml_sps_file_path + ".tmp"
+    with ZipFile(xml_sps_file_path) as source, ZipFile(
+        tmp_path, "w", compression=ZIP_DEFLATED
+    ) as target:
+        for info in source.infolist():
+            if info.filename == xml_file_path:
+                target.writestr(xml_file_path, content)
+            else:
+                target.writestr(info, source.read(info))
+    os.replace(tmp_path, xml_sps_file_path)
+
+
+def zip_xml_replacement(size=500 * 1024 * 1024):
+    """
+    Compara a duração da substituição do XML de um pacote de `size` bytes
+    (make_package_with_assets) com a reescrita de todo o pacote
+    e com a cópia dos demais arquivos sem recompactá-los
+    (xml_sps_lib.update_zip_file_xml)
+
+    Returns
+    -------
+    list of dict
+    """
+    updaters = {
+        "rebuild": _rebuild_zip_file_xml,
+        "raw_copy": xml_sps_lib.update_zip_file_xml,
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as dirname:
+        path = os.path.join(dirname, "package.zip")
+        make_package_with_assets(path, size)
+        for name, update in updaters.items():
+            content = make_xml(0, revision=1)
+            start = time.perf_counter()
+            update(path, "document.xml", content.encode("utf-8"))
+            elapsed = time.perf_counter() - start
+            with ZipFile(path) as zf:
+                members = len(zf.infolist())
+                assert zf.read("document.xml").decode("utf-8") == content
+            results.append(
+                dict(
+                    name="zip_xml_replacement",
+                    method=name,
+                    size=os.path.getsize(path),
+                    members=members,
+                    elapsed=elapsed,
+                )
+            )
+    return results
+
+
+BENCHMARKS = {
+    "v2_allocation": v2_allocation,
+    "xml_parsing": xml_parsing,
+    "registration": registration,
+    "z_field_storage": z_field_storage,
+    "pid_provider_xml_indexes": pid_provider_xml_indexes,
+    "xml_loading": xml_loading,
+    "xml_metadata": xml_metadata,
+    "zip_xml_replacement": zip_xml_replacement,
+}
@@ -0,0 +1,13 @@
+from django.utils.translation import gettext as _
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+JOB_FAILED = "failed"
+
+JOB_STATUS = [
+    (JOB_QUEUED, _("Queued")),
+    (JOB_RUNNING, _("Running")),
+    (JOB_FINISHED, _("Finished")),
+    (JOB_FAILED, _("Failed")),
+]
@@ -1,10 +1,14 @@
 import logging
+import os
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext as _
 
 from files_storage.controller import FilesStorageManager
-from pid_provider.models import PidProviderXML
+from pid_provider import metrics, xml_sps_adapter
+from pid_provider.exceptions import NotEnoughParametersToGetDocumentRecordError
+from pid_provider.models import PidProviderXML, XMLRawInput
 from xmlsps import xml_sps_lib
 
 User = get_user_model()
@@ -25,10 +29,23 @@ class PidProvider:
     def push_xml_content(self):
         return self.files_storage_manager.push_xml_content
 
+    @property
+    def parsing_workers(self):
+        """
+        Quantidade de processos em que os XML de arquivos compactados são
+        processados (provide_pid_for_xml_zip_pipelined); se não configurada
+        (PID_PROVIDER_PARSING_WORKERS), os XML são processados no próprio
+        processo
+        """
+        return getattr(settings, "PID_PROVIDER_PARSING_WORKERS", None)
+
     def provide_pid_for_xml_zip(self, zip_xml_file_path, user, synchronized=None):
         """
         Fornece / Valida PID para o XML em um arquivo compactado
 
+        Com PID_PROVIDER_PARSING_WORKERS, os XML são processados em outros
+        processos e registrados em lotes (provide_pid_for_xml_zip_pipelined)
+
         Returns
         -------
             list of dict
@@ -51,7 +68,16 @@ class PidProvider:
                     "basename": self.basename,
                 }
         """
-        for item in xml_sps_lib.get_xml_items(zip_xml_file_path):
+        if self.parsing_workers and zip_xml_file_path.endswith(".zip"):
+            yield from self.provide_pid_for_xml_zip_pipelined(
+                zip_xml_file_path, user, synchronized
+            )
+            return
+
+        for item in self._get_xml_items(zip_xml_file_path):
+            if item.get("registered"):
+                yield item.pop("registered")
+                continue
             xml_with_pre = item.pop("xml_with_pre")
             # {"filename": item: "xml": xml}
             registered = self.provide_pid_for_xml_with_pre(
@@ -63,6 +89,201 @@ class PidProvider:
             registered.update(item)
             yield registered
 
+    def provide_pid_for_xml_zip_in_bulk(
+        self,
+        zip_xml_file_path,
+        user,
+        synchronized=None,
+        max_workers=None,
+        filenames=None,
+    ):
+        """
+        Fornece / Valida PID para os XML de um arquivo compactado,
+        registrando-os em lote (PidProviderXML.register_many)
+
+        Com PID_PROVIDER_PARSING_WORKERS, os XML são processados nesta
+        quantidade de processos (xml_sps_adapter.get_xml_adapters_from_zip_file)
+
+        Parameters
+        ----------
+        filenames : str list
+            registra somente estes XML do arquivo compactado (opcional)
+
+        Returns
+        -------
+            list of dict (see provide_pid_for_xml_zip)
+        """
+        if self.parsing_workers and zip_xml_file_path.endswith(".zip"):
+            items = xml_sps_adapter.get_xml_adapters_from_zip_file(
+                zip_xml_file_path,
+                filenames,
+                max_workers=self.parsing_workers,
+                retrieve=self._get_registered_by_raw_finger_print,
+            )
+            return list(
+                self._register_chunk(list(items), user, synchronized, max_workers)
+            )
+
+        items = list(self._get_xml_items(zip_xml_file_path, filenames))
+        to_register = [item for item in items if not item.get("registered")]
+        results = PidProviderXML.register_many(
+            [(item.pop("xml_with_pre"), item["filename"]) for item in to_register],
+            user,
+            self.push_xml_content,
+            synchronized,
+            max_workers,
+        )
+        for item, registered in zip(to_register, results):
+            # {"filename": item: "xml": xml}
+            registered.update(item)
+            item["registered"] = registered
+        return [item["registered"] for item in items]
+
+    def provide_pid_for_xml_zip_pipelined(
+        self,
+        zip_xml_file_path,
+        user,
+        synchronized=None,
+        parsing_workers=None,
+        chunk_size=None,
+    ):
+        """
+        Fornece / Valida PID para os XML de um arquivo compactado:
+        os XML são processados (xml_sps_adapter.get_xml_adapters_from_zip_file)
+        em `parsing_workers` processos, enquanto são registrados, na ordem,
+        em lotes de `chunk_size` (PidProviderXML.register_many)
+
+        Returns
+        -------
+            list of dict iterator (see provide_pid_for_xml_zip)
+        """
+        parsing_workers = parsing_workers or self.parsing_workers
+        chunk_size = chunk_size or getattr(settings, "PID_PROVIDER_JOB_CHUNK_SIZE", 50)
+
+        chunk = []
+        for item in xml_sps_adapter.get_xml_adapters_from_zip_file(
+            zip_xml_file_path,
+            max_workers=parsing_workers,
+            retrieve=self._get_registered_by_raw_finger_print,
+        ):
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                yield from self._register_chunk(chunk, user, synchronized)
+                chunk = []
+        if chunk:
+            yield from self._register_chunk(chunk, user, synchronized)
+
+    def _register_chunk(self, items, user, synchronized=None, max_workers=None):
+        to_register = [item for item in items if not item.get("registered")]
+        results = PidProviderXML.register_many(
+            [(item["xml_adapter"], item["filename"]) for item in to_register],
+            user,
+            self.push_xml_content,
+            synchronized,
+            max_workers,
+        )
+        for item, registered in zip(to_register, results):
+            item["registered"] = registered
+        for item in items:
+            item["registered"]["filename"] = item["filename"]
+            yield item["registered"]
+
+    def _get_xml_items(self, zip_xml_file_path, filenames=None, chunk_size=100):
+        """
+        Obtém os XML do arquivo compactado
+
+        Os XML cujo conteúdo original já foi registrado (XMLRawInput) não são
+        processados: são retornados com os dados do registro
+        (chave `registered`), consultados a cada `chunk_size` XML
+
+        Returns
+        -------
+            dict iterator which keys are filename and xml_with_pre
+            or filename and registered
+        """
+        if not zip_xml_file_path.endswith(".zip"):
+            yield from xml_sps_lib.get_xml_items(zip_xml_file_path, filenames)
+            return
+
+        chunk = []
+        for item in metrics.timed(
+            xml_sps_lib.get_xml_raw_items_from_zip_file(zip_xml_file_path, filenames),
+            metrics.ZIP,
+        ):
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                yield from self._get_xml_items_from_raw_items(chunk)
+                chunk = []
+        if chunk:
+            yield from self._get_xml_items_from_raw_items(chunk)
+
+    def _get_xml_items_from_raw_items(self, raw_items):
+        found = self._get_registered_by_raw_finger_prints(
+            [item["raw_finger_print"] for item in raw_items]
+        )
+        for item in raw_items:
+            registered = found.get(item["raw_finger_print"])
+            if registered:
+                registered = dict(registered, filename=item["filename"])
+                yield {"filename": item["filename"], "registered": registered}
+                continue
+            with metrics.stage(metrics.PARSING):
+                xml_with_pre = xml_sps_lib.get_xml_with_pre(item["content"])
+            xml_with_pre.raw_finger_print = item["raw_finger_print"]
+            yield {"filename": item["filename"], "xml_with_pre": xml_with_pre}
+
+    def _get_registered_by_raw_finger_prints(self, finger_prints):
+        """
+        Consulta os dados de registro dos conteúdos originais `finger_prints`
+        e contabiliza os acertos e as falhas (metrics.raw_input_hit_rate)
+        """
+        with metrics.stage(metrics.RAW_INPUT):
+            found = XMLRawInput.get_registered_data(finger_prints)
+        hits = len([fp for fp in finger_prints if fp in found])
+        metrics.increment(metrics.RAW_INPUT_HITS, hits)
+        metrics.increment(metrics.RAW_INPUT_MISSES, len(finger_prints) - hits)
+        return found
+
+    def _get_registered_by_raw_finger_print(self, finger_print):
+        return self._get_registered_by_raw_finger_prints([finger_print]).get(
+            finger_print
+        )
+
+    def provide_pid_for_job(self, job, user, start=0, chunk_size=None):
+        """
+        Fornece / Valida PID para uma parte dos XML do arquivo compactado
+        de `job` (PidProviderJob), a partir do XML de índice `start`
+
+        Returns
+        -------
+            int (índice inicial da próxima parte) or None (finalizado)
+        """
+        chunk_size = chunk_size or getattr(settings, "PID_PROVIDER_JOB_CHUNK_SIZE", 50)
+        if not job.start_chunk(user, first=not start):
+            # finalizado (por exemplo, por fail_stale_jobs) ou parte repetida
+            return None
+        try:
+            filenames = job.xml_filenames
+            if not start:
+                job.start(len(filenames), user)
+            results = self.provide_pid_for_xml_zip_in_bulk(
+                job.file.path,
+                user,
+                filenames=filenames[start : start + chunk_size],
+            )
+        except Exception as e:
+            LOGGER.exception(e)
+            job.finish(user, e)
+            return None
+
+        if not job.add_results(results, user):
+            # finalizado durante a execução desta parte
+            return None
+        if start + chunk_size < len(filenames):
+            return start + chunk_size
+        job.finish(user)
+        return None
+
     def provide_pid_for_xml_uri(self, xml_uri, filename, user, synchronized=None):
         """
         Fornece / Valida PID de um XML disponível por um URI
@@ -128,7 +349,7 @@ class PidProvider:
         )
 
     @classmethod
-    def is_registered_xml_with_pre(cls, xml_with_pre):
+    def is_registered_xml_with_pre(cls, xml_with_pre, filename=None):
         """
         Returns
         -------
@@ -144,10 +365,10 @@ class PidProvider:
                 "updated": self.updated.isoformat(),
             }
         """
-        return PidProviderXML.get_registered(xml_with_pre)
+        return PidProviderXML.get_registered(xml_with_pre, filename)
 
     @classmethod
-    def is_registered_xml_uri(cls, xml_uri):
+    def is_registered_xml_uri(cls, xml_uri, filename=None):
         """
         Returns
         -------
@@ -164,7 +385,7 @@ class PidProvider:
             }
         """
         xml_with_pre = xml_sps_lib.get_xml_with_pre_from_uri(xml_uri)
-        return cls.is_registered_xml_with_pre(xml_with_pre)
+        return cls.is_registered_xml_with_pre(xml_with_pre, filename)
 
     @classmethod
     def is_registered_xml_zip(cls, zip_xml_file_path):
@@ -186,13 +407,125 @@ class PidProvider:
         """
         for item in xml_sps_lib.get_xml_items(zip_xml_file_path):
             # {"filename": item: "xml": xml}
-            registered = cls.is_registered_xml_with_pre(item["xml_with_pre"])
+            registered = cls.is_registered_xml_with_pre(
+                item["xml_with_pre"], item["filename"]
+            )
             item.update(registered or {})
             yield item
 
+    @classmethod
+    def get_registration_demands_for_xml_zip(cls, zip_xml_file_path):
+        """
+        Verifica, em conjunto, a necessidade de registro dos XML
+        do arquivo compactado
+
+        Returns
+        -------
+            list of dict
+                {
+                    "filename": str,
+                    "registered": dict,
+                    "required_local": bool,
+                    "required_remote": bool,
+                }
+                or
+                {"filename": str, "error": str}
+        """
+        items = []
+        for item in xml_sps_lib.get_xml_items(zip_xml_file_path):
+            pkg_name, ext = os.path.splitext(os.path.basename(item["filename"]))
+            xml_adapter = xml_sps_adapter.as_xml_adapter(item["xml_with_pre"], pkg_name)
+            try:
+                for params in xml_adapter.query_list:
+                    PidProviderXML.validate_query_params(params)
+            except NotEnoughParametersToGetDocumentRecordError as e:
+                items.append({"filename": item["filename"], "error": e})
+                continue
+            items.append(
+                {
+                    "filename": item["filename"],
+                    "query_list": xml_adapter.identity_query_list,
+                    "legacy_query_list": xml_adapter.query_list,
+                    "finger_print": xml_adapter.finger_print,
+                }
+            )
+        return cls._get_registration_demands(items, "filename")
+
+    @classmethod
+    def get_registration_demands_for_identities(cls, identities):
+        """
+        Verifica, em conjunto, a necessidade de registro dos documentos
+        identificados por `identities`
+
+        Parameters
+        ----------
+        identities : list of (identity_key, aop_identity_key, finger_print)
+            (see PidProviderXMLAdapter.compact_identity)
+
+        Returns
+        -------
+            list of dict (see get_registration_demands_for_xml_zip),
+            with the key "identity" instead of "filename"
+        """
+        items = []
+        for identity in identities:
+            try:
+                identity_key, aop_identity_key, finger_print = identity
+                if not aop_identity_key or not finger_print:
+                    raise ValueError
+            except (TypeError, ValueError):
+                items.append(
+                    {
+                        "identity": identity,
+                        "error": _(
+                            "Expected (identity_key, aop_identity_key, finger_print)"
+                        ),
+                    }
+                )
+                continue
+            items.append(
+                {
+                    "identity": identity,
+                    "query_list": xml_sps_adapter.identity_query_list_from_keys(
+                        identity_key, aop_identity_key
+                    ),
+                    "finger_print": finger_print,
+                }
+            )
+        return cls._get_registration_demands(items, "identity")
+
+    @classmethod
+    def _get_registration_demands(cls, items, label):
+        pending = [item for item in items if not item.get("error")]
+        results = PidProviderXML.get_registration_demands(pending)
+        for item, result in zip(pending, results):
+            item["result"] = result
+        return [
+            {
+                label: item[label],
+                **(item.get("result") or {"error": str(item["error"])}),
+            }
+            for item in items
+        ]
+
     @classmethod
     def get_xml_uri(self, v3):
         """
         Retorna XML URI ou None
         """
         return PidProviderXML.get_xml_uri(v3)
+
+    @classmethod
+    def get_data(cls, v3):
+        """
+        Retorna os dados do registro (v3, v2, aop_pid, xml_uri, ...) ou None
+        """
+        return PidProviderXML.get_data(v3)
+
+    @classmethod
+    def get_many(cls, v3s):
+        """
+        Retorna dict cujas chaves são os v3 registrados e
+        os valores são {"xml_uri": str, "data": dict}
+        """
+        return PidProviderXML.get_many(v3s)
@@ -28,3 +28,11 @@ class PidProviderXMLUpdateError(Exception):
 
 class PidProviderXMLWithPreError(Exception):
     ...
+
+
+class DuplicatedDocumentIdentityError(Exception):
+    ...
+
+
+class PidProviderJobTimeoutError(Exception):
+    ...
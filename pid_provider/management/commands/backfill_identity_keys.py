@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from pid_provider.models import PidProviderXML
+
+
+class Command(BaseCommand):
+    help = (
+        "Preenche identity_key e aop_identity_key dos registros de PidProviderXML "
+        "e lista os registros cuja identidade está duplicada"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalcula os identificadores de todos os registros",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        qs = PidProviderXML.objects.select_related("journal", "issue").order_by("id")
+        if not options["all"]:
+            qs = qs.filter(identity_key__isnull=True)
+
+        chunk_size = options["chunk_size"]
+        updated = 0
+        duplicated = []
+        last_id = 0
+        while True:
+            docs = list(qs.filter(id__gt=last_id)[:chunk_size])
+            if not docs:
+                break
+            last_id = docs[-1].id
+            for doc in docs:
+                doc.set_identity_keys()
+            try:
+                with transaction.atomic():
+                    PidProviderXML.objects.bulk_update(
+                        docs, ["identity_key", "aop_identity_key"]
+                    )
+                updated += len(docs)
+            except IntegrityError:
+                # há identidade duplicada no lote, atualiza um a um
+                for doc in docs:
+                    try:
+                        with transaction.atomic():
+                            doc.save(update_fields=["identity_key", "aop_identity_key"])
+                        updated += 1
+                    except IntegrityError:
+                        duplicated.append(doc)
+
+        self.stdout.write(f"Updated: {updated}")
+        for doc in duplicated:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Duplicated identity: id={doc.id} v3={doc.v3} "
+                    f"pkg_name={doc.pkg_name}"
+                )
+            )
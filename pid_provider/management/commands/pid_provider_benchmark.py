@@ -0,0 +1,140 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from pid_provider import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Executa os benchmarks do pid_provider e apresenta os resultados em JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(benchmarks.BENCHMARKS))
+        parser.add_argument(
+            "--registrants",
+            type=int,
+            nargs="+",
+            default=[1, 2, 4, 8],
+            help="Quantidades de registradores concorrentes (v2_allocation)",
+        )
+        parser.add_argument("--allocations", type=int, default=200)
+        parser.add_argument("--batch-size", type=int, default=1)
+        parser.add_argument(
+            "--zip", help="Arquivo compactado com XML (xml_parsing, xml_metadata)"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=[0, 2, 4],
+            help="Quantidades de processos, 0 para em série (xml_parsing)",
+        )
+        parser.add_argument(
+            "--documents",
+            type=int,
+            nargs="+",
+            default=[100],
+            help="Quantidades de XML dos pacotes sintéticos (registration)",
+        )
+        parser.add_argument(
+            "--paragraphs",
+            type=int,
+            default=10,
+            help="Quantidade de parágrafos de cada XML sintético (registration)",
+        )
+        parser.add_argument(
+            "--cases",
+            nargs="+",
+            choices=benchmarks.REGISTRATION_CASES,
+            default=list(benchmarks.REGISTRATION_CASES),
+            help="Casos de registro (registration)",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[1000000],
+            help="Quantidades de registros (z_field_storage, pid_provider_xml_indexes)",
+        )
+        parser.add_argument("--lookups", type=int, default=1000)
+        parser.add_argument(
+            "--size",
+            type=int,
+            help=(
+                "Tamanho, em MB, do XML sintético (xml_loading, 50 MB) "
+                "ou do pacote sintético (zip_xml_replacement, 500 MB)"
+            ),
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=100,
+            help="Quantidade de extrações de cada XML (xml_metadata)",
+        )
+        parser.add_argument(
+            "--output",
+            help="Arquivo JSON onde os resultados são gravados, para comparação",
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for result in self._run(options):
+            self.stdout.write(json.dumps(result))
+            results.append(result)
+
+        if options["output"]:
+            with open(options["output"], "w") as fp:
+                json.dump(
+                    dict(
+                        created=timezone.now().isoformat(),
+                        database=connection.vendor,
+                        python=platform.python_version(),
+                        results=results,
+                    ),
+                    fp,
+                    indent=2,
+                )
+
+    def _run(self, options):
+        if options["name"] == "v2_allocation":
+            for registrants in options["registrants"]:
+                yield benchmarks.v2_allocation(
+                    registrants=registrants,
+                    allocations=options["allocations"],
+                    batch_size=options["batch_size"],
+                )
+        elif options["name"] == "xml_parsing":
+            for workers in options["workers"]:
+                yield benchmarks.xml_parsing(options["zip"], workers)
+        elif options["name"] == "registration":
+            for documents in options["documents"]:
+                yield from benchmarks.registration(
+                    documents=documents,
+                    paragraphs=options["paragraphs"],
+                    cases=options["cases"],
+                )
+        elif options["name"] == "pid_provider_xml_indexes":
+            for rows in options["rows"]:
+                yield from benchmarks.pid_provider_xml_indexes(
+                    rows=rows,
+                    batch_size=options["batch_size"],
+                    lookups=options["lookups"],
+                )
+        elif options["name"] == "xml_loading":
+            yield from benchmarks.xml_loading(
+                size=(options["size"] or 50) * 1024 * 1024
+            )
+        elif options["name"] == "zip_xml_replacement":
+            yield from benchmarks.zip_xml_replacement(
+                size=(options["size"] or 500) * 1024 * 1024
+            )
+        elif options["name"] == "xml_metadata":
+            yield from benchmarks.xml_metadata(options["zip"], options["repeat"])
+        elif options["name"] == "z_field_storage":
+            for rows in options["rows"]:
+                yield from benchmarks.z_field_storage(
+                    rows=rows, lookups=options["lookups"]
+                )
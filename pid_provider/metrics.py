@@ -0,0 +1,410 @@
+"""
+Contadores do pid_provider
+
+Os contadores são mantidos no cache do Django para que sejam
+compartilhados pelos processos (web e workers) quando o cache é compartilhado
+
+Os incrementos são acumulados no processo e enviados ao cache (flush) a cada
+PID_PROVIDER_METRICS_FLUSH_INTERVAL segundos, ao consultar os contadores
+e ao final do processo, de modo que o registro de um documento não
+requer consultas ao cache
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+LOGGER = logging.getLogger(__name__)
+
+KEY_PREFIX = "pid_provider:metrics:"
+
+# conteúdo original do XML (XMLRawInput) já registrado
+RAW_INPUT_HITS = "raw_input_hits"
+RAW_INPUT_MISSES = "raw_input_misses"
+
+# cache de v3 -> xml_uri, data (PidProviderXML.get_many)
+V3_CACHE_HITS = "v3_cache_hits"
+V3_CACHE_MISSES = "v3_cache_misses"
+
+COUNTERS = (RAW_INPUT_HITS, RAW_INPUT_MISSES, V3_CACHE_HITS, V3_CACHE_MISSES)
+
+# etapas do registro (stage)
+ZIP = "zip"  # leitura dos XML do arquivo compactado
+RAW_INPUT = "raw_input"  # consulta e registro dos conteúdos originais
+PARSING = "parsing"  # lxml (get_xml_with_pre)
+EXTRACTION = "extraction"  # dados do XML (xml_sps_metadata.extract_metadata)
+LOCK = "lock"
+QUERY_DOCUMENT = "query_document"
+COMPLETE_PIDS = "complete_pids"
+PUSH_XML_CONTENT = "push_xml_content"  # envio do XML para o MinIO
+ADD_DATA = "add_data"
+SAVE = "save"
+REGISTER = "register"  # total de PidProviderXML.register
+
+STAGES = (
+    ZIP,
+    RAW_INPUT,
+    PARSING,
+    EXTRACTION,
+    LOCK,
+    QUERY_DOCUMENT,
+    COMPLETE_PIDS,
+    PUSH_XML_CONTENT,
+    ADD_DATA,
+    SAVE,
+    REGISTER,
+)
+
+# etapas do documento em registro (document), por thread
+_local = threading.local()
+
+_END = object()
+
+
+def _key(name):
+    return f"{KEY_PREFIX}{name}"
+
+
+# incrementos do processo ainda não enviados ao cache
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _discard_pending():
+    # o processo criado por fork não envia os incrementos do processo pai
+    global _pending_lock
+    _pending.clear()
+    _pending_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_discard_pending)
+
+
+def increment(name, value=1):
+    """
+    Incrementa o contador `name` em `value`
+
+    O incremento é enviado ao cache no próximo flush
+    """
+    if not value:
+        return
+    with _pending_lock:
+        _pending[name] = _pending.get(name, 0) + value
+    interval = getattr(settings, "PID_PROVIDER_METRICS_FLUSH_INTERVAL", 10)
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+
+def flush():
+    """
+    Envia ao cache os incrementos acumulados no processo
+    """
+    global _last_flush
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    for name, value in pending.items():
+        _incr(_key(name), value)
+
+
+atexit.register(flush)
+
+
+def _incr(key, value):
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        # contador inexistente
+        if not cache.add(key, value, timeout=None):
+            cache.incr(key, value)
+    except Exception as e:
+        # métricas não devem interromper o registro
+        LOGGER.exception(e)
+
+
+def get(name):
+    flush()
+    return cache.get(_key(name)) or 0
+
+
+def get_many(names):
+    """
+    Returns
+    -------
+    dict which keys are `names` and values are the counters
+    """
+    flush()
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name)) or 0 for name in names}
+
+
+def reset(names):
+    with _pending_lock:
+        for name in names:
+            _pending.pop(name, None)
+    cache.delete_many([_key(name) for name in names])
+
+
+def hit_rate(hits_name, misses_name):
+    """
+    Retorna hits / (hits + misses) ou None se não houve consultas
+    """
+    counters = get_many([hits_name, misses_name])
+    total = counters[hits_name] + counters[misses_name]
+    if total:
+        return counters[hits_name] / total
+    return None
+
+
+def raw_input_hit_rate():
+    return hit_rate(RAW_INPUT_HITS, RAW_INPUT_MISSES)
+
+
+def v3_cache_hit_rate():
+    return hit_rate(V3_CACHE_HITS, V3_CACHE_MISSES)
+
+
+def _stage_key(name, field):
+    return f"stage:{name}:{field}"
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+
+# contadores atualizados por mais de uma thread (context)
+_counters_lock = threading.Lock()
+# etapas do documento atualizadas por mais de uma thread (context)
+_stages_lock = threading.Lock()
+
+
+def _count(execute, sql, params, many, context):
+    counters = getattr(_local, "counters", None)
+    if counters:
+        with _counters_lock:
+            for counter in counters:
+                counter.count += 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def _counting(counter):
+    # enquanto há contadores na thread, a sua conexão padrão está envolvida
+    # por _count
+    counters = getattr(_local, "counters", None)
+    if counters:
+        counters.append(counter)
+        try:
+            yield
+        finally:
+            counters.pop()
+        return
+    _local.counters = [counter]
+    try:
+        with connection.execute_wrapper(_count):
+            yield
+    finally:
+        _local.counters = None
+
+
+@contextmanager
+def counting_queries(conn):
+    """
+    Contabiliza nas etapas em curso da thread as consultas de `conn`,
+    conexão diferente da padrão (por exemplo, a conexão em autocommit
+    de models._execute_in_autocommit)
+    """
+    with conn.execute_wrapper(_count):
+        yield
+
+
+def context():
+    """
+    Etapas em curso da thread, para que sejam contabilizadas também
+    pelas threads que executam parte delas (use_context)
+    """
+    return getattr(_local, "stages", None), getattr(_local, "counters", None)
+
+
+@contextmanager
+def use_context(ctx):
+    """
+    Contabiliza as consultas e as etapas da thread nas etapas
+    em curso `ctx` (context) de outra thread
+    """
+    stages, counters = ctx
+    previous = context()
+    _local.stages = stages
+    # cópia, pois as etapas iniciadas nesta thread são acrescentadas à lista
+    _local.counters = list(counters) if counters else None
+    try:
+        if counters:
+            with connection.execute_wrapper(_count):
+                yield
+        else:
+            yield
+    finally:
+        _local.stages, _local.counters = previous
+
+
+@contextmanager
+def stage(name):
+    """
+    Mede a duração e a quantidade de consultas ao banco de dados
+    da etapa `name` (STAGES)
+
+    As etapas podem estar contidas em outras (por exemplo, EXTRACTION
+    em REGISTER) e, neste caso, são contabilizadas em ambas
+
+    São contabilizadas as consultas da conexão padrão da thread, das
+    conexões envolvidas por counting_queries e das threads que executam
+    parte da etapa com use_context
+    """
+    counter = _QueryCounter()
+    start = time.perf_counter()
+    try:
+        with _counting(counter):
+            yield
+    finally:
+        _add_stage(name, time.perf_counter() - start, counter.count)
+
+
+def timed(items, name):
+    """
+    Contabiliza na etapa `name` a obtenção de cada item do iterador `items`
+    """
+    items = iter(items)
+    while True:
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with _counting(counter):
+            item = next(items, _END)
+        if item is _END:
+            return
+        _add_stage(name, time.perf_counter() - start, counter.count)
+        yield item
+
+
+def _add_stage(name, seconds, queries):
+    stages = getattr(_local, "stages", None)
+    if stages is None:
+        _save_stages({name: [1, seconds, queries]})
+        return
+    with _stages_lock:
+        values = stages.setdefault(name, [0, 0, 0])
+        values[0] += 1
+        values[1] += seconds
+        values[2] += queries
+
+
+def _save_stages(stages):
+    for name, (count, seconds, queries) in stages.items():
+        increment(_stage_key(name, "count"), count)
+        increment(_stage_key(name, "microseconds"), int(seconds * 1000000))
+        increment(_stage_key(name, "queries"), queries)
+
+
+@contextmanager
+def document(label):
+    """
+    Acumula as etapas do registro do documento `label` e as contabiliza
+    ao final, de uma única vez
+
+    Com settings.PID_PROVIDER_LOG_STAGES, registra no log a duração
+    e a quantidade de consultas de cada etapa do documento
+    """
+    if getattr(_local, "stages", None) is not None:
+        # documento em registro (register_many, por exemplo)
+        yield
+        return
+    _local.stages = {}
+    try:
+        yield
+    finally:
+        stages = _local.stages
+        _local.stages = None
+        _save_stages(stages)
+        if getattr(settings, "PID_PROVIDER_LOG_STAGES", False):
+            LOGGER.info(
+                f"{label} stages: "
+                + " ".join(
+                    f"{name}={seconds:.4f}s/{queries}q"
+                    for name, (count, seconds, queries) in stages.items()
+                )
+            )
+
+
+def get_stages():
+    """
+    Returns
+    -------
+    dict which keys are STAGES and values are
+        {"count": int, "seconds": float, "queries": int}
+    """
+    counters = get_many(
+        [
+            _stage_key(name, field)
+            for name in STAGES
+            for field in ("count", "microseconds", "queries")
+        ]
+    )
+    return {
+        name: {
+            "count": counters[_stage_key(name, "count")],
+            "seconds": counters[_stage_key(name, "microseconds")] / 1000000,
+            "queries": counters[_stage_key(name, "queries")],
+        }
+        for name in STAGES
+    }
+
+
+def reset_stages():
+    reset(
+        [
+            _stage_key(name, field)
+            for name in STAGES
+            for field in ("count", "microseconds", "queries")
+        ]
+    )
+
+
+def prometheus_text():
+    """
+    Contadores e etapas no formato de exposição de texto do Prometheus
+    """
+    lines = []
+    for name, value in get_many(COUNTERS).items():
+        metric = f"pid_provider_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    stages = get_stages()
+    lines.append(
+        "# HELP pid_provider_stage_seconds Duration of the registration stages"
+    )
+    lines.append("# TYPE pid_provider_stage_seconds summary")
+    for name, values in stages.items():
+        lines.append(
+            f'pid_provider_stage_seconds_sum{{stage="{name}"}} {values["seconds"]}'
+        )
+        lines.append(
+            f'pid_provider_stage_seconds_count{{stage="{name}"}} {values["count"]}'
+        )
+    lines.append(
+        "# HELP pid_provider_stage_queries_total Database queries of the registration stages"
+    )
+    lines.append("# TYPE pid_provider_stage_queries_total counter")
+    for name, values in stages.items():
+        lines.append(
+            f'pid_provider_stage_queries_total{{stage="{name}"}} {values["queries"]}'
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pidproviderxml",
+            name="aop_identity_key",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, verbose_name="AOP identity key"
+            ),
+        ),
+        migrations.AddField(
+            model_name="pidproviderxml",
+            name="identity_key",
+            field=models.CharField(
+                blank=True,
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="identity key",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="syncfailure",
+            name="message",
+            field=models.CharField(
+                blank=True, max_length=255, null=True, verbose_name="Message"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pidproviderxml",
+            index=models.Index(
+                fields=["aop_identity_key"], name="pid_provide_aop_ide_334b35_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="pidproviderxml",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("issue__isnull", True)),
+                fields=("aop_identity_key",),
+                name="pid_provider_xml_unique_aop_identity_key",
+            ),
+        ),
+    ]
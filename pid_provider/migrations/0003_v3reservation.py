@@ -0,0 +1,35 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0002_identity_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="V3Reservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("v3", models.CharField(max_length=23, unique=True, verbose_name="v3")),
+                ("claimed_by", models.CharField(blank=True, max_length=100, null=True)),
+                ("claimed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="v3reservation",
+            index=models.Index(
+                fields=["claimed_by"], name="pid_provide_claimed_6dc5e6_idx"
+            ),
+        ),
+    ]
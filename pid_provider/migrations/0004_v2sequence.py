@@ -0,0 +1,31 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0003_v3reservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="V2Sequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "prefix",
+                    models.CharField(max_length=14, unique=True, verbose_name="prefix"),
+                ),
+                ("last_value", models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0005_pidproviderjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="XMLRawInput",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("finger_print", models.CharField(max_length=64, unique=True)),
+                ("xml_changed", models.BooleanField(default=False)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "xml_version",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="pid_provider.xmlversion",
+                    ),
+                ),
+            ],
+        ),
+    ]
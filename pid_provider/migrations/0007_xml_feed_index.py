@@ -0,0 +1,18 @@
+# Generated by Django 4.1.8 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0006_xmlrawinput"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pidproviderxml",
+            index=models.Index(
+                fields=["updated", "id"], name="pid_provide_updated_3f5d32_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.8 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+def remove_duplicated_main_doi(apps, schema_editor):
+    """
+    Mantém um XMLRelatedItem por main_doi (o de menor id), associando a ele
+    os documentos associados aos duplicados
+    """
+    XMLRelatedItem = apps.get_model("pid_provider", "XMLRelatedItem")
+    PidProviderXML = apps.get_model("pid_provider", "PidProviderXML")
+    Through = PidProviderXML.related_items.through
+
+    kept = {}
+    for item in (
+        XMLRelatedItem.objects.filter(main_doi__isnull=False)
+        .order_by("main_doi", "id")
+        .iterator()
+    ):
+        if item.main_doi not in kept:
+            kept[item.main_doi] = item.id
+            continue
+        main_id = kept[item.main_doi]
+        for pidproviderxml_id in Through.objects.filter(
+            xmlrelateditem_id=item.id
+        ).values_list("pidproviderxml_id", flat=True):
+            Through.objects.get_or_create(
+                pidproviderxml_id=pidproviderxml_id, xmlrelateditem_id=main_id
+            )
+        item.delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0007_xml_feed_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicated_main_doi, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="xmlrelateditem",
+            name="pid_provide_main_do_8e0a2a_idx",
+        ),
+        migrations.AlterField(
+            model_name="xmlrelateditem",
+            name="main_doi",
+            field=models.TextField(
+                blank=True, null=True, unique=True, verbose_name="DOI"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.1.8 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+Z_FIELDS = (
+    "z_article_titles_texts",
+    "z_collab",
+    "z_links",
+    "z_partial_body",
+    "z_surnames",
+)
+
+# converte, em um único ALTER TABLE, os sha256 em hexadecimal (varchar 64)
+# em bytes (bytea 32); os índices dos campos são recriados pelo PostgreSQL
+TO_BINARY = "ALTER TABLE pid_provider_pidproviderxml " + ", ".join(
+    f"ALTER COLUMN {name} TYPE bytea USING decode(NULLIF({name}, ''), 'hex')"
+    for name in Z_FIELDS
+)
+TO_HEX = "ALTER TABLE pid_provider_pidproviderxml " + ", ".join(
+    f"ALTER COLUMN {name} TYPE varchar(64) USING encode({name}, 'hex')"
+    for name in Z_FIELDS
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0008_xmlrelateditem_unique_main_doi"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(TO_BINARY, TO_HEX)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="pidproviderxml",
+                    name="z_article_titles_texts",
+                    field=models.BinaryField(
+                        blank=True,
+                        max_length=32,
+                        null=True,
+                        verbose_name="article_titles_texts",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="pidproviderxml",
+                    name="z_collab",
+                    field=models.BinaryField(
+                        blank=True, max_length=32, null=True, verbose_name="collab"
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="pidproviderxml",
+                    name="z_links",
+                    field=models.BinaryField(
+                        blank=True, max_length=32, null=True, verbose_name="links"
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="pidproviderxml",
+                    name="z_partial_body",
+                    field=models.BinaryField(
+                        blank=True,
+                        max_length=32,
+                        null=True,
+                        verbose_name="partial_body",
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="pidproviderxml",
+                    name="z_surnames",
+                    field=models.BinaryField(
+                        blank=True, max_length=32, null=True, verbose_name="surnames"
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.1.8 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0009_binary_z_fields"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_pkg_nam_009b25_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_journal_bef662_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_issue_i_e27cba_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_elocati_088a9b_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_fpage_aa4aa3_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_fpage_s_cd49cb_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_lpage_7a7852_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_article_e25491_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_main_do_7fb3c9_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_z_artic_a6a417_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_z_surna_2f3ee3_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_z_colla_c14f41_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_z_links_ed20b4_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_z_parti_6ab872_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="pidproviderxml",
+            name="pid_provide_synchro_598b7a_idx",
+        ),
+        migrations.AlterField(
+            model_name="pidproviderxml",
+            name="identity_key",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, verbose_name="identity key"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pidproviderxml",
+            index=models.Index(
+                fields=["v2"],
+                name="pid_provider_xml_v2_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pidproviderxml",
+            index=models.Index(
+                condition=models.Q(("synchronized", False)),
+                fields=["id"],
+                name="pid_provider_xml_unsync_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="pidproviderxml",
+            constraint=models.UniqueConstraint(
+                fields=("identity_key",), name="pid_provider_xml_unique_identity_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.8 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0010_pid_provider_xml_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pidproviderxml",
+            name="sync_started",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.8 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pid_provider", "0011_pidproviderxml_sync_started"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pidproviderjob",
+            name="chunk_started",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,12 +1,29 @@
 import hashlib
+import json
 import logging
 import os
-from datetime import datetime
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from http import HTTPStatus
 from shutil import copyfile
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.db import models
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    IntegrityError,
+    connections,
+    models,
+    transaction,
+)
+from django.db.models import F, Max, Q, Value
+from django.db.models.expressions import CombinedExpression
+from django.utils import timezone
 from django.utils.translation import gettext as _
 from wagtail.admin.panels import FieldPanel
 
@@ -15,8 +32,9 @@ from core.forms import CoreAdminModelForm
 from core.models import CommonControlField
 from files_storage.exceptions import PutXMLContentError
 from files_storage.models import MinioFile
-from pid_provider import exceptions, v3_gen, xml_sps_adapter
-from xmlsps.xml_sps_lib import get_xml_with_pre_from_uri
+from pid_provider import choices, exceptions, metrics, v3_gen, xml_sps_adapter
+from pid_provider.lru import LRUCache
+from xmlsps.xml_sps_lib import get_xml_with_pre_from_uri, get_xml_zip_filenames
 
 LOGGER = logging.getLogger(__name__)
 LOGGER_FMT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
@@ -27,6 +45,94 @@ def utcnow():
     # return datetime.utcnow().isoformat().replace("T", " ") + "Z"
 
 
+# conexão própria de cada thread (_get_autocommit_connection)
+_autocommit = threading.local()
+
+# False quando não há mais registros sem identity_key (os novos registros
+# sempre os têm); veja PidProviderXML._has_documents_without_identity_keys
+_without_identity_keys = True
+
+
+def _get_autocommit_connection():
+    """
+    Conexão própria da thread, mantida aberta entre as execuções de
+    _execute_in_autocommit, e recriada após fork ou se deixou de funcionar
+    """
+    # por processo: a conexão herdada do processo pai é mantida (e não
+    # fechada), pois o socket é compartilhado com ele
+    if not hasattr(_autocommit, "connections"):
+        _autocommit.connections = {}
+    pid = os.getpid()
+    connection = _autocommit.connections.get(pid)
+    if connection is None:
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        _autocommit.connections[pid] = connection
+    elif connection.errors_occurred:
+        if connection.is_usable():
+            connection.errors_occurred = False
+        else:
+            connection.close()
+    return connection
+
+
+def _execute_in_autocommit(sql, params):
+    """
+    Executa `sql` em uma conexão própria, em autocommit, independente da
+    transação em curso
+
+    Returns
+    -------
+    list (valores da primeira coluna do resultado) or None
+    """
+    connection = _get_autocommit_connection()
+    with metrics.counting_queries(connection), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if cursor.description:
+            return [row[0] for row in cursor.fetchall()]
+
+
+def _advisory_lock_key(value):
+    # pg_advisory_xact_lock recebe bigint: os primeiros 64 bits do sha256
+    digest = hashlib.sha256(value.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _advisory_xact_lock(values):
+    """
+    Obtém os bloqueios (PostgreSQL advisory lock) de `values` (str),
+    liberados ao final da transação
+
+    Deve ser executado dentro de transaction.atomic
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != "postgresql":
+        return
+    keys = sorted({_advisory_lock_key(value) for value in values})
+    if keys:
+        with connection.cursor() as cursor:
+            # ordenados para evitar deadlock entre transações
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(key) "
+                "FROM (SELECT unnest(%s::bigint[]) AS key ORDER BY key) AS keys",
+                [keys],
+            )
+
+
+def _intern(interned, key, obj):
+    # somente registros efetivados são mantidos em memória, pois os criados
+    # na transação corrente deixam de existir se ela for desfeita
+    transaction.on_commit(lambda: interned.set(key, obj))
+
+
+def _get_pkg_name(filename):
+    if filename:
+        return os.path.splitext(os.path.basename(filename))[0]
+
+
+def _v3_cache_key(v3):
+    return f"pid_provider:v3_data:{v3}"
+
+
 class PidProviderBadRequest(CommonControlField):
     """
     Tem função de guardar XML que falhou no registro
@@ -39,7 +145,6 @@ class PidProviderBadRequest(CommonControlField):
     xml = models.FileField(upload_to="bad_request")
 
     class Meta:
-
         indexes = [
             models.Index(fields=["basename"]),
             models.Index(fields=["finger_print"]),
@@ -110,20 +215,31 @@ class XMLJournal(models.Model):
     def __str__(self):
         return f"{self.issn_electronic} {self.issn_print}"
 
+    # XMLJournal já obtidos, cuja chave é (issn_electronic, issn_print)
+    interned = LRUCache(getattr(settings, "PID_PROVIDER_INTERNED_JOURNALS", 1000))
+
     @classmethod
     def get_or_create(cls, issn_electronic, issn_print):
-        try:
-            return cls.objects.get(
-                issn_electronic=issn_electronic,
-                issn_print=issn_print,
-            )
-        except cls.DoesNotExist:
-            journal = cls()
-            journal.issn_electronic = issn_electronic
-            journal.issn_print = issn_print
-            journal.save()
+        key = (issn_electronic, issn_print)
+        journal = cls.interned.get(key)
+        if journal:
             return journal
 
+        params = dict(issn_electronic=issn_electronic, issn_print=issn_print)
+        journal = cls.objects.filter(**params).first()
+        if not journal:
+            with transaction.atomic():
+                # impede a criação simultânea do mesmo XMLJournal
+                _advisory_xact_lock([f"XMLJournal {key}"])
+                journal = cls.objects.filter(**params).first()
+                if not journal:
+                    journal = cls()
+                    journal.issn_electronic = issn_electronic
+                    journal.issn_print = issn_print
+                    journal.save()
+        _intern(cls.interned, key, journal)
+        return journal
+
 
 class XMLIssue(models.Model):
     """
@@ -156,26 +272,227 @@ class XMLIssue(models.Model):
             f'{self.journal} {self.volume or ""} {self.number or ""} {self.suppl or ""}'
         )
 
+    # XMLIssue já obtidos, cuja chave é
+    # (journal_id, volume, number, suppl, pub_year)
+    interned = LRUCache(getattr(settings, "PID_PROVIDER_INTERNED_ISSUES", 1000))
+
     @classmethod
     def get_or_create(cls, journal, volume, number, suppl, pub_year):
-        try:
-            return cls.objects.get(
-                journal=journal,
-                volume=volume,
-                number=number,
-                suppl=suppl,
-                pub_year=pub_year,
-            )
-        except cls.DoesNotExist:
-            issue = cls()
-            issue.journal = journal
-            issue.volume = volume
-            issue.number = number
-            issue.suppl = suppl
-            issue.pub_year = pub_year
-            issue.save()
+        key = (journal and journal.id, volume, number, suppl, pub_year)
+        issue = cls.interned.get(key)
+        if issue:
             return issue
 
+        params = dict(
+            journal=journal,
+            volume=volume,
+            number=number,
+            suppl=suppl,
+            pub_year=pub_year,
+        )
+        issue = cls.objects.filter(**params).first()
+        if not issue:
+            with transaction.atomic():
+                # impede a criação simultânea do mesmo XMLIssue
+                _advisory_xact_lock([f"XMLIssue {key}"])
+                issue = cls.objects.filter(**params).first()
+                if not issue:
+                    issue = cls()
+                    issue.journal = journal
+                    issue.volume = volume
+                    issue.number = number
+                    issue.suppl = suppl
+                    issue.pub_year = pub_year
+                    issue.save()
+        _intern(cls.interned, key, issue)
+        return issue
+
+
+class PidProviderJob(CommonControlField):
+    """
+    Registro assíncrono (tasks.provide_pid_for_job) dos XML de um
+    arquivo compactado, processados em partes
+    """
+
+    file = models.FileField(upload_to="pid_provider_jobs", null=True, blank=True)
+    filename = models.TextField(_("Filename"), null=True, blank=True)
+    status = models.CharField(
+        _("Status"),
+        max_length=10,
+        choices=choices.JOB_STATUS,
+        default=choices.JOB_QUEUED,
+    )
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    results = models.JSONField(default=list, blank=True)
+    message = models.TextField(_("Message"), null=True, blank=True)
+    # início da parte em execução (None enquanto a próxima parte aguarda na fila)
+    chunk_started = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} {self.status}"
+
+    @property
+    def data(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "errors": self.errors,
+            "message": self.message,
+            "results": self.results,
+            "created": self.created and self.created.isoformat(),
+            "updated": self.updated and self.updated.isoformat(),
+        }
+
+    @classmethod
+    def create(cls, uploaded_file, creator):
+        obj = cls()
+        obj.filename = uploaded_file.name
+        obj.file = uploaded_file
+        obj.creator = creator
+        obj.save()
+        return obj
+
+    @property
+    def xml_filenames(self):
+        return get_xml_zip_filenames(self.file.path)
+
+    def start_chunk(self, user, first=False):
+        """
+        Marca o início da execução de uma parte (chunk_started)
+
+        Returns
+        -------
+        bool (False se o registro não está em execução, por exemplo,
+        finalizado por fail_stale_jobs enquanto a parte aguardava na fila)
+        """
+        now = timezone.now()
+        started = PidProviderJob.objects.filter(
+            pk=self.pk,
+            status=choices.JOB_QUEUED if first else choices.JOB_RUNNING,
+        ).update(
+            status=choices.JOB_RUNNING,
+            chunk_started=now,
+            updated_by=user,
+            updated=now,
+        )
+        if started:
+            self.status = choices.JOB_RUNNING
+            self.chunk_started = now
+            self.updated_by = user
+            self.updated = now
+        return bool(started)
+
+    def start(self, total, user):
+        self.status = choices.JOB_RUNNING
+        self.total = total
+        self.updated_by = user
+        self.save(update_fields=["status", "total", "updated_by", "updated"])
+
+    def add_results(self, results, user):
+        """
+        Adiciona os resultados (PidProviderXML.register) de uma parte
+
+        Os resultados são acrescentados aos já registrados pelo banco de dados
+        (jsonb ||), sem que os anteriores sejam lidos e gravados novamente
+
+        Returns
+        -------
+        bool (False se o registro deixou de estar em execução)
+        """
+        # article, datas etc são armazenados como str
+        results = json.loads(json.dumps(results, default=str))
+        errors = len([item for item in results if item.get("error_type")])
+        added = PidProviderJob.objects.filter(
+            pk=self.pk, status=choices.JOB_RUNNING
+        ).update(
+            results=CombinedExpression(
+                F("results"),
+                "||",
+                Value(results, output_field=models.JSONField()),
+                output_field=models.JSONField(),
+            ),
+            processed=F("processed") + len(results),
+            errors=F("errors") + errors,
+            chunk_started=None,
+            updated_by=user,
+            updated=timezone.now(),
+        )
+        self.refresh_from_db(
+            fields=["status", "processed", "errors", "chunk_started", "updated"]
+        )
+        self.updated_by = user
+        return bool(added)
+
+    def finish(self, user, exception=None):
+        """
+        Finaliza o registro, exceto se já foi finalizado (por exemplo, por
+        fail_stale_jobs), para que a mensagem existente não seja sobrescrita
+
+        Returns
+        -------
+        bool (False se o registro já estava finalizado)
+        """
+        status = choices.JOB_FAILED if exception else choices.JOB_FINISHED
+        message = f"{type(exception)} {exception}" if exception else self.message
+        finished = PidProviderJob.objects.filter(
+            pk=self.pk,
+            status__in=(choices.JOB_QUEUED, choices.JOB_RUNNING),
+        ).update(
+            status=status,
+            message=message,
+            chunk_started=None,
+            updated_by=user,
+            updated=timezone.now(),
+        )
+        if not finished:
+            return False
+        self.status = status
+        self.message = message
+        self.chunk_started = None
+        self.updated_by = user
+        self.file.delete(save=False)
+        self.save(update_fields=["file"])
+        return True
+
+    @classmethod
+    def fail_stale_jobs(cls, user=None):
+        """
+        Finaliza como falhos os registros cuja parte em execução foi iniciada
+        há mais de PID_PROVIDER_JOB_TIMEOUT segundos (por exemplo, pela
+        interrupção do worker)
+
+        Registros cuja próxima parte aguarda na fila (chunk_started vazio)
+        não são finalizados
+
+        Returns
+        -------
+        int (quantidade de registros finalizados)
+        """
+        timeout = getattr(settings, "PID_PROVIDER_JOB_TIMEOUT", 3600)
+        jobs = cls.objects.filter(
+            status=choices.JOB_RUNNING,
+            chunk_started__lt=timezone.now() - timedelta(seconds=timeout),
+        ).defer("results")
+        failed = 0
+        for job in jobs:
+            failed += job.finish(
+                user,
+                exceptions.PidProviderJobTimeoutError(
+                    f"No progress since {job.chunk_started.isoformat()}"
+                ),
+            )
+        return failed
+
 
 class SyncFailure(CommonControlField):
     message = models.CharField(_("Message"), max_length=255, null=True, blank=True)
@@ -189,11 +506,10 @@ class SyncFailure(CommonControlField):
 
     @classmethod
     def create(cls, message, e, creator):
-        exc_type, exc_value, exc_traceback = sys.exc_info()
         obj = cls()
         obj.message = message
         obj.exception_msg = str(e)[:555]
-        obj.traceback = [str(item) for item in traceback.extract_tb(exc_traceback)]
+        obj.traceback = [str(item) for item in traceback.extract_tb(e.__traceback__)]
         obj.exception_type = str(type(e))
         obj.creator = creator
         obj.created = utcnow()
@@ -233,33 +549,354 @@ class XMLVersion(MinioFile):
         return obj
 
 
+class XMLRawInput(models.Model):
+    """
+    Conteúdo original (bytes) de XML aceito no registro, identificado
+    pelo seu sha256, e a versão do XML (XMLVersion) resultante
+
+    Permite responder ao reenvio do mesmo conteúdo sem processá-lo,
+    enquanto a versão for a versão corrente do documento
+    """
+
+    finger_print = models.CharField(max_length=64, unique=True)
+    xml_version = models.ForeignKey(XMLVersion, on_delete=models.CASCADE)
+    xml_changed = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.finger_print
+
+    @classmethod
+    def get_registered_data(cls, finger_prints):
+        """
+        Retorna, com uma única consulta, os dados dos documentos registrados
+        cujo conteúdo original corresponde a `finger_prints`
+
+        Returns
+        -------
+        dict which keys are finger prints and values are
+            {"record_status": "retrieved", **PidProviderXML.data, "xml_changed": bool}
+        """
+        found = {}
+        items = cls.objects.filter(
+            finger_print__in=finger_prints,
+            xml_version__xml_doc_pid__current_version=models.F("xml_version"),
+        ).select_related(
+            "xml_version__xml_doc_pid__current_version",
+            "xml_version__xml_doc_pid__article",
+        )
+        for item in items:
+            data = {"record_status": "retrieved"}
+            data.update(item.xml_version.xml_doc_pid.data)
+            data["xml_changed"] = item.xml_changed
+            found[item.finger_print] = data
+        return found
+
+    @classmethod
+    def add_items(cls, items):
+        """
+        Registra os conteúdos originais `items`
+
+        Arguments
+        ---------
+        items : list of tuples (finger_print, PidProviderXML, xml_changed)
+        """
+        objs = {}
+        for finger_print, registered, xml_changed in items:
+            if finger_print and registered.current_version_id:
+                objs[finger_print] = cls(
+                    finger_print=finger_print,
+                    xml_version_id=registered.current_version_id,
+                    xml_changed=xml_changed,
+                )
+        if objs:
+            cls.objects.bulk_create(
+                objs.values(),
+                update_conflicts=True,
+                unique_fields=["finger_print"],
+                update_fields=["xml_version", "xml_changed"],
+            )
+
+
 class XMLRelatedItem(CommonControlField):
     """
     Tem função de guardar os relacionamentos entre outro Documento (Artigo)
     Tem objetivo de identificar o Documento (Artigo)
     """
 
-    main_doi = models.TextField(_("DOI"), null=True, blank=True)
+    main_doi = models.TextField(_("DOI"), null=True, blank=True, unique=True)
+
+    def __str__(self):
+        return self.main_doi
+
+    @classmethod
+    def get_or_create(cls, main_doi, creator=None):
+        return cls.get_or_create_many([main_doi], creator)[main_doi]
+
+    @classmethod
+    def get_or_create_many(cls, main_dois, creator=None):
+        """
+        Obtém os itens de `main_dois` com uma consulta e cria os ausentes
+        com `bulk_create`, ignorando os criados simultaneamente
+
+        Returns
+        -------
+        dict which keys are main_dois and values are XMLRelatedItem
+        """
+        main_dois = set(main_dois)
+        found = {
+            obj.main_doi: obj for obj in cls.objects.filter(main_doi__in=main_dois)
+        }
+        missing = main_dois - set(found)
+        if missing:
+            created = utcnow()
+            cls.objects.bulk_create(
+                [
+                    cls(main_doi=main_doi, creator=creator, created=created)
+                    for main_doi in missing
+                ],
+                ignore_conflicts=True,
+            )
+            # bulk_create com ignore_conflicts não retorna os ids
+            found.update(
+                {obj.main_doi: obj for obj in cls.objects.filter(main_doi__in=missing)}
+            )
+        return found
+
+
+class V3Reservation(models.Model):
+    """
+    Reserva de v3 gerados em bloco (V3Pool)
+
+    Cada v3 é único na tabela; o v3 reservado fica associado ao worker que o
+    obteve (claimed_by) até ser usado. Reservas não renovadas dentro de
+    PID_PROVIDER_V3_POOL_CLAIM_TIMEOUT (ex.: worker interrompido) voltam a
+    ficar disponíveis, exceto se o v3 já foi atribuído a um PidProviderXML
+
+    As operações são executadas em uma conexão própria, em autocommit,
+    para que as reservas não dependam da transação de quem as solicita
+    """
+
+    v3 = models.CharField(_("v3"), max_length=23, unique=True)
+    claimed_by = models.CharField(max_length=100, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=["main_doi"]),
+            models.Index(fields=["claimed_by"]),
         ]
 
     def __str__(self):
-        return self.main_doi
+        return self.v3
 
     @classmethod
-    def get_or_create(cls, main_doi, creator=None):
-        try:
-            return cls.objects.get(main_doi=main_doi)
-        except cls.DoesNotExist:
-            obj = cls()
-            obj.main_doi = main_doi
-            obj.creator = creator
-            obj.created = utcnow()
-            obj.save()
-            return obj
+    def mint(cls, quantity):
+        """
+        Gera `quantity` v3 inéditos e os adiciona à tabela de reservas
+
+        Os gerados que coincidem com v3 já registrados são descartados com
+        uma única consulta e os repetidos são ignorados pela restrição unique
+        """
+        generated = {v3_gen.generates() for i in range(quantity)}
+        generated -= set(
+            PidProviderXML.objects.filter(v3__in=generated).values_list("v3", flat=True)
+        )
+        if generated:
+            _execute_in_autocommit(
+                f"INSERT INTO {cls._meta.db_table} (v3) "
+                f"SELECT unnest(%s::varchar[]) ON CONFLICT (v3) DO NOTHING",
+                [list(generated)],
+            )
+
+    @classmethod
+    def claim(cls, worker, quantity, timeout):
+        """
+        Renova as reservas de `worker` e reserva mais `quantity` v3 para ele
+
+        Returns
+        -------
+        list of str
+        """
+        table = cls._meta.db_table
+        _execute_in_autocommit(
+            f"UPDATE {table} SET claimed_at = NOW() WHERE claimed_by = %s",
+            [worker],
+        )
+        claimed = []
+        for attempt in range(2):
+            claimed += _execute_in_autocommit(
+                f"""
+                UPDATE {table} SET claimed_by = %s, claimed_at = NOW()
+                WHERE id IN (
+                    SELECT r.id FROM {table} r
+                    WHERE (
+                        r.claimed_by IS NULL
+                        OR r.claimed_at < NOW() - %s * INTERVAL '1 second'
+                    )
+                    AND NOT EXISTS (
+                        SELECT 1 FROM {PidProviderXML._meta.db_table} d
+                        WHERE d.v3 = r.v3
+                    )
+                    ORDER BY r.id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING v3
+                """,
+                [worker, timeout, quantity - len(claimed)],
+            )
+            if len(claimed) >= quantity:
+                break
+            cls.mint(quantity - len(claimed))
+        return claimed
+
+    @classmethod
+    def release(cls, v3s):
+        """
+        Remove as reservas dos v3 já usados
+        """
+        if v3s:
+            _execute_in_autocommit(
+                f"DELETE FROM {cls._meta.db_table} WHERE v3 = ANY(%s::varchar[])",
+                [list(v3s)],
+            )
+
+
+class V2Sequence(models.Model):
+    """
+    Sequência dos v2 de cada prefixo S{issn}{year}
+
+    O sufixo (9 dígitos) é obtido incrementando `last_value` atomicamente,
+    em uma conexão própria, o que permite alocações concorrentes sem colisão
+    """
+
+    prefix = models.CharField(_("prefix"), max_length=14, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix} {self.last_value}"
+
+    @classmethod
+    def allocate(cls, prefix, quantity=1):
+        """
+        Aloca `quantity` v2 consecutivos para `prefix`
+
+        Returns
+        -------
+        list of str
+        """
+        table = cls._meta.db_table
+        values = _execute_in_autocommit(
+            f"UPDATE {table} SET last_value = last_value + %s "
+            f"WHERE prefix = %s RETURNING last_value",
+            [quantity, prefix],
+        )
+        if not values:
+            # primeira alocação do prefixo, que pode ser simultânea em
+            # outro worker
+            values = _execute_in_autocommit(
+                f"INSERT INTO {table} (prefix, last_value) VALUES (%s, %s) "
+                f"ON CONFLICT (prefix) "
+                f"DO UPDATE SET last_value = {table}.last_value + %s "
+                f"RETURNING last_value",
+                [
+                    prefix,
+                    cls._get_registered_last_value(prefix) + quantity,
+                    quantity,
+                ],
+            )
+        last_value = values[0]
+        return [
+            f"{prefix}{str(value).zfill(9)}"
+            for value in range(last_value - quantity + 1, last_value + 1)
+        ]
+
+    @classmethod
+    def _get_registered_last_value(cls, prefix):
+        """
+        Obtém o maior sufixo dos v2 registrados com `prefix`
+        """
+        # os sufixos têm 9 dígitos: o maior v2 tem o maior sufixo
+        last_v2 = PidProviderXML.objects.filter(
+            v2__startswith=prefix, v2__regex=rf"^{re.escape(prefix)}[0-9]{{9}}$"
+        ).aggregate(last_v2=Max("v2"))["last_v2"]
+        return int(last_v2[len(prefix) :]) if last_v2 else 0
+
+
+class V3Pool:
+    """
+    Conjunto local de v3 reservados (V3Reservation) em blocos de
+    PID_PROVIDER_V3_POOL_SIZE, reabastecido quando restam
+    PID_PROVIDER_V3_POOL_MIN_SIZE ou menos
+
+    Seguro para threads; após fork, o processo filho obtém novas reservas
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def size(self):
+        return getattr(settings, "PID_PROVIDER_V3_POOL_SIZE", 100)
+
+    @property
+    def min_size(self):
+        return getattr(settings, "PID_PROVIDER_V3_POOL_MIN_SIZE", 10)
+
+    @property
+    def claim_timeout(self):
+        # segundos
+        return getattr(settings, "PID_PROVIDER_V3_POOL_CLAIM_TIMEOUT", 3600)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._worker = f"{os.uname().nodename}:{self._pid}:{v3_gen.generates()}"
+        self._v3s = []
+        self._used = []
+        self._claimed_at = None
+
+    def get(self):
+        """
+        Retorna um v3 reservado para este worker
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if (
+                self._claimed_at
+                and time.monotonic() - self._claimed_at > self.claim_timeout
+            ):
+                # as reservas podem ter sido liberadas para outros workers
+                self._v3s = []
+            if len(self._v3s) <= self.min_size:
+                self._refill()
+            if not self._v3s:
+                # as reservas disponíveis foram obtidas por outros workers
+                return self._generate()
+            v3 = self._v3s.pop(0)
+            self._used.append(v3)
+            return v3
+
+    def _generate(self):
+        """
+        Gera um v3 não registrado, sem reservá-lo
+        """
+        while True:
+            v3 = v3_gen.generates()
+            if not PidProviderXML._is_registered_pid(v3=v3):
+                return v3
+
+    def _refill(self):
+        claimed_at = time.monotonic()
+        V3Reservation.release(self._used)
+        self._used = []
+        self._v3s.extend(
+            V3Reservation.claim(
+                self._worker, self.size - len(self._v3s), self.claim_timeout
+            )
+        )
+        self._claimed_at = claimed_at
 
 
 class PidProviderXML(CommonControlField):
@@ -296,39 +933,96 @@ class PidProviderXML(CommonControlField):
     main_toc_section = models.TextField(_("main_toc_section"), null=True, blank=True)
     main_doi = models.TextField(_("DOI"), null=True, blank=True)
 
-    z_article_titles_texts = models.CharField(
-        _("article_titles_texts"), max_length=64, null=True, blank=True
+    # sha256 (32 bytes) dos textos padronizados (xml_sps_adapter._digest)
+    z_article_titles_texts = models.BinaryField(
+        _("article_titles_texts"), max_length=32, null=True, blank=True
     )
-    z_surnames = models.CharField(_("surnames"), max_length=64, null=True, blank=True)
-    z_collab = models.CharField(_("collab"), max_length=64, null=True, blank=True)
-    z_links = models.CharField(_("links"), max_length=64, null=True, blank=True)
-    z_partial_body = models.CharField(
-        _("partial_body"), max_length=64, null=True, blank=True
+    z_surnames = models.BinaryField(_("surnames"), max_length=32, null=True, blank=True)
+    z_collab = models.BinaryField(_("collab"), max_length=32, null=True, blank=True)
+    z_links = models.BinaryField(_("links"), max_length=32, null=True, blank=True)
+    z_partial_body = models.BinaryField(
+        _("partial_body"), max_length=32, null=True, blank=True
+    )
+
+    # identificadores canônicos obtidos dos mesmos dados usados nas consultas
+    # (xml_sps_adapter.identity_digest), com e sem os dados de fascículo
+    identity_key = models.CharField(
+        _("identity key"), max_length=64, null=True, blank=True
+    )
+    aop_identity_key = models.CharField(
+        _("AOP identity key"), max_length=64, null=True, blank=True
     )
 
     synchronized = models.BooleanField(null=True, blank=True, default=False)
     sync_failure = models.ForeignKey(
         SyncFailure, null=True, blank=True, on_delete=models.SET_NULL
     )
+    # início da sincronização em curso (sync.synchronize)
+    sync_started = models.DateTimeField(null=True, blank=True)
+
+    # campos atualizados por PidProviderXML.register_many
+    BULK_UPDATE_FIELDS = [
+        "journal",
+        "issue",
+        "current_version",
+        "pkg_name",
+        "v3",
+        "v2",
+        "aop_pid",
+        "elocation_id",
+        "fpage",
+        "fpage_seq",
+        "lpage",
+        "article_pub_year",
+        "main_toc_section",
+        "main_doi",
+        "z_article_titles_texts",
+        "z_surnames",
+        "z_collab",
+        "z_links",
+        "z_partial_body",
+        "identity_key",
+        "aop_identity_key",
+        "synchronized",
+        "updated_by",
+        "updated",
+    ]
 
     class Meta:
+        # as duas formas de consulta de query_list (com e sem os dados de
+        # fascículo) são feitas pelos identificadores canônicos:
+        # identity_key (pid_provider_xml_unique_identity_key) e
+        # aop_identity_key, sem ou com issue IS NULL
+        # (pid_provider_xml_unique_aop_identity_key); journal e issue são
+        # indexados como ForeignKey
         indexes = [
-            models.Index(fields=["pkg_name"]),
             models.Index(fields=["v3"]),
-            models.Index(fields=["journal"]),
-            models.Index(fields=["issue"]),
-            models.Index(fields=["elocation_id"]),
-            models.Index(fields=["fpage"]),
-            models.Index(fields=["fpage_seq"]),
-            models.Index(fields=["lpage"]),
-            models.Index(fields=["article_pub_year"]),
-            models.Index(fields=["main_doi"]),
-            models.Index(fields=["z_article_titles_texts"]),
-            models.Index(fields=["z_surnames"]),
-            models.Index(fields=["z_collab"]),
-            models.Index(fields=["z_links"]),
-            models.Index(fields=["z_partial_body"]),
-            models.Index(fields=["synchronized"]),
+            # consultas por v2 e por prefixo de v2 (V2Sequence)
+            models.Index(
+                fields=["v2"],
+                name="pid_provider_xml_v2_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            models.Index(fields=["aop_identity_key"]),
+            models.Index(
+                fields=["id"],
+                condition=Q(synchronized=False),
+                name="pid_provider_xml_unsync_idx",
+            ),
+            models.Index(fields=["updated", "id"]),
+        ]
+        constraints = [
+            # UniqueConstraint, ao contrário de unique=True, não cria
+            # o índice varchar_pattern_ops, desnecessário para identity_key
+            models.UniqueConstraint(
+                fields=["identity_key"],
+                name="pid_provider_xml_unique_identity_key",
+            ),
+            models.UniqueConstraint(
+                fields=["aop_identity_key"],
+                condition=Q(issue__isnull=True),
+                name="pid_provider_xml_unique_aop_identity_key",
+            ),
         ]
 
     def __str__(self):
@@ -346,35 +1040,72 @@ class PidProviderXML(CommonControlField):
             "updated": self.updated and self.updated.isoformat(),
         }
 
+    @property
+    def cache_data(self):
+        """
+        data somente com valores primitivos (article é o id de Article),
+        que é armazenado no cache por get_many
+        """
+        return {
+            "v3": self.v3,
+            "v2": self.v2,
+            "aop_pid": self.aop_pid,
+            "xml_uri": self.xml_uri,
+            "article": self.article_id,
+            "created": self.created and self.created.isoformat(),
+            "updated": self.updated and self.updated.isoformat(),
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidate_cache([self.v3])
+
     @classmethod
     def xml_feed(
-        cls, from_ingress_date=None, issn=None, pub_year=None, include_has_article=False
+        cls,
+        from_ingress_date=None,
+        issn=None,
+        pub_year=None,
+        include_has_article=False,
+        after=None,
+        limit=None,
     ):
         """
         Retorna a lista de XML para alimentar o modelo Article e relacionados
+
+        Os registros são ordenados por (updated, id) e paginados por chave:
+        a próxima página é obtida informando em `after` o (updated, id) do
+        último registro da página anterior, de modo que o custo da consulta
+        não depende da posição da página
+
+        Parameters
+        ----------
+        after : tuple (datetime, int)
+        limit : int
+            quantidade máxima de registros
         """
         params = {}
         if not include_has_article:
             params["article__isnull"] = True
         if from_ingress_date:
             params["updated__gte"] = from_ingress_date
-        qs = None
+        qs = Q(**params)
         if issn:
-            qs = Q(journal__issn_electronic=issn) | Q(journal__issn_print=issn)
+            qs &= Q(journal__issn_electronic=issn) | Q(journal__issn_print=issn)
         if pub_year:
-            if qs:
-                qs = qs & Q(issn__pub_year=pub_year)
-            else:
-                qs = Q(issn__pub_year=pub_year)
-
-        if qs and params:
-            yield from cls.objects.filter(qs, **params).order_by("updated").iterator()
-        elif qs:
-            yield from cls.objects.filter(qs).order_by("updated").iterator()
-        elif params:
-            yield from cls.objects.filter(**params).order_by("updated").iterator()
-        else:
-            yield from cls.objects.order_by("updated").iterator()
+            qs &= Q(issue__pub_year=pub_year)
+        if after:
+            updated, id = after
+            qs &= Q(updated__gt=updated) | Q(updated=updated, id__gt=id)
+
+        queryset = (
+            cls.objects.filter(qs)
+            .select_related("journal", "issue", "article", "current_version")
+            .order_by("updated", "id")
+        )
+        if limit:
+            queryset = queryset[:limit]
+        yield from queryset.iterator()
 
     @classmethod
     def unsynchronized(cls):
@@ -388,7 +1119,9 @@ class PidProviderXML(CommonControlField):
     @property
     def xml_with_pre(self):
         try:
-            self._xml_with_pre = get_xml_with_pre_from_uri(self.xml_uri)
+            # o nome do arquivo (XMLVersion) contém o sha256 do conteúdo,
+            # que, portanto, não se altera
+            self._xml_with_pre = get_xml_with_pre_from_uri(self.xml_uri, cache=True)
         except Exception as e:
             raise exceptions.PidProviderXMLWithPreError(
                 _("Unable to get xml with pre (PidProviderXML) {}: {} {}").format(
@@ -420,12 +1153,59 @@ class PidProviderXML(CommonControlField):
 
     @classmethod
     def get_xml_uri(cls, v3):
-        try:
-            item = cls.objects.get(v3=v3)
-        except cls.DoesNotExist:
-            return None
-        else:
-            return item.xml_uri
+        item = cls.get_many([v3]).get(v3)
+        return item and item["xml_uri"]
+
+    @classmethod
+    def get_data(cls, v3):
+        """
+        Retorna PidProviderXML.cache_data do documento de `v3` ou None
+        """
+        item = cls.get_many([v3]).get(v3)
+        return item and item["data"]
+
+    @classmethod
+    def get_many(cls, v3s):
+        """
+        Obtém xml_uri e data dos documentos de `v3s`, consultando o cache
+        e, com uma única consulta, o banco de dados para os ausentes no cache
+
+        Os acertos e as falhas são contabilizados em metrics.v3_cache_hit_rate
+
+        Returns
+        -------
+        dict which keys are the registered v3 and values are
+            {"xml_uri": str, "data": dict (PidProviderXML.cache_data)}
+        """
+        v3s = [v3 for v3 in set(v3s) if v3]
+        keys = {_v3_cache_key(v3): v3 for v3 in v3s}
+        found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+        metrics.increment(metrics.V3_CACHE_HITS, len(found))
+
+        missing = [v3 for v3 in v3s if v3 not in found]
+        metrics.increment(metrics.V3_CACHE_MISSES, len(missing))
+        if missing:
+            items = {}
+            for doc in cls.objects.filter(v3__in=missing).select_related(
+                "current_version"
+            ):
+                items[doc.v3] = {"xml_uri": doc.xml_uri, "data": doc.cache_data}
+            cache.set_many(
+                {_v3_cache_key(v3): item for v3, item in items.items()},
+                timeout=getattr(settings, "PID_PROVIDER_V3_CACHE_TIMEOUT", 3600),
+            )
+            found.update(items)
+        return found
+
+    @classmethod
+    def invalidate_cache(cls, v3s):
+        """
+        Remove do cache (get_many) os dados dos documentos de `v3s`,
+        após a efetivação da transação corrente
+        """
+        keys = [_v3_cache_key(v3) for v3 in v3s if v3]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
 
     @classmethod
     def register(
@@ -436,7 +1216,7 @@ class PidProviderXML(CommonControlField):
 
         Parameters
         ----------
-        xml : XMLWithPre
+        xml : XMLWithPre or PidProviderXMLAdapter
         filename : str
         user : User
 
@@ -462,72 +1242,506 @@ class PidProviderXML(CommonControlField):
             }
 
         """
-        try:
+        with metrics.document(filename), metrics.stage(metrics.REGISTER):
+            try:
+                pkg_name, ext = os.path.splitext(os.path.basename(filename))
+                logging.info(f"PidProviderXML.register {filename}")
+
+                # adaptador do xml with pre
+                xml_adapter = xml_sps_adapter.as_xml_adapter(xml_with_pre, pkg_name)
+
+                with transaction.atomic():
+                    # impede que o mesmo documento seja registrado simultaneamente
+                    cls._lock_identities([xml_adapter])
+
+                    # consulta se documento já está registrado
+                    registered = cls._query_document(xml_adapter)
+
+                    # analisa se aceita ou rejeita registro
+                    cls.evaluate_registration(xml_adapter, registered)
+
+                    # verfica os PIDs encontrados no XML / atualiza-os se necessário
+                    with metrics.stage(metrics.COMPLETE_PIDS):
+                        xml_changed = cls._complete_pids(xml_adapter, registered)
+
+                    data = {}
+                    if registered:
+                        data["record_status"] = "retrieved"
+                        if not registered.is_equal_to(xml_adapter):
+                            registered._update(
+                                xml_adapter,
+                                user,
+                                push_xml_content,
+                                filename,
+                                pkg_name,
+                                synchronized,
+                            )
+                            data["record_status"] = "updated"
+                    else:
+                        registered = cls._create(
+                            xml_adapter,
+                            user,
+                            push_xml_content,
+                            filename,
+                            pkg_name,
+                            synchronized,
+                        )
+                        data["record_status"] = "created"
+
+                    data.update(registered.data)
+                    data["xml_changed"] = xml_changed
+
+                    with metrics.stage(metrics.RAW_INPUT):
+                        XMLRawInput.add_items(
+                            [(xml_adapter.raw_finger_print, registered, xml_changed)]
+                        )
+                return data
+
+            except (
+                exceptions.ForbiddenPidProviderXMLRegistrationError,
+                exceptions.NotEnoughParametersToGetDocumentRecordError,
+                exceptions.QueryDocumentMultipleObjectsReturnedError,
+                exceptions.DuplicatedDocumentIdentityError,
+                PutXMLContentError,
+            ) as e:
+                bad_request = PidProviderBadRequest.get_or_create(
+                    user,
+                    filename,
+                    e,
+                    xml_adapter,
+                )
+                return bad_request.data
+
+    @classmethod
+    def register_many(
+        cls, items, user, push_xml_content, synchronized=None, max_workers=None
+    ):
+        """
+        Evaluate a list of XML and returns corresponding PID v3, v2, aop_pid
+        of each one, in the same order of `items`
+
+        Os documentos registrados são consultados em conjunto,
+        os novos são inseridos com `bulk_create`, os alterados são atualizados
+        com `bulk_update` e os conteúdos XML são enviados concorrentemente,
+        antes da transação em que os registros são gravados
+
+        Parameters
+        ----------
+        items : list of tuples (XMLWithPre or PidProviderXMLAdapter, filename)
+        user : User
+        push_xml_content : callable
+        synchronized : bool
+        max_workers : int
+            quantidade de threads para envio dos conteúdos XML
+
+        Returns
+        -------
+            list of dict (see PidProviderXML.register)
+        """
+        with metrics.document(f"register_many ({len(items)} items)"):
+            return cls._register_many(
+                items, user, push_xml_content, synchronized, max_workers
+            )
+
+    @classmethod
+    def _register_many(cls, items, user, push_xml_content, synchronized, max_workers):
+        results = [None] * len(items)
+        pending = []
+        for index, (xml_with_pre, filename) in enumerate(items):
+            logging.info(f"PidProviderXML.register_many {filename}")
             pkg_name, ext = os.path.splitext(os.path.basename(filename))
-            logging.info(f"PidProviderXML.register {filename}")
+            item = dict(
+                index=index,
+                xml_with_pre=xml_with_pre,
+                filename=filename,
+                pkg_name=pkg_name,
+                xml_adapter=xml_sps_adapter.as_xml_adapter(xml_with_pre, pkg_name),
+            )
+            try:
+                for params in item["xml_adapter"].query_list:
+                    cls.validate_query_params(params)
+                item["legacy_query_list"] = item["xml_adapter"].query_list
+                item["query_list"] = item["xml_adapter"].identity_query_list
+            except exceptions.NotEnoughParametersToGetDocumentRecordError as e:
+                results[index] = cls._get_bad_request_data(user, item, e)
+                continue
+            pending.append(item)
 
-            # adaptador do xml with pre
-            xml_adapter = xml_sps_adapter.PidProviderXMLAdapter(xml_with_pre)
+        # os documentos são consultados, os PIDs são completados e os
+        # conteúdos XML são enviados antes da transação, de modo que os
+        # bloqueios (_lock_identities) não são mantidos durante os envios
+        cls._query_documents(pending)
 
-            # consulta se documento já está registrado
-            registered = cls._query_document(xml_adapter)
+        accepted = []
+        deferred = []
+        new_identities = set()
+        for item in pending:
+            try:
+                if item.get("error"):
+                    raise item["error"]
+                cls.evaluate_registration(item["xml_adapter"], item["registered"])
+            except (
+                exceptions.ForbiddenPidProviderXMLRegistrationError,
+                exceptions.QueryDocumentMultipleObjectsReturnedError,
+            ) as e:
+                results[item["index"]] = cls._get_bad_request_data(user, item, e)
+                continue
+
+            if not item["registered"]:
+                # documentos novos repetidos no mesmo lote são registrados
+                # individualmente, após o registro do primeiro
+                identity = tuple(item["query_list"][0].items())
+                if identity in new_identities:
+                    deferred.append(item)
+                    continue
+                new_identities.add(identity)
+            accepted.append(item)
+
+        cls._complete_pids_in_bulk(accepted)
+
+        to_write = []
+        for item in accepted:
+            registered = item["registered"]
+            if not registered:
+                item["record_status"] = "created"
+                to_write.append(item)
+            elif not registered.is_equal_to(item["xml_adapter"]):
+                item["record_status"] = "updated"
+                to_write.append(item)
+            else:
+                item["record_status"] = "retrieved"
+
+        for item in cls._push_xml_contents(to_write, push_xml_content, max_workers):
+            if item.get("error"):
+                results[item["index"]] = cls._get_bad_request_data(
+                    user, item, item["error"]
+                )
+                accepted.remove(item)
 
-            # analisa se aceita ou rejeita registro
-            evaluate_registration(xml_adapter, registered)
+        with transaction.atomic():
+            # impede que os mesmos documentos sejam registrados simultaneamente
+            cls._lock_identities([item["xml_adapter"] for item in accepted])
 
-            # verfica os PIDs encontrados no XML / atualiza-os se necessário
-            xml_changed = cls._complete_pids(xml_adapter, registered)
+            # os documentos registrados ou alterados por outro worker após
+            # a consulta são registrados individualmente
+            changed = cls._get_changed_documents(accepted)
+            deferred = changed + deferred
+            accepted = [item for item in accepted if item not in changed]
 
-            data = {}
-            if registered:
-                data["record_status"] = "retrieved"
-                if not registered.is_equal_to(xml_adapter):
-                    registered._update(
-                        xml_adapter,
+            try:
+                with transaction.atomic():
+                    cls._save_in_bulk(
+                        [
+                            item
+                            for item in accepted
+                            if item["record_status"] != "retrieved"
+                        ],
                         user,
-                        push_xml_content,
-                        filename,
-                        pkg_name,
                         synchronized,
                     )
-                    data["record_status"] = "updated"
-            else:
-                registered = cls._create(
-                    xml_adapter,
-                    user,
-                    push_xml_content,
-                    filename,
-                    pkg_name,
-                    synchronized,
+            except IntegrityError as e:
+                # algum documento foi registrado concorrentemente com a mesma
+                # identidade; registra individualmente os documentos do lote
+                LOGGER.exception(e)
+                deferred = accepted + deferred
+                accepted = []
+
+            for item in accepted:
+                data = {"record_status": item["record_status"]}
+                data.update(item["registered"].data)
+                data["xml_changed"] = item["xml_changed"]
+                results[item["index"]] = data
+
+            XMLRawInput.add_items(
+                [
+                    (
+                        item["xml_adapter"].raw_finger_print,
+                        item["registered"],
+                        item["xml_changed"],
+                    )
+                    for item in accepted
+                ]
+            )
+
+        for item in deferred:
+            results[item["index"]] = cls.register(
+                item["xml_with_pre"],
+                item["filename"],
+                user,
+                push_xml_content,
+                synchronized,
+            )
+        return results
+
+    @classmethod
+    def _lock_identities(cls, xml_adapters):
+        """
+        Obtém os bloqueios (PostgreSQL advisory lock) das identidades
+        (aop_identity_key) de `xml_adapters`, liberados ao final da transação
+
+        Todos os XML que podem corresponder a um mesmo registro têm o mesmo
+        aop_identity_key; assim, a consulta e a criação do registro de um
+        documento não ocorrem simultaneamente em dois workers, enquanto
+        documentos diferentes são registrados em paralelo
+
+        Deve ser executado dentro de transaction.atomic
+        """
+        with metrics.stage(metrics.EXTRACTION):
+            keys = [xml_adapter.aop_identity_key for xml_adapter in xml_adapters]
+        with metrics.stage(metrics.LOCK):
+            _advisory_xact_lock(keys)
+
+    @classmethod
+    def _get_changed_documents(cls, items):
+        """
+        Consulta novamente os documentos de `items` e retorna os itens
+        cujo documento foi registrado ou alterado (current_version)
+        após a consulta anterior (_query_documents)
+
+        Deve ser executado com os bloqueios de _lock_identities
+        """
+        queried = [
+            {
+                "query_list": item["query_list"],
+                "legacy_query_list": item.get("legacy_query_list"),
+            }
+            for item in items
+        ]
+        cls._query_documents(queried)
+        changed = []
+        for item, current in zip(items, queried):
+            before = item["registered"]
+            after = current.get("registered")
+            if current.get("error") or (
+                before and (before.pk, before.current_version_id)
+            ) != (after and (after.pk, after.current_version_id)):
+                changed.append(item)
+        return changed
+
+    @classmethod
+    def _get_bad_request_data(cls, user, item, exception):
+        bad_request = PidProviderBadRequest.get_or_create(
+            user,
+            item["filename"],
+            exception,
+            item["xml_adapter"],
+        )
+        return bad_request.data
+
+    @classmethod
+    def _query_documents(cls, items, chunk_size=100):
+        """
+        Query documents of `items` using one query for each `chunk_size` items
+
+        Adiciona a cada item a chave `registered` (None ou PidProviderXML)
+        ou a chave `error` (QueryDocumentMultipleObjectsReturnedError)
+
+        Os itens não encontrados pelos identificadores canônicos (query_list)
+        e que têm legacy_query_list (PidProviderXMLAdapter.query_list) são
+        consultados, por estes parâmetros, entre os registros ainda sem
+        identity_key (backfill_identity_keys)
+
+        Arguments
+        ---------
+        items : list of dict which keys are query_list, legacy_query_list, ...
+        """
+        for item in items:
+            item["registered"] = None
+        cls._match_documents(items, "query_list", cls.objects.all(), chunk_size)
+
+        pending = [
+            item
+            for item in items
+            if not item["registered"]
+            and not item.get("error")
+            and item.get("legacy_query_list")
+        ]
+        if pending and cls._has_documents_without_identity_keys():
+            cls._match_documents(
+                pending,
+                "legacy_query_list",
+                cls.objects.filter(identity_key__isnull=True),
+                chunk_size,
+            )
+
+    @classmethod
+    def _match_documents(cls, items, key, queryset, chunk_size):
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start : start + chunk_size]
+            query = Q()
+            for item in chunk:
+                for params in item[key]:
+                    query |= Q(**params)
+            found = list(
+                queryset.filter(query).select_related(
+                    "journal", "issue", "current_version"
                 )
-                data["record_status"] = "created"
+            )
 
-            data.update(registered.data)
-            data["xml_changed"] = xml_changed
-            return data
+            for item in chunk:
+                for params in item[key]:
+                    matches = [doc for doc in found if doc._matches(params)]
+                    if len(matches) > 1:
+                        logging.info(f"params={params} | found={matches}")
+                        item[
+                            "error"
+                        ] = exceptions.QueryDocumentMultipleObjectsReturnedError(
+                            _("Found more than one document matching to {}").format(
+                                params
+                            )
+                        )
+                        break
+                    if matches:
+                        item["registered"] = matches[0]
+                        break
+
+    def _matches(self, query_params):
+        """
+        Avalia `query_params` (no formato usado em _query_document)
+        com os dados deste registro
+        """
+        for lookup, expected in query_params.items():
+            if lookup.endswith("__isnull"):
+                value = getattr(self, lookup[: -len("__isnull")])
+                if (value is None) != expected:
+                    return False
+                continue
+            value = self
+            for name in lookup.split("__"):
+                value = getattr(value, name, None)
+                if value is None:
+                    break
+            if value != expected:
+                return False
+        return True
 
-        except (
-            exceptions.ForbiddenPidProviderXMLRegistrationError,
-            exceptions.NotEnoughParametersToGetDocumentRecordError,
-            exceptions.QueryDocumentMultipleObjectsReturnedError,
-            PutXMLContentError,
-        ) as e:
-            bad_request = PidProviderBadRequest.get_or_create(
-                user,
-                filename,
-                e,
-                xml_adapter,
+    @classmethod
+    def _complete_pids_in_bulk(cls, items):
+        """
+        Completa os PIDs de `items` verificando, em uma única consulta,
+        se os v3 informados nos XML de documentos novos já estão registrados
+        e alocando em lote os v2 ausentes
+        """
+        v3_items = [
+            item["xml_adapter"].v3
+            for item in items
+            if not item["registered"] and cls._is_valid_pid(item["xml_adapter"].v3)
+        ]
+        registered_v3s = set(
+            cls.objects.filter(v3__in=v3_items).values_list("v3", flat=True)
+        )
+        v2s = cls._allocate_v2s(
+            [
+                item["xml_adapter"]
+                for item in items
+                if not (item["registered"] and item["registered"].v2)
+                and not cls._is_valid_pid(item["xml_adapter"].v2)
+            ]
+        )
+        for item in items:
+            item["xml_changed"] = cls._complete_pids(
+                item["xml_adapter"], item["registered"], registered_v3s, v2s
             )
-            return bad_request.data
+            registered_v3s.add(item["xml_adapter"].v3)
+
+    @classmethod
+    def _push_xml_contents(cls, items, push_xml_content, max_workers=None):
+        """
+        Envia concorrentemente os conteúdos XML de `items`
+
+        Adiciona a cada item a chave `response` ou a chave `error`
+        """
+
+        # as etapas das threads são contabilizadas nas etapas em curso
+        metrics_context = metrics.context()
+
+        def _push(item):
+            xml_adapter = item["xml_adapter"]
+            try:
+                with metrics.use_context(metrics_context), metrics.stage(
+                    metrics.PUSH_XML_CONTENT
+                ):
+                    return push_xml_content(
+                        filename=item["filename"],
+                        subdirs="",
+                        content=xml_adapter.tostring(),
+                        finger_print=xml_adapter.finger_print,
+                    )
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_push, item) for item in items]
+
+        for item, future in zip(items, futures):
+            try:
+                item["response"] = future.result()
+            except PutXMLContentError as e:
+                item["error"] = e
+        return items
+
+    @classmethod
+    def _save_in_bulk(cls, items, user, synchronized=None):
+        """
+        Insere os documentos novos e atualiza os alterados, em lote,
+        adicionando a nova versão do XML
+        """
+        journals = {}
+        issues = {}
+        docs = []
+        new_docs = []
+        for item in items:
+            doc = item["registered"]
+            if not doc:
+                doc = cls()
+                doc.creator = user
+                doc.created = utcnow()
+                item["registered"] = doc
+                new_docs.append(doc)
+            doc._set_data(item["xml_adapter"], item["pkg_name"], journals, issues)
+            doc.synchronized = synchronized
+            doc.updated_by = user
+            doc.updated = utcnow()
+            docs.append(doc)
+
+        cls.objects.bulk_create(new_docs)
+
+        for item in items:
+            doc = item["registered"]
+            finger_print = item["xml_adapter"].finger_print
+            if item["response"] and (
+                not doc.current_version
+                or doc.current_version.finger_print != finger_print
+            ):
+                # XMLVersion herda de MinioFile (multi-table inheritance),
+                # o que impede o uso de bulk_create
+                doc.current_version = XMLVersion.create(
+                    doc, item["response"]["uri"], user, item["filename"], finger_print
+                )
+
+        cls.objects.bulk_update(docs, cls.BULK_UPDATE_FIELDS)
+        cls.invalidate_cache([doc.v3 for doc in docs])
+
+        cls._add_related_items_in_bulk(
+            [
+                (
+                    item["registered"],
+                    [related["href"] for related in item["xml_adapter"].related_items],
+                )
+                for item in items
+            ],
+            user,
+        )
 
     def push_xml_content(self, xml_adapter, user, push_xml_content, filename):
         finger_print = xml_adapter.finger_print
-        response = push_xml_content(
-            filename=filename,
-            subdirs="",
-            content=xml_adapter.tostring(),
-            finger_print=finger_print,
-        )
+        with metrics.stage(metrics.PUSH_XML_CONTENT):
+            response = push_xml_content(
+                filename=filename,
+                subdirs="",
+                content=xml_adapter.tostring(),
+                finger_print=finger_print,
+            )
         if response:
             self.add_version(
                 uri=response["uri"],
@@ -566,7 +1780,7 @@ class PidProviderXML(CommonControlField):
         )
 
     @classmethod
-    def get_registration_demand(cls, xml_with_pre):
+    def get_registration_demand(cls, xml_with_pre, filename=None):
         """
         Verifica se há necessidade de registrar local (upload) e/ou
         remotamente (core)
@@ -574,15 +1788,16 @@ class PidProviderXML(CommonControlField):
         Parameters
         ----------
         xml_with_pre : XMLWithPre
+        filename : str
+            nome do arquivo XML, do qual é obtido pkg_name (see register)
 
         Raises
         ------
         exceptions.QueryDocumentMultipleObjectsReturnedError
         """
-        required_remote = True
-        required_local = True
-
-        xml_adapter = xml_sps_adapter.PidProviderXMLAdapter(xml_with_pre)
+        xml_adapter = xml_sps_adapter.as_xml_adapter(
+            xml_with_pre, _get_pkg_name(filename)
+        )
 
         try:
             registered = cls._query_document(xml_adapter)
@@ -593,7 +1808,52 @@ class PidProviderXML(CommonControlField):
             logging.exception(e)
             return {"error": str(e)}
 
-        if registered and registered.is_equal_to(xml_adapter):
+        return cls._get_registration_demand(registered, xml_adapter.finger_print)
+
+    @classmethod
+    def get_registration_demands(cls, items):
+        """
+        Verifica, em conjunto, se há necessidade de registrar local (upload)
+        e/ou remotamente (core) cada item
+
+        Os documentos são consultados pelos identificadores canônicos
+        (identity_key, aop_identity_key) com uma consulta a cada 100 itens
+
+        Parameters
+        ----------
+        items : list of dict which keys are query_list
+            (see PidProviderXMLAdapter.identity_query_list), finger_print
+            and, optionally, legacy_query_list (see _query_documents)
+
+        Returns
+        -------
+            list of dict (see PidProviderXML.get_registration_demand),
+            in the same order of `items`
+        """
+        cls._query_documents(items)
+
+        results = []
+        for item in items:
+            if item.get("error"):
+                results.append({"error": str(item["error"])})
+            else:
+                results.append(
+                    cls._get_registration_demand(
+                        item["registered"], item["finger_print"]
+                    )
+                )
+        return results
+
+    @classmethod
+    def _get_registration_demand(cls, registered, finger_print):
+        required_remote = True
+        required_local = True
+
+        if (
+            registered
+            and registered.current_version
+            and registered.current_version.finger_print == finger_print
+        ):
             # skip local registration
             required_local = False
             required_remote = not registered.synchronized
@@ -605,13 +1865,15 @@ class PidProviderXML(CommonControlField):
         )
 
     @classmethod
-    def get_registered(cls, xml_with_pre):
+    def get_registered(cls, xml_with_pre, filename=None):
         """
         Get registered
 
         Parameters
         ----------
         xml_with_pre : XMLWithPre
+        filename : str
+            nome do arquivo XML, do qual é obtido pkg_name (see register)
 
         Returns
         -------
@@ -629,7 +1891,9 @@ class PidProviderXML(CommonControlField):
             or
             {"error": str(e)}
         """
-        xml_adapter = xml_sps_adapter.PidProviderXMLAdapter(xml_with_pre)
+        xml_adapter = xml_sps_adapter.as_xml_adapter(
+            xml_with_pre, _get_pkg_name(filename)
+        )
         try:
             registered = cls._query_document(xml_adapter)
         except (
@@ -660,12 +1924,28 @@ class PidProviderXML(CommonControlField):
         exceptions.NotEnoughParametersToGetDocumentRecordError
         """
         LOGGER.info("_query_document")
-        items = xml_adapter.query_list
-        for params in items:
-            cls.validate_query_params(params)
+        with metrics.stage(metrics.EXTRACTION):
+            items = xml_adapter.query_list
+            for params in items:
+                cls.validate_query_params(params)
+            identity_query_list = xml_adapter.identity_query_list
+
+        # consulta pelos identificadores canônicos (identity_key e
+        # aop_identity_key), equivalente à consulta pelos query_params
+        registered = cls._get_document(cls.objects, identity_query_list)
+        if registered or not cls._has_documents_without_identity_keys():
+            return registered
+
+        # registros ainda sem identity_key (backfill_identity_keys)
+        # são consultados pelos query_params
+        return cls._get_document(cls.objects.filter(identity_key__isnull=True), items)
 
+    @classmethod
+    def _get_document(cls, queryset, query_list):
+        for params in query_list:
             try:
-                return cls.objects.get(**params)
+                with metrics.stage(metrics.QUERY_DOCUMENT):
+                    return queryset.get(**params)
             except cls.DoesNotExist:
                 continue
             except cls.MultipleObjectsReturned as e:
@@ -676,18 +1956,42 @@ class PidProviderXML(CommonControlField):
                     _("Found more than one document matching to {}").format(params)
                 )
 
+    @classmethod
+    def _has_documents_without_identity_keys(cls):
+        """
+        Indica se há registros sem identity_key, anteriores aos identificadores
+        canônicos e ainda não preenchidos por backfill_identity_keys
+
+        A consulta deixa de ser feita no processo depois que todos os
+        registros têm identity_key
+        """
+        global _without_identity_keys
+        if _without_identity_keys:
+            _without_identity_keys = cls.objects.filter(
+                identity_key__isnull=True
+            ).exists()
+        return _without_identity_keys
+
     @classmethod
     def _create(
         cls, xml_adapter, user, push_xml_content, filename, pkg_name, synchronized=None
     ):
         try:
-            doc = cls()
-            doc.creator = user
-            doc.created = utcnow()
-            doc.save()
-            return doc._update(
-                xml_adapter, user, push_xml_content, filename, pkg_name, synchronized
-            )
+            with transaction.atomic():
+                doc = cls()
+                doc.creator = user
+                doc.created = utcnow()
+                doc.save()
+                return doc._update(
+                    xml_adapter,
+                    user,
+                    push_xml_content,
+                    filename,
+                    pkg_name,
+                    synchronized,
+                )
+        except exceptions.DuplicatedDocumentIdentityError:
+            raise
         except Exception as e:
             LOGGER.exception(e)
             raise exceptions.PidProviderXMLCreateError(
@@ -703,12 +2007,21 @@ class PidProviderXML(CommonControlField):
     ):
         self.push_xml_content(xml_adapter, user, push_xml_content, filename)
         try:
-            self._add_data(xml_adapter, user, pkg_name)
+            with metrics.stage(metrics.ADD_DATA):
+                self._add_data(xml_adapter, user, pkg_name)
             self.synchronized = synchronized
             self.updated_by = user
             self.updated = utcnow()
-            self.save()
+            with metrics.stage(metrics.SAVE), transaction.atomic():
+                self.save()
             return self
+        except IntegrityError as e:
+            LOGGER.exception(e)
+            raise exceptions.DuplicatedDocumentIdentityError(
+                _("There is another document registered with the same data: {}").format(
+                    xml_adapter,
+                )
+            )
         except Exception as e:
             LOGGER.exception(e)
             raise exceptions.PidProviderXMLUpdateError(
@@ -720,6 +2033,27 @@ class PidProviderXML(CommonControlField):
             )
 
     def _add_data(self, xml_adapter, user, pkg_name):
+        self._set_data(xml_adapter, pkg_name)
+
+        self._add_related_items(
+            [related["href"] for related in xml_adapter.related_items], user
+        )
+
+    def _set_data(self, xml_adapter, pkg_name, journals=None, issues=None):
+        """
+        Atribui os dados de xml_adapter, exceto os itens relacionados
+
+        Arguments
+        ---------
+        journals : dict
+            XMLJournal já obtidos, cuja chave é (issn_electronic, issn_print)
+        issues : dict
+            XMLIssue já obtidos, cuja chave é
+            (issn_electronic, issn_print, volume, number, suppl, pub_year)
+        """
+        journals = {} if journals is None else journals
+        issues = {} if issues is None else issues
+
         self.pkg_name = pkg_name
         self.article_pub_year = xml_adapter.article_pub_year
         self.v3 = xml_adapter.v3
@@ -740,39 +2074,124 @@ class PidProviderXML(CommonControlField):
         self.z_links = xml_adapter.links
         self.z_partial_body = xml_adapter.partial_body
 
-        self.journal = XMLJournal.get_or_create(
-            xml_adapter.journal_issn_electronic,
-            xml_adapter.journal_issn_print,
-        )
+        key = (xml_adapter.journal_issn_electronic, xml_adapter.journal_issn_print)
+        if key not in journals:
+            journals[key] = XMLJournal.get_or_create(*key)
+        self.journal = journals[key]
+
         self.issue = None
         if xml_adapter.volume or xml_adapter.number or xml_adapter.suppl:
-            self.issue = XMLIssue.get_or_create(
-                self.journal,
+            key = (
+                xml_adapter.journal_issn_electronic,
+                xml_adapter.journal_issn_print,
                 xml_adapter.volume,
                 xml_adapter.number,
                 xml_adapter.suppl,
                 xml_adapter.pub_year,
             )
+            if key not in issues:
+                issues[key] = XMLIssue.get_or_create(self.journal, *key[2:])
+            self.issue = issues[key]
+
+        self.set_identity_keys()
+
+    def identity_params(self, filter_by_issue=False):
+        """
+        Obtém dos dados registrados os mesmos parâmetros que
+        PidProviderXMLAdapter.query_params obtém do XML
+
+        Arguments
+        ---------
+        filter_by_issue: bool
+
+        Returns
+        -------
+        dict
+        """
+        _params = dict(
+            z_surnames=self.z_surnames or None,
+            z_collab=self.z_collab or None,
+        )
+        if not any(_params.values()):
+            _params["main_doi"] = self.main_doi
+
+        if not any(_params.values()):
+            _params["z_links"] = self.z_links
+
+        if not any(_params.values()):
+            _params["z_partial_body"] = self.z_partial_body
+
+        if not any(_params.values()):
+            _params["pkg_name"] = self.pkg_name
+
+        _params["elocation_id"] = self.elocation_id
+        if filter_by_issue:
+            issue = self.issue
+            _params["issue__pub_year"] = issue and issue.pub_year
+            _params["issue__volume"] = issue and issue.volume
+            _params["issue__number"] = issue and issue.number
+            _params["issue__suppl"] = issue and issue.suppl
+            _params["fpage"] = self.fpage
+            _params["fpage_seq"] = self.fpage_seq
+            _params["lpage"] = self.lpage
+
+        journal = self.journal
+        _params["journal__issn_print"] = journal and journal.issn_print
+        _params["journal__issn_electronic"] = journal and journal.issn_electronic
+        _params["article_pub_year"] = self.article_pub_year
+        _params["z_article_titles_texts"] = self.z_article_titles_texts
+        return _params
+
+    def set_identity_keys(self):
+        """
+        Atribui identity_key e aop_identity_key
+        """
+        self.identity_key = xml_sps_adapter.identity_digest(
+            self.identity_params(filter_by_issue=True)
+        )
+        self.aop_identity_key = xml_sps_adapter.identity_digest(self.identity_params())
+
+    def _add_related_items(self, main_dois, creator):
+        self._add_related_items_in_bulk([(self, main_dois)], creator)
 
-        for related in xml_adapter.related_items:
-            self._add_related_item(related["href"], user)
+    @classmethod
+    def _add_related_items_in_bulk(cls, items, creator):
+        """
+        Associa aos documentos os itens relacionados (XMLRelatedItem),
+        obtendo-os e criando-os em conjunto (XMLRelatedItem.get_or_create_many)
+        e inserindo as associações com um único comando
 
-    def _add_related_item(self, main_doi, creator):
-        self.related_items.add(XMLRelatedItem.get_or_create(main_doi, creator))
+        Arguments
+        ---------
+        items : list of tuples (PidProviderXML, main_doi list)
+        """
+        related_items = XMLRelatedItem.get_or_create_many(
+            {main_doi for doc, main_dois in items for main_doi in main_dois},
+            creator,
+        )
+        through = cls.related_items.through
+        through.objects.bulk_create(
+            [
+                through(
+                    pidproviderxml_id=doc.id,
+                    xmlrelateditem_id=related_items[main_doi].id,
+                )
+                for doc, main_dois in items
+                for main_doi in main_dois
+            ],
+            ignore_conflicts=True,
+        )
 
     @classmethod
     def _get_unique_v3(cls):
         """
-        Generate v3 and return it only if it is new
+        Return a new v3 from V3Pool
 
         Returns
         -------
             str
         """
-        while True:
-            generated = v3_gen.generates()
-            if not cls._is_registered_pid(v3=generated):
-                return generated
+        return v3_pool.get()
 
     @classmethod
     def _is_registered_pid(cls, v2=None, v3=None, aop_pid=None):
@@ -792,30 +2211,54 @@ class PidProviderXML(CommonControlField):
                 return True
 
     @classmethod
-    def _v2_generates(cls, xml_adapter):
-        # '2022-10-19T13:51:33.830085'
-        h = utcnow()
-        mm = str(h.month).zfill(2)
-        dd = str(h.day).zfill(2)
-        nnnnn = str(h.timestamp()).split(".")[0][-5:]
-        return f"{xml_adapter.v2_prefix}{mmdd}{nnnnn}"
-
-    @classmethod
-    def _get_unique_v2(cls, xml_adapter):
+    def _get_unique_v2(cls, xml_adapter, v2s=None):
         """
-        Generate v2 and return it only if it is new
+        Return a new v2, allocated by V2Sequence
+
+        Parameters
+        ----------
+        xml_adapter: PidProviderXMLAdapter
+        v2s: dict
+            v2 alocados previamente, cuja chave é o prefixo (opcional)
 
         Returns
         -------
             str
         """
+        prefix = xml_adapter.v2_prefix
+        if v2s and v2s.get(prefix):
+            return v2s[prefix].pop(0)
         while True:
-            generated = cls._v2_generates(xml_adapter)
+            generated = V2Sequence.allocate(prefix)[0]
             if not cls._is_registered_pid(v2=generated):
                 return generated
 
     @classmethod
-    def _complete_pids(cls, xml_adapter, registered):
+    def _allocate_v2s(cls, xml_adapters):
+        """
+        Aloca em lote os v2 para `xml_adapters`, por prefixo
+
+        Returns
+        -------
+        dict
+            lista de v2 alocados, cuja chave é o prefixo
+        """
+        quantities = {}
+        for xml_adapter in xml_adapters:
+            prefix = xml_adapter.v2_prefix
+            quantities[prefix] = quantities.get(prefix, 0) + 1
+
+        v2s = {}
+        for prefix, quantity in quantities.items():
+            allocated = V2Sequence.allocate(prefix, quantity)
+            registered = set(
+                cls.objects.filter(v2__in=allocated).values_list("v2", flat=True)
+            )
+            v2s[prefix] = [v2 for v2 in allocated if v2 not in registered]
+        return v2s
+
+    @classmethod
+    def _complete_pids(cls, xml_adapter, registered, registered_v3s=None, v2s=None):
         """
         Update `xml_adapter` pids with `registered` pids or
         create `xml_adapter` pids
@@ -824,6 +2267,10 @@ class PidProviderXML(CommonControlField):
         ----------
         xml_adapter: PidProviderXMLAdapter
         registered: XMLArticle
+        registered_v3s: set
+            v3 já registrados, consultados previamente (opcional)
+        v2s: dict
+            v2 alocados previamente, cuja chave é o prefixo (opcional)
 
         Returns
         -------
@@ -833,8 +2280,8 @@ class PidProviderXML(CommonControlField):
         before = (xml_adapter.v2, xml_adapter.v3, xml_adapter.aop_pid)
 
         # adiciona os pids faltantes aos dados de entrada
-        cls._add_pid_v3(xml_adapter, registered)
-        cls._add_pid_v2(xml_adapter, registered)
+        cls._add_pid_v3(xml_adapter, registered, registered_v3s)
+        cls._add_pid_v2(xml_adapter, registered, v2s)
         cls._add_aop_pid(xml_adapter, registered)
 
         after = (xml_adapter.v2, xml_adapter.v3, xml_adapter.aop_pid)
@@ -847,7 +2294,7 @@ class PidProviderXML(CommonControlField):
         return bool(value and len(value) == 23)
 
     @classmethod
-    def _add_pid_v3(cls, xml_adapter, registered):
+    def _add_pid_v3(cls, xml_adapter, registered, registered_v3s=None):
         """
         Atribui v3 ao xml_adapter,
         recuperando do registered ou obtendo um v3 inédito
@@ -856,18 +2303,27 @@ class PidProviderXML(CommonControlField):
         ---------
         xml_adapter: PidProviderXMLAdapter
         registered: XMLArticle
+        registered_v3s: set
+            v3 já registrados, consultados previamente (opcional)
         """
         if registered:
             # recupera do registrado
-            xml_adapter.v3 = registered.v3
+            if xml_adapter.v3 != registered.v3:
+                xml_adapter.v3 = registered.v3
         else:
             # se v3 de xml está ausente ou já está registrado para outro xml
-            if not cls._is_valid_pid(xml_adapter.v3) or cls._is_registered_pid(
-                v3=xml_adapter.v3
+            if not cls._is_valid_pid(xml_adapter.v3) or cls._is_registered_v3(
+                xml_adapter.v3, registered_v3s
             ):
                 # obtém um v3 inédito
                 xml_adapter.v3 = cls._get_unique_v3()
 
+    @classmethod
+    def _is_registered_v3(cls, v3, registered_v3s=None):
+        if registered_v3s is None:
+            return cls._is_registered_pid(v3=v3)
+        return v3 in registered_v3s
+
     @classmethod
     def _add_aop_pid(cls, xml_adapter, registered):
         """
@@ -878,11 +2334,15 @@ class PidProviderXML(CommonControlField):
         xml_adapter: PidProviderXMLAdapter
         registered: XMLArticle
         """
-        if registered and registered.aop_pid:
+        if (
+            registered
+            and registered.aop_pid
+            and xml_adapter.aop_pid != registered.aop_pid
+        ):
             xml_adapter.aop_pid = registered.aop_pid
 
     @classmethod
-    def _add_pid_v2(cls, xml_adapter, registered):
+    def _add_pid_v2(cls, xml_adapter, registered, v2s=None):
         """
         Adiciona ou atualiza a xml_adapter, v2 recuperado de registered ou gerado
 
@@ -890,12 +2350,14 @@ class PidProviderXML(CommonControlField):
         ---------
         xml_adapter: PidProviderXMLAdapter
         registered: XMLArticle
+        v2s: dict
+            v2 alocados previamente, cuja chave é o prefixo (opcional)
 
         """
         if registered and registered.v2 and xml_adapter.v2 != registered.v2:
             xml_adapter.v2 = registered.v2
         if not cls._is_valid_pid(xml_adapter.v2):
-            xml_adapter.v2 = cls._get_unique_v2(xml_adapter)
+            xml_adapter.v2 = cls._get_unique_v2(xml_adapter, v2s)
 
     @classmethod
     def validate_query_params(cls, query_params):
@@ -959,3 +2421,6 @@ class PidProviderXML(CommonControlField):
                 )
             )
         return True
+
+
+v3_pool = V3Pool()
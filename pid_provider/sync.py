@@ -0,0 +1,276 @@
+"""
+Sincronização dos registros locais não sincronizados (synchronized=False)
+com o pid provider central
+"""
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from pid_provider import exceptions
+from pid_provider.models import PidProviderXML, SyncFailure, utcnow
+
+LOGGER = logging.getLogger(__name__)
+
+# respostas do pid provider central que são tentadas novamente
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class CentralPidProviderClient:
+    """
+    Cliente HTTP do pid provider central
+
+    As requisições compartilham as conexões de uma mesma sessão
+    (até `max_workers` conexões simultâneas) e são repetidas, com espera
+    exponencial (backoff_factor * 2 ** tentativa), em caso de falha de conexão
+    ou de resposta RETRY_STATUS
+    """
+
+    def __init__(
+        self,
+        uri=None,
+        username=None,
+        password=None,
+        max_workers=None,
+        max_retries=None,
+        backoff_factor=None,
+        timeout=None,
+    ):
+        self.uri = uri or getattr(settings, "PID_PROVIDER_CENTRAL_URI", None)
+        self.max_workers = max_workers or getattr(
+            settings, "PID_PROVIDER_SYNC_WORKERS", 4
+        )
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else getattr(settings, "PID_PROVIDER_SYNC_MAX_RETRIES", 3)
+        )
+        self.backoff_factor = (
+            backoff_factor
+            if backoff_factor is not None
+            else getattr(settings, "PID_PROVIDER_SYNC_BACKOFF_FACTOR", 1)
+        )
+        self.timeout = timeout or getattr(settings, "PID_PROVIDER_SYNC_TIMEOUT", 30)
+
+        self.session = requests.Session()
+        username = username or getattr(settings, "PID_PROVIDER_CENTRAL_USER", None)
+        if username:
+            self.session.auth = (
+                username,
+                password or getattr(settings, "PID_PROVIDER_CENTRAL_PASSWORD", None),
+            )
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers, pool_maxsize=self.max_workers
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method, url, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs
+                )
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(
+                    f"{response.status_code} {response.reason} {url}",
+                    response=response,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < self.max_retries:
+                LOGGER.info(f"{method} {url} failed ({error}), retrying")
+                time.sleep(self.backoff_factor * 2**attempt)
+        raise error
+
+    def get_xml_content(self, xml_uri):
+        return self._request("GET", xml_uri).content
+
+    def register(self, filename, xml_content):
+        """
+        Registra o XML no pid provider central
+
+        Returns
+        -------
+        dict (see PidProviderXML.register)
+
+        Raises
+        ------
+        exceptions.APIPidProviderPostError
+        """
+        name, ext = os.path.splitext(filename)
+        zip_content = io.BytesIO()
+        with ZipFile(zip_content, "w", compression=ZIP_DEFLATED) as zf:
+            zf.writestr(filename, xml_content)
+
+        try:
+            response = self._request(
+                "POST",
+                self.uri,
+                data=zip_content.getvalue(),
+                headers={
+                    "Content-Type": "application/zip",
+                    "Content-Disposition": f"attachment; filename={name}.zip",
+                    "Accept": "application/json",
+                },
+            )
+            result = response.json()[0]
+        except (requests.RequestException, ValueError, IndexError, KeyError) as e:
+            raise exceptions.APIPidProviderPostError(
+                f"Unable to register {filename} in {self.uri}: {type(e)} {e}"
+            )
+        if result.get("error_type"):
+            raise exceptions.APIPidProviderPostError(
+                f"Unable to register {filename} in {self.uri}: "
+                f"{result['error_type']} {result.get('error_message')}"
+            )
+        return result
+
+    def synchronize(self, doc):
+        """
+        Registra no pid provider central a versão corrente do XML de `doc`
+        """
+        if not doc.xml_uri:
+            raise exceptions.APIPidProviderPostError(f"{doc} has no XML version")
+        filename = doc.current_version.basename or f"{doc.pkg_name or doc.v3}.xml"
+        return self.register(filename, self.get_xml_content(doc.xml_uri))
+
+    def synchronize_many(self, docs):
+        """
+        Sincroniza `docs` com até `max_workers` requisições simultâneas
+
+        Returns
+        -------
+        list of exceptions or None, in the same order of `docs`
+        """
+
+        def _synchronize(doc):
+            try:
+                self.synchronize(doc)
+            except Exception as e:
+                LOGGER.exception(e)
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(_synchronize, docs))
+
+
+def synchronize(user, client=None, batch_size=None):
+    """
+    Sincroniza com o pid provider central os registros com synchronized=False
+
+    Cada lote de `batch_size` registros é obtido em uma transação curta,
+    com SELECT ... FOR UPDATE SKIP LOCKED, que os marca com sync_started,
+    de modo que vários workers sincronizam lotes distintos simultaneamente;
+    as requisições ao pid provider central são feitas fora de transação e
+    os resultados são gravados em outra transação curta (_save_results)
+
+    Os registros marcados há mais de PID_PROVIDER_SYNC_CLAIM_TIMEOUT segundos
+    (por exemplo, por um worker interrompido) são obtidos novamente
+
+    As falhas são registradas em SyncFailure e os registros com falha
+    permanecem não sincronizados, para serem tentados na próxima execução
+
+    Returns
+    -------
+    dict
+        {"total": int, "synchronized": int, "failures": int}
+    """
+    client = client or CentralPidProviderClient()
+    batch_size = batch_size or getattr(settings, "PID_PROVIDER_SYNC_BATCH_SIZE", 50)
+
+    summary = {"total": 0, "synchronized": 0, "failures": 0}
+    last_id = 0
+    while True:
+        docs = _claim(batch_size, last_id)
+        if not docs:
+            break
+        last_id = docs[-1].id
+
+        errors = client.synchronize_many(docs)
+        _save_results(docs, errors, user, summary)
+        summary["total"] += len(docs)
+    return summary
+
+
+def _claim(batch_size, last_id):
+    """
+    Obtém e marca com sync_started os próximos `batch_size` registros
+    não sincronizados e não marcados por outro worker
+    """
+    now = timezone.now()
+    timeout = getattr(settings, "PID_PROVIDER_SYNC_CLAIM_TIMEOUT", 3600)
+    with transaction.atomic():
+        docs = list(
+            PidProviderXML.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(synchronized=False, id__gt=last_id)
+            .filter(
+                Q(sync_started__isnull=True)
+                | Q(sync_started__lt=now - timedelta(seconds=timeout))
+            )
+            .select_related("current_version")
+            .order_by("id")[:batch_size]
+        )
+        PidProviderXML.objects.filter(id__in=[doc.id for doc in docs]).update(
+            sync_started=now
+        )
+    for doc in docs:
+        doc.sync_started = now
+    return docs
+
+
+def _save_results(docs, errors, user, summary):
+    """
+    Grava o resultado da sincronização de `docs`
+
+    Os registros cuja versão do XML foi alterada ou que foram obtidos por
+    outro worker durante as requisições não são atualizados, exceto para
+    desfazer a marca sync_started deste worker
+    """
+    with transaction.atomic():
+        current = {
+            id: (current_version_id, sync_started)
+            for id, current_version_id, sync_started in (
+                PidProviderXML.objects.select_for_update()
+                .filter(id__in=[doc.id for doc in docs])
+                .values_list("id", "current_version_id", "sync_started")
+            )
+        }
+        updated = []
+        released = []
+        for doc, error in zip(docs, errors):
+            if current.get(doc.id) != (doc.current_version_id, doc.sync_started):
+                if current.get(doc.id, (None, None))[1] == doc.sync_started:
+                    released.append(doc.id)
+                continue
+            if error:
+                doc.sync_failure = SyncFailure.create(
+                    f"Unable to synchronize {doc}", error, user
+                )
+                summary["failures"] += 1
+            else:
+                doc.synchronized = True
+                doc.sync_failure = None
+                summary["synchronized"] += 1
+            doc.sync_started = None
+            doc.updated_by = user
+            doc.updated = utcnow()
+            updated.append(doc)
+        PidProviderXML.objects.bulk_update(
+            updated,
+            ["synchronized", "sync_failure", "sync_started", "updated_by", "updated"],
+        )
+        PidProviderXML.objects.filter(id__in=released).update(sync_started=None)
+        PidProviderXML.invalidate_cache([doc.v3 for doc in updated])
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+
+from config import celery_app
+from pid_provider import controller, models, sync
+
+User = get_user_model()
+
+
+@celery_app.task()
+def provide_pid_for_job(job_id, user_id, start=0):
+    """
+    Registra uma parte dos XML de PidProviderJob e agenda a próxima parte
+
+    Cada parte é executada em uma tarefa, com as suas próprias transações
+    """
+    user = User.objects.get(pk=user_id)
+    # os resultados das partes anteriores não são necessários
+    job = models.PidProviderJob.objects.defer("results").get(pk=job_id)
+
+    pid_provider = controller.PidProvider("pid-provider")
+    next_start = pid_provider.provide_pid_for_job(job, user, start)
+    if next_start is not None:
+        provide_pid_for_job.apply_async(args=(job_id, user_id, next_start))
+
+
+@celery_app.task()
+def synchronize_pid_provider_xml(user_id):
+    """
+    Sincroniza com o pid provider central os registros não sincronizados
+    """
+    user = User.objects.get(pk=user_id)
+    return sync.synchronize(user)
+
+
+@celery_app.task()
+def fail_stale_pid_provider_jobs():
+    """
+    Finaliza como falhos os registros assíncronos interrompidos
+    (PidProviderJob.fail_stale_jobs)
+    """
+    return models.PidProviderJob.fail_stale_jobs()
@@ -1,9 +1,10 @@
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
 from files_storage.controller import FilesStorageManager
+from pid_provider import metrics
 from pid_provider.controller import PidProvider
 
 User = get_user_model()
@@ -52,3 +53,198 @@ class PidProviderTest(TestCase):
         self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
         self.assertEqual("created", result[0]["record_status"])
         self.assertEqual(True, result[0]["xml_changed"])
+
+    @patch("pid_provider.models.PidProviderXML.register_many")
+    def test_provide_pid_for_xml_zip_in_bulk(self, mock_models_register_many):
+        mock_models_register_many.return_value = [
+            {
+                "v3": "V3",
+                "v2": "V2",
+                "aop_pid": "AOPPID",
+                "xml_uri": "URI",
+                "article": "ARTICLE",
+                "created": "2020-01-02T00:00:00",
+                "updated": "2020-01-02T00:00:00",
+                "record_status": "created",
+                "xml_changed": True,
+            }
+        ]
+
+        pid_provider = PidProvider("pid-provider")
+        result = pid_provider.provide_pid_for_xml_zip_in_bulk(
+            zip_xml_file_path="./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+            user=User.objects.first(),
+            synchronized=None,
+        )
+        items = mock_models_register_many.call_args[0][0]
+        self.assertEqual(1, len(items))
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", items[0][1])
+        self.assertEqual("V3", result[0]["v3"])
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
+        self.assertEqual("created", result[0]["record_status"])
+
+    @patch("pid_provider.controller.PidProvider.provide_pid_for_xml_zip_in_bulk")
+    def test_provide_pid_for_job(self, mock_provide_pid_for_xml_zip_in_bulk):
+        mock_provide_pid_for_xml_zip_in_bulk.side_effect = (
+            lambda path, user, filenames: [
+                {"v3": "V3", "filename": filename} for filename in filenames
+            ]
+        )
+        job = Mock(xml_filenames=["a.xml", "b.xml", "c.xml"])
+        user = User()
+
+        pid_provider = PidProvider("pid-provider")
+        self.assertEqual(2, pid_provider.provide_pid_for_job(job, user, 0, 2))
+        job.start.assert_called_once_with(3, user)
+        job.add_results.assert_called_with(
+            [{"v3": "V3", "filename": "a.xml"}, {"v3": "V3", "filename": "b.xml"}],
+            user,
+        )
+        job.finish.assert_not_called()
+
+        self.assertIsNone(pid_provider.provide_pid_for_job(job, user, 2, 2))
+        job.start.assert_called_once_with(3, user)
+        job.add_results.assert_called_with([{"v3": "V3", "filename": "c.xml"}], user)
+        job.finish.assert_called_once_with(user)
+
+    @patch("pid_provider.controller.PidProvider.provide_pid_for_xml_zip_in_bulk")
+    def test_provide_pid_for_job_fails(self, mock_provide_pid_for_xml_zip_in_bulk):
+        error = Exception("error")
+        mock_provide_pid_for_xml_zip_in_bulk.side_effect = error
+        job = Mock(xml_filenames=["a.xml"])
+        user = User()
+
+        pid_provider = PidProvider("pid-provider")
+        self.assertIsNone(pid_provider.provide_pid_for_job(job, user))
+        job.add_results.assert_not_called()
+        job.finish.assert_called_once_with(user, error)
+
+    @patch("pid_provider.controller.PidProvider.provide_pid_for_xml_zip_in_bulk")
+    def test_provide_pid_for_job_which_is_not_running(
+        self, mock_provide_pid_for_xml_zip_in_bulk
+    ):
+        job = Mock(xml_filenames=["a.xml", "b.xml"])
+        job.start_chunk.return_value = False
+        user = User()
+
+        pid_provider = PidProvider("pid-provider")
+        self.assertIsNone(pid_provider.provide_pid_for_job(job, user, 1, 1))
+        job.start_chunk.assert_called_once_with(user, first=False)
+        mock_provide_pid_for_xml_zip_in_bulk.assert_not_called()
+        job.add_results.assert_not_called()
+        job.finish.assert_not_called()
+
+    @patch("pid_provider.models.PidProviderXML.register_many")
+    def test_provide_pid_for_xml_zip_pipelined(self, mock_models_register_many):
+        mock_models_register_many.side_effect = lambda items, *args: [
+            {"v3": "V3"} for item in items
+        ]
+
+        pid_provider = PidProvider("pid-provider")
+        result = pid_provider.provide_pid_for_xml_zip_pipelined(
+            zip_xml_file_path="./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+            user=User.objects.first(),
+            parsing_workers=2,
+        )
+        result = list(result)
+        items = mock_models_register_many.call_args[0][0]
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", items[0][1])
+        self.assertEqual("V3", result[0]["v3"])
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
+
+    @patch("pid_provider.models.PidProviderXML.register")
+    @patch("pid_provider.models.PidProviderXML.register_many")
+    def test_provide_pid_for_xml_zip_uses_parsing_workers(
+        self, mock_models_register_many, mock_models_register
+    ):
+        mock_models_register_many.side_effect = lambda items, *args: [
+            {"v3": "V3"} for item in items
+        ]
+
+        pid_provider = PidProvider("pid-provider")
+        with self.settings(PID_PROVIDER_PARSING_WORKERS=2):
+            result = list(
+                pid_provider.provide_pid_for_xml_zip(
+                    zip_xml_file_path="./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+                    user=User.objects.first(),
+                )
+            )
+        mock_models_register.assert_not_called()
+        xml_adapter, filename = mock_models_register_many.call_args[0][0][0]
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", filename)
+        self.assertEqual("2236-8906-hoehnea-49-e1082020", xml_adapter.pkg_name)
+        self.assertEqual("V3", result[0]["v3"])
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
+
+    @patch("pid_provider.models.PidProviderXML.register_many")
+    def test_provide_pid_for_xml_zip_in_bulk_uses_parsing_workers(
+        self, mock_models_register_many
+    ):
+        mock_models_register_many.side_effect = lambda items, *args: [
+            {"v3": "V3"} for item in items
+        ]
+
+        pid_provider = PidProvider("pid-provider")
+        with self.settings(PID_PROVIDER_PARSING_WORKERS=2):
+            result = pid_provider.provide_pid_for_xml_zip_in_bulk(
+                zip_xml_file_path="./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+                user=User.objects.first(),
+                max_workers=3,
+                filenames=["2236-8906-hoehnea-49-e1082020.xml"],
+            )
+        self.assertEqual(3, mock_models_register_many.call_args[0][4])
+        self.assertEqual("V3", result[0]["v3"])
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
+
+    @patch("pid_provider.models.XMLRawInput.get_registered_data")
+    @patch("pid_provider.models.PidProviderXML.register_many")
+    def test_provide_pid_for_xml_zip_in_bulk_skips_registered_raw_content(
+        self, mock_models_register_many, mock_get_registered_data
+    ):
+        mock_models_register_many.return_value = []
+        mock_get_registered_data.side_effect = lambda finger_prints: {
+            fp: {"v3": "V3", "record_status": "retrieved"} for fp in finger_prints
+        }
+        metrics.reset([metrics.RAW_INPUT_HITS, metrics.RAW_INPUT_MISSES])
+
+        pid_provider = PidProvider("pid-provider")
+        result = pid_provider.provide_pid_for_xml_zip_in_bulk(
+            zip_xml_file_path="./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+            user=User.objects.first(),
+        )
+        self.assertEqual([], mock_models_register_many.call_args[0][0])
+        self.assertEqual("V3", result[0]["v3"])
+        self.assertEqual("retrieved", result[0]["record_status"])
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
+        self.assertEqual(1.0, metrics.raw_input_hit_rate())
+
+    @patch("pid_provider.models.PidProviderXML.register_many")
+    def test_provide_pid_for_xml_zip_in_bulk_records_stages(
+        self, mock_models_register_many
+    ):
+        mock_models_register_many.side_effect = lambda items, *args: [
+            {"v3": "V3"} for item in items
+        ]
+        metrics.reset_stages()
+
+        pid_provider = PidProvider("pid-provider")
+        pid_provider.provide_pid_for_xml_zip_in_bulk(
+            zip_xml_file_path="./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+            user=User.objects.first(),
+        )
+        stages = metrics.get_stages()
+        self.assertEqual(1, stages[metrics.ZIP]["count"])
+        self.assertEqual(1, stages[metrics.PARSING]["count"])
+        self.assertEqual(1, stages[metrics.RAW_INPUT]["count"])
+        self.assertEqual(1, stages[metrics.RAW_INPUT]["queries"])
+        self.assertGreater(stages[metrics.PARSING]["seconds"], 0)
+
+    def test_get_registration_demands_for_xml_zip(self):
+        result = PidProvider.get_registration_demands_for_xml_zip(
+            "./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip"
+        )
+        self.assertEqual(1, len(result))
+        self.assertEqual("2236-8906-hoehnea-49-e1082020.xml", result[0]["filename"])
+        self.assertEqual({}, result[0]["registered"])
+        self.assertTrue(result[0]["required_local"])
+        self.assertTrue(result[0]["required_remote"])
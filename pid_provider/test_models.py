@@ -1,13 +1,21 @@
 import logging
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import skipUnless
 from unittest import mock
 from unittest.mock import Mock, call, patch
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
 from lxml import etree
 
-from pid_provider import exceptions, models
+from pid_provider import choices, exceptions, metrics, models, xml_sps_adapter
+from pid_provider.lru import LRUCache
 from pid_provider.xml_sps_adapter import PidProviderXMLAdapter
 from xmlsps.xml_sps_lib import XMLWithPre, get_xml_items
 
@@ -247,7 +255,9 @@ class PidProviderXMLQueryDocumentTest(TestCase):
         mock_get.side_effect = models.PidProviderXML.DoesNotExist
         xml_adapter = _get_xml_adapter()
         result = models.PidProviderXML._query_document(xml_adapter)
-        mock_get.assert_called_once_with(**{"key": "value"})
+        mock_get.assert_called_once_with(
+            aop_identity_key=xml_sps_adapter.identity_digest({"key": "value"})
+        )
 
     def test_query_document_returns_none_if_document_does_not_exist(
         self,
@@ -663,6 +673,130 @@ class PidProviderXMLAddPidV3Test(TestCase):
         self.assertEqual("xml456789012345678901v3", xml_adapter.v3)
 
 
+class V2SequenceTest(TestCase):
+    def tearDown(self):
+        models._execute_in_autocommit(
+            f"DELETE FROM {models.V2Sequence._meta.db_table} WHERE prefix = %s",
+            ["S0000-00002099"],
+        )
+
+    def test_allocate_returns_consecutive_v2(self):
+        result = models.V2Sequence.allocate("S0000-00002099", 2)
+        result += models.V2Sequence.allocate("S0000-00002099")
+        self.assertEqual(
+            [
+                "S0000-00002099000000001",
+                "S0000-00002099000000002",
+                "S0000-00002099000000003",
+            ],
+            result,
+        )
+
+    def test_allocate_starts_after_the_registered_v2(self):
+        models.PidProviderXML.objects.create(v2="S0000-00002099000000020")
+        models.PidProviderXML.objects.create(v2="S0000-00002099000000011")
+        models.PidProviderXML.objects.create(v2="S0000-00002099AOP000099")
+        result = models.V2Sequence.allocate("S0000-00002099")
+        self.assertEqual(["S0000-00002099000000021"], result)
+
+    def test_allocate_reuses_the_connection(self):
+        models.V2Sequence.allocate("S0000-00002099")
+        with patch(
+            "pid_provider.models.connections.create_connection"
+        ) as mock_create_connection:
+            result = models.V2Sequence.allocate("S0000-00002099", 2)
+        mock_create_connection.assert_not_called()
+        self.assertEqual(["S0000-00002099000000002", "S0000-00002099000000003"], result)
+
+
+@patch("pid_provider.models.PidProviderXML._is_registered_pid")
+@patch("pid_provider.models.V2Sequence.allocate")
+class PidProviderXMLGetUniqueV2Test(TestCase):
+    def test_get_unique_v2_skips_registered_v2(
+        self, mock_allocate, mock_is_registered_pid
+    ):
+        mock_allocate.side_effect = [
+            ["S0000-00002099000000001"],
+            ["S0000-00002099000000002"],
+        ]
+        mock_is_registered_pid.side_effect = [True, False]
+        xml_adapter = Mock(v2_prefix="S0000-00002099")
+        result = models.PidProviderXML._get_unique_v2(xml_adapter)
+        self.assertEqual("S0000-00002099000000002", result)
+
+    def test_get_unique_v2_uses_allocated_v2s(
+        self, mock_allocate, mock_is_registered_pid
+    ):
+        xml_adapter = Mock(v2_prefix="S0000-00002099")
+        v2s = {"S0000-00002099": ["S0000-00002099000000007"]}
+        result = models.PidProviderXML._get_unique_v2(xml_adapter, v2s)
+        self.assertEqual("S0000-00002099000000007", result)
+        mock_allocate.assert_not_called()
+
+
+@patch("pid_provider.models.V3Reservation.release")
+@patch("pid_provider.models.V3Reservation.claim")
+class V3PoolTest(TestCase):
+    def _claim(self, worker, quantity, timeout):
+        return [f"{i}".zfill(23) for i in range(quantity)]
+
+    def test_get_refills_pool(self, mock_claim, mock_release):
+        mock_claim.side_effect = self._claim
+        pool = models.V3Pool()
+        with self.settings(
+            PID_PROVIDER_V3_POOL_SIZE=5, PID_PROVIDER_V3_POOL_MIN_SIZE=1
+        ):
+            self.assertEqual("0".zfill(23), pool.get())
+            self.assertEqual("1".zfill(23), pool.get())
+        self.assertEqual(1, mock_claim.call_count)
+        self.assertEqual(5, mock_claim.call_args[0][1])
+
+    def test_get_refills_pool_when_it_reaches_the_min_size(
+        self, mock_claim, mock_release
+    ):
+        mock_claim.side_effect = self._claim
+        pool = models.V3Pool()
+        with self.settings(
+            PID_PROVIDER_V3_POOL_SIZE=5, PID_PROVIDER_V3_POOL_MIN_SIZE=3
+        ):
+            v3s = [pool.get() for i in range(3)]
+        self.assertEqual(2, mock_claim.call_count)
+        # completa o pool e libera as reservas dos v3 usados
+        self.assertEqual(2, mock_claim.call_args[0][1])
+        mock_release.assert_called_with(v3s[:2])
+
+    def test_get_discards_expired_claims(self, mock_claim, mock_release):
+        mock_claim.side_effect = self._claim
+        pool = models.V3Pool()
+        with self.settings(
+            PID_PROVIDER_V3_POOL_SIZE=5, PID_PROVIDER_V3_POOL_CLAIM_TIMEOUT=-1
+        ):
+            self.assertEqual("0".zfill(23), pool.get())
+            self.assertEqual("0".zfill(23), pool.get())
+        self.assertEqual(5, mock_claim.call_args[0][1])
+
+    @patch("pid_provider.models.PidProviderXML._is_registered_pid")
+    @patch("pid_provider.models.v3_gen.generates")
+    def test_get_generates_v3_if_there_is_no_claim(
+        self, mock_generates, mock_is_registered_pid, mock_claim, mock_release
+    ):
+        mock_claim.return_value = []
+        mock_generates.side_effect = ["W" * 23, "A" * 23, "B" * 23]
+        mock_is_registered_pid.side_effect = [True, False]
+        pool = models.V3Pool()
+        self.assertEqual("B" * 23, pool.get())
+        mock_is_registered_pid.assert_called_with(v3="B" * 23)
+
+    def test_get_uses_a_new_worker_after_fork(self, mock_claim, mock_release):
+        mock_claim.side_effect = self._claim
+        pool = models.V3Pool()
+        pool.get()
+        worker = mock_claim.call_args[0][0]
+        pool._pid = None
+        pool.get()
+        self.assertNotEqual(worker, mock_claim.call_args[0][0])
+
+
 @patch(
     "pid_provider.models.PidProviderXML.current_version", new_callable=mock.PropertyMock
 )
@@ -753,7 +887,7 @@ class PidProviderXMLPushXMLContentTest(TestCase):
 )
 @patch("pid_provider.models.utcnow", return_value="2020-02-02")
 @patch("pid_provider.models.PidProviderXML.add_version")
-@patch("pid_provider.models.PidProviderXML._add_related_item")
+@patch("pid_provider.models.PidProviderXML._add_related_items")
 @patch("pid_provider.models.XMLVersion.save")
 @patch("pid_provider.models.PidProviderXML.save")
 @patch("pid_provider.models.XMLRelatedItem.save")
@@ -767,7 +901,7 @@ class PidProviderXMLAddDataTest(TestCase):
         mock_related_save,
         mock_xmldocpid_save,
         mock_version_save,
-        mock_add_related_item,
+        mock_add_related_items,
         mock_add_xml_version,
         mock_now,
         mock_related_items,
@@ -807,12 +941,11 @@ class PidProviderXMLAddDataTest(TestCase):
         self.assertEqual("data-z_partial_body", registered.z_partial_body)
 
         expected = [
-            call("data-related-doi-1", user),
-            call("data-related-doi-2", user),
+            call(["data-related-doi-1", "data-related-doi-2"], user),
         ]
         self.assertEqual(
             expected,
-            mock_add_related_item.call_args_list,
+            mock_add_related_items.call_args_list,
         )
 
     def test_add_data_sets_registered_with_issue(
@@ -822,7 +955,7 @@ class PidProviderXMLAddDataTest(TestCase):
         mock_related_save,
         mock_xmldocpid_save,
         mock_version_save,
-        mock_add_related_item,
+        mock_add_related_items,
         mock_add_xml_version,
         mock_now,
         mock_related_items,
@@ -865,14 +998,39 @@ class PidProviderXMLAddDataTest(TestCase):
         self.assertEqual("data-z_partial_body", registered.z_partial_body)
 
         expected = [
-            call("data-related-doi-1", user),
-            call("data-related-doi-2", user),
+            call(["data-related-doi-1", "data-related-doi-2"], user),
         ]
         self.assertEqual(
             expected,
-            mock_add_related_item.call_args_list,
+            mock_add_related_items.call_args_list,
         )
 
+    def test_add_data_sets_identity_keys(
+        self,
+        mock_journal_save,
+        mock_issue_save,
+        mock_related_save,
+        mock_xmldocpid_save,
+        mock_version_save,
+        mock_add_related_items,
+        mock_add_xml_version,
+        mock_now,
+        mock_related_items,
+        mock_links,
+        mock_body,
+        mock_collab,
+        mock_surnames,
+        mock_titles,
+    ):
+        user = User()
+        xml_adapter = _get_xml_adapter_with_issue_data()
+        registered = models.PidProviderXML()
+        registered._add_data(xml_adapter, user, "data-pkg_name")
+
+        self.assertEqual(xml_adapter.identity_key, registered.identity_key)
+        self.assertEqual(xml_adapter.aop_identity_key, registered.aop_identity_key)
+        self.assertNotEqual(registered.identity_key, registered.aop_identity_key)
+
 
 @patch("pid_provider.models.utcnow", side_effect=["2020-02-02", "2020-02-03"])
 @patch("pid_provider.models.PidProviderXML.add_version")
@@ -966,7 +1124,7 @@ class PidProviderXMLRegisterTest(TestCase):
     ):
         expected = {
             "error_type": "<class 'pid_provider.exceptions.NotEnoughParametersToGetDocumentRecordError'>",
-            "error_message": "No attribute enough for disambiguations {'z_surnames': None, 'z_collab': None, 'main_doi': None, 'z_links': None, 'z_partial_body': None, 'pkg_name': None, 'elocation_id': None, 'journal__issn_print': None, 'journal__issn_electronic': None, 'article_pub_year': None, 'z_article_titles_texts': None}",
+            "error_message": "No attribute enough for disambiguations {'z_surnames': None, 'z_collab': None, 'main_doi': None, 'z_links': None, 'z_partial_body': None, 'pkg_name': 'filename', 'elocation_id': None, 'journal__issn_print': None, 'journal__issn_electronic': None, 'article_pub_year': None, 'z_article_titles_texts': None}",
             "id": "3300d3ff5406efdf74bbba5d46a8b156f99c455df7d70dedd3370433a0105ca9",
             "basename": "filename.xml",
         }
@@ -985,3 +1143,630 @@ class PidProviderXMLRegisterTest(TestCase):
         self.assertEqual(expected["error_message"], result["error_message"])
         self.assertEqual(expected["id"], result["id"])
         self.assertEqual(expected["basename"], result["basename"])
+
+
+class PidProviderXMLRegisterPkgNameTest(TestCase):
+    # sem autores, colaboração, DOI, itens relacionados nem texto,
+    # o documento é identificado pelo nome do arquivo (pkg_name)
+    xml = (
+        "<article><front><journal-meta>"
+        '<issn pub-type="epub">0000-0001</issn>'
+        "</journal-meta><article-meta>"
+        '<pub-date date-type="pub"><year>2099</year></pub-date>'
+        '<pub-date date-type="collection"><year>2099</year></pub-date>'
+        "</article-meta></front></article>"
+    )
+
+    def tearDown(self):
+        models._execute_in_autocommit(
+            f"DELETE FROM {models.V2Sequence._meta.db_table} WHERE prefix = %s",
+            ["S0000-00012099"],
+        )
+
+    def _register(self, user, filename):
+        return models.PidProviderXML.register(
+            _get_xml_with_pre(self.xml), filename, user, mock_push
+        )
+
+    def test_register_document_identified_by_pkg_name_twice(self):
+        user = User.objects.create(username="user_pkg_name")
+        first = self._register(user, "pkg.xml")
+        second = self._register(user, "pkg.xml")
+        other = self._register(user, "other.xml")
+
+        self.assertEqual("created", first["record_status"])
+        self.assertEqual("retrieved", second["record_status"])
+        self.assertEqual(first["v3"], second["v3"])
+        self.assertEqual("created", other["record_status"])
+        self.assertEqual(
+            ["other", "pkg"],
+            sorted(models.PidProviderXML.objects.values_list("pkg_name", flat=True)),
+        )
+
+    def test_get_registered_and_registration_demand_use_pkg_name(self):
+        user = User.objects.create(username="user_pkg_name")
+        first = self._register(user, "pkg.xml")
+
+        registered = models.PidProviderXML.get_registered(
+            _get_xml_with_pre(self.xml), "pkg.xml"
+        )
+        demand = models.PidProviderXML.get_registration_demand(
+            _get_xml_with_pre(self.xml), "pkg.xml"
+        )
+        self.assertEqual(first["v3"], registered["v3"])
+        self.assertEqual(first["v3"], demand["registered"]["v3"])
+
+    def _register_without_identity_keys(self, user):
+        first = self._register(user, "pkg.xml")
+        # registro anterior aos identificadores canônicos
+        models.PidProviderXML.objects.update(identity_key=None, aop_identity_key=None)
+        models._without_identity_keys = True
+        return first
+
+    def test_register_document_without_identity_keys(self):
+        user = User.objects.create(username="user_pkg_name")
+        first = self._register_without_identity_keys(user)
+        second = self._register(user, "pkg.xml")
+
+        self.assertEqual("retrieved", second["record_status"])
+        self.assertEqual(first["v3"], second["v3"])
+        self.assertEqual(1, models.PidProviderXML.objects.count())
+
+    def test_register_many_document_without_identity_keys(self):
+        user = User.objects.create(username="user_pkg_name")
+        first = self._register_without_identity_keys(user)
+        result = models.PidProviderXML.register_many(
+            [(_get_xml_with_pre(self.xml), "pkg.xml")], user, mock_push
+        )
+
+        self.assertEqual("retrieved", result[0]["record_status"])
+        self.assertEqual(first["v3"], result[0]["v3"])
+        self.assertEqual(1, models.PidProviderXML.objects.count())
+
+
+class PidProviderXMLMatchesTest(TestCase):
+    def _get_registered(self, issue=None):
+        registered = models.PidProviderXML()
+        registered.journal = models.XMLJournal(
+            issn_electronic="data-issn-e", issn_print="data-issn-p"
+        )
+        registered.issue = issue
+        registered.article_pub_year = "2020"
+        registered.z_surnames = "data-z_surnames"
+        return registered
+
+    def test_matches(self):
+        registered = self._get_registered()
+        params = {
+            "z_surnames": "data-z_surnames",
+            "z_collab": None,
+            "journal__issn_print": "data-issn-p",
+            "journal__issn_electronic": "data-issn-e",
+            "article_pub_year": "2020",
+            "issue__isnull": True,
+        }
+        self.assertTrue(registered._matches(params))
+
+    def test_does_not_match_issue_is_not_null(self):
+        registered = self._get_registered(
+            issue=models.XMLIssue(volume="1", pub_year="2020")
+        )
+        params = {
+            "z_surnames": "data-z_surnames",
+            "journal__issn_print": "data-issn-p",
+            "issue__isnull": True,
+        }
+        self.assertFalse(registered._matches(params))
+
+    def test_matches_issue_data(self):
+        registered = self._get_registered(
+            issue=models.XMLIssue(volume="1", pub_year="2020")
+        )
+        params = {
+            "z_surnames": "data-z_surnames",
+            "issue__volume": "1",
+            "issue__number": None,
+            "issue__pub_year": "2020",
+        }
+        self.assertTrue(registered._matches(params))
+
+    def test_does_not_match_different_value(self):
+        registered = self._get_registered()
+        params = {
+            "z_surnames": "other-z_surnames",
+            "journal__issn_print": "data-issn-p",
+        }
+        self.assertFalse(registered._matches(params))
+
+
+@patch("pid_provider.models.PidProviderBadRequest.save")
+class PidProviderXMLRegisterManyTest(TestCase):
+    def test_register_many_returns_results_in_the_same_order(
+        self,
+        mock_bad_request_save,
+    ):
+        user = User()
+        items = [
+            (_get_xml_with_pre(), "filename1.xml"),
+            (_get_xml_with_pre(), "filename2.xml"),
+        ]
+        result = models.PidProviderXML.register_many(
+            items,
+            user=user,
+            push_xml_content=mock_push,
+            synchronized=None,
+        )
+        self.assertEqual(2, len(result))
+        self.assertEqual("filename1.xml", result[0]["basename"])
+        self.assertEqual("filename2.xml", result[1]["basename"])
+        self.assertEqual(
+            "<class 'pid_provider.exceptions.NotEnoughParametersToGetDocumentRecordError'>",
+            result[0]["error_type"],
+        )
+
+
+class PidProviderXMLRegisterManyBatchTest(TestCase):
+    prefix = "S0000-00022099"
+
+    def setUp(self):
+        self.user = User.objects.create(username="user_batch")
+        self.pushed = []
+
+    def tearDown(self):
+        models._execute_in_autocommit(
+            f"DELETE FROM {models.V2Sequence._meta.db_table} WHERE prefix = %s",
+            [self.prefix],
+        )
+
+    def _push(self, filename, subdirs, content, finger_print):
+        self.pushed.append(filename)
+        return {"uri": f"https://minio/{finger_print}/{filename}"}
+
+    def _xml_with_pre(self, index, revision=0, v3=None):
+        v3 = (
+            v3
+            and f'<article-id specific-use="scielo-v3" pub-id-type="publisher-id">{v3}</article-id>'
+            or ""
+        )
+        return _get_xml_with_pre(
+            '<article xmlns:xlink="http://www.w3.org/1999/xlink">'
+            '<front><journal-meta><issn pub-type="epub">0000-0002</issn>'
+            f"</journal-meta><article-meta>{v3}"
+            f'<article-id pub-id-type="doi">10.0000/batch.{index}</article-id>'
+            f"<title-group><article-title>Batch {index}</article-title>"
+            '</title-group><contrib-group><contrib contrib-type="author">'
+            f"<name><surname>Author{index}</surname></name></contrib>"
+            '</contrib-group><pub-date date-type="pub"><year>2099</year>'
+            '</pub-date><pub-date date-type="collection"><year>2099</year>'
+            "</pub-date><volume>1</volume><issue>1</issue>"
+            f"<fpage>{index}</fpage><lpage>{index}</lpage>"
+            '<related-article related-article-type="corrected-article" '
+            f'ext-link-type="doi" xlink:href="10.0000/related.{index}"/>'
+            f"</article-meta></front><body><p>Revision {revision}</p></body>"
+            "</article>"
+        )
+
+    def _register_many(self, items):
+        return models.PidProviderXML.register_many(
+            [(self._xml_with_pre(*args), f"batch-{args[0]}.xml") for args in items],
+            self.user,
+            self._push,
+        )
+
+    def test_register_many_mixed_batch(self):
+        first = self._register_many([(1,), (2,)])
+        self.assertEqual(["created", "created"], [r["record_status"] for r in first])
+        self.pushed = []
+
+        invalid = (_get_xml_with_pre(), "invalid.xml")
+        with patch.object(
+            models.PidProviderXML,
+            "_lock_identities",
+            wraps=models.PidProviderXML._lock_identities,
+        ) as mock_lock:
+            mock_lock.side_effect = lambda *args: self.assertEqual(
+                ["batch-2.xml", "batch-3.xml"], sorted(self.pushed)
+            )
+            result = models.PidProviderXML.register_many(
+                [
+                    (self._xml_with_pre(1), "batch-1.xml"),
+                    (self._xml_with_pre(2, revision=1), "batch-2.xml"),
+                    invalid,
+                    (self._xml_with_pre(3), "batch-3.xml"),
+                ],
+                self.user,
+                self._push,
+            )
+        # os conteúdos são enviados antes de obter os bloqueios
+        mock_lock.assert_called_once()
+
+        self.assertEqual(
+            ["retrieved", "updated", None, "created"],
+            [r.get("record_status") for r in result],
+        )
+        self.assertEqual(first[0]["v3"], result[0]["v3"])
+        self.assertEqual(first[1]["v3"], result[1]["v3"])
+        self.assertEqual(first[1]["v2"], result[1]["v2"])
+        self.assertIn("error_type", result[2])
+        self.assertTrue(result[0]["xml_changed"])
+        self.assertEqual(
+            [f"{self.prefix}00000000{i}" for i in (1, 2, 3)],
+            sorted(r["v2"] for r in (result[0], result[1], result[3])),
+        )
+
+        self.assertEqual(3, models.PidProviderXML.objects.count())
+        doc = models.PidProviderXML.objects.get(v3=result[1]["v3"])
+        self.assertEqual(result[1]["xml_uri"], doc.xml_uri)
+        self.assertNotEqual(first[1]["xml_uri"], doc.xml_uri)
+        self.assertEqual(2, models.XMLVersion.objects.filter(xml_doc_pid=doc).count())
+        doc = models.PidProviderXML.objects.get(v3=result[3]["v3"])
+        self.assertEqual(
+            ["10.0000/related.3"],
+            list(doc.related_items.values_list("main_doi", flat=True)),
+        )
+
+    def test_register_many_defers_documents_registered_concurrently(self):
+        push_xml_contents = models.PidProviderXML._push_xml_contents
+        registered = {}
+
+        def _push_xml_contents(*args):
+            # outro worker registra o mesmo documento durante o envio
+            registered.update(
+                models.PidProviderXML.register(
+                    self._xml_with_pre(1), "batch-1.xml", self.user, self._push
+                )
+            )
+            return push_xml_contents(*args)
+
+        with patch.object(
+            models.PidProviderXML,
+            "_push_xml_contents",
+            side_effect=_push_xml_contents,
+        ), patch.object(
+            models.PidProviderXML,
+            "register",
+            wraps=models.PidProviderXML.register,
+        ) as mock_register:
+            result = self._register_many([(1,), (2,)])
+        self.assertEqual("created", registered["record_status"])
+        self.assertEqual("retrieved", result[0]["record_status"])
+        self.assertEqual(registered["v3"], result[0]["v3"])
+        self.assertEqual("created", result[1]["record_status"])
+        # somente o documento registrado concorrentemente é registrado
+        # individualmente
+        self.assertEqual(
+            ["batch-1.xml", "batch-1.xml"],
+            [call.args[1] for call in mock_register.call_args_list],
+        )
+        self.assertEqual(2, models.PidProviderXML.objects.count())
+
+    def test_complete_pids_in_bulk(self):
+        self._register_many([(1,)])
+        doc = models.PidProviderXML.objects.get()
+        items = [
+            {
+                "xml_adapter": PidProviderXMLAdapter(self._xml_with_pre(*args)),
+                "registered": registered,
+            }
+            for args, registered in (
+                ((1,), doc),
+                # v3 do XML já registrado para outro documento
+                ((2, 0, doc.v3), None),
+                ((3, 0, "123456789012345678901v3"), None),
+            )
+        ]
+        models.PidProviderXML._complete_pids_in_bulk(items)
+
+        self.assertEqual(doc.v3, items[0]["xml_adapter"].v3)
+        self.assertEqual(doc.v2, items[0]["xml_adapter"].v2)
+        self.assertNotEqual(doc.v3, items[1]["xml_adapter"].v3)
+        self.assertEqual(23, len(items[1]["xml_adapter"].v3))
+        self.assertEqual("123456789012345678901v3", items[2]["xml_adapter"].v3)
+        self.assertEqual(
+            [f"{self.prefix}00000000{i}" for i in (2, 3)],
+            [item["xml_adapter"].v2 for item in items[1:]],
+        )
+        self.assertEqual([True, True, True], [item["xml_changed"] for item in items])
+
+
+class PidProviderJobTest(TestCase):
+    def test_add_results_updates_progress(self):
+        user = User.objects.create(username="user_job")
+        job = models.PidProviderJob.objects.create(
+            filename="pkg.zip", total=3, status=choices.JOB_RUNNING
+        )
+        job.add_results(
+            [
+                {"v3": "V3", "created": datetime(2020, 1, 2)},
+                {"error_type": "ERROR", "error_message": "MESSAGE"},
+            ],
+            user,
+        )
+        job.refresh_from_db()
+        self.assertEqual(2, job.processed)
+        self.assertEqual(1, job.errors)
+        self.assertEqual("2020-01-02 00:00:00", job.results[0]["created"])
+
+    def test_add_results_appends_the_results(self):
+        user = User.objects.create(username="user_job")
+        job = models.PidProviderJob.objects.create(filename="pkg.zip", total=3)
+        job.start(3, user)
+        job.add_results([{"v3": "V3A"}, {"v3": "V3B"}], user)
+        job.add_results([{"v3": "V3C"}], user)
+        job.finish(user)
+
+        job = models.PidProviderJob.objects.get(pk=job.pk)
+        self.assertEqual(["V3A", "V3B", "V3C"], [item["v3"] for item in job.results])
+        self.assertEqual(3, job.processed)
+        self.assertEqual(choices.JOB_FINISHED, job.status)
+
+    def test_fail_stale_jobs(self):
+        stale = models.PidProviderJob.objects.create(
+            filename="stale.zip", status=choices.JOB_RUNNING
+        )
+        running = models.PidProviderJob.objects.create(
+            filename="running.zip", status=choices.JOB_RUNNING
+        )
+        queued = models.PidProviderJob.objects.create(
+            filename="queued.zip", status=choices.JOB_RUNNING
+        )
+        stale.start_chunk(None)
+        running.start_chunk(None)
+        models.PidProviderJob.objects.filter(pk=stale.pk).update(
+            chunk_started=timezone.now() - timedelta(hours=2)
+        )
+        # a próxima parte aguarda na fila há mais tempo que o limite
+        models.PidProviderJob.objects.filter(pk=queued.pk).update(
+            updated=timezone.now() - timedelta(hours=2)
+        )
+
+        self.assertEqual(1, models.PidProviderJob.fail_stale_jobs())
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        queued.refresh_from_db()
+        self.assertEqual(choices.JOB_FAILED, stale.status)
+        self.assertIn("PidProviderJobTimeoutError", stale.message)
+        self.assertEqual(choices.JOB_RUNNING, running.status)
+        self.assertEqual(choices.JOB_RUNNING, queued.status)
+
+    def test_finished_job_is_not_changed_by_its_remaining_chunks(self):
+        user = User.objects.create(username="user_job")
+        job = models.PidProviderJob.objects.create(filename="pkg.zip", total=3)
+        self.assertTrue(job.start_chunk(user, first=True))
+        models.PidProviderJob.objects.filter(pk=job.pk).update(
+            chunk_started=timezone.now() - timedelta(hours=2)
+        )
+        models.PidProviderJob.fail_stale_jobs()
+
+        job.refresh_from_db()
+        self.assertFalse(job.start_chunk(user))
+        self.assertFalse(job.add_results([{"v3": "V3"}], user))
+        self.assertFalse(job.finish(user, Exception("error")))
+
+        job.refresh_from_db()
+        self.assertEqual(choices.JOB_FAILED, job.status)
+        self.assertIn("PidProviderJobTimeoutError", job.message)
+        self.assertEqual(0, job.processed)
+
+
+class XMLRawInputTest(TestCase):
+    def test_get_registered_data_of_current_version(self):
+        doc = models.PidProviderXML.objects.create(v3="V3", v2="V2")
+        version = models.XMLVersion.objects.create(
+            xml_doc_pid=doc, uri="https://minio/a.xml", finger_print="FP"
+        )
+        doc.current_version = version
+        doc.save()
+
+        models.XMLRawInput.add_items([("RAW", doc, True), (None, doc, False)])
+        result = models.XMLRawInput.get_registered_data(["RAW", "OTHER"])
+
+        self.assertEqual(["RAW"], list(result.keys()))
+        self.assertEqual("retrieved", result["RAW"]["record_status"])
+        self.assertEqual("V3", result["RAW"]["v3"])
+        self.assertEqual("https://minio/a.xml", result["RAW"]["xml_uri"])
+        self.assertTrue(result["RAW"]["xml_changed"])
+
+    def test_get_registered_data_ignores_outdated_version(self):
+        doc = models.PidProviderXML.objects.create(v3="V3", v2="V2")
+        version = models.XMLVersion.objects.create(xml_doc_pid=doc, finger_print="1")
+        doc.current_version = version
+        doc.save()
+        models.XMLRawInput.add_items([("RAW", doc, False)])
+
+        doc.current_version = models.XMLVersion.objects.create(
+            xml_doc_pid=doc, finger_print="2"
+        )
+        doc.save()
+
+        self.assertEqual({}, models.XMLRawInput.get_registered_data(["RAW"]))
+
+
+class PidProviderXMLGetManyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset([metrics.V3_CACHE_HITS, metrics.V3_CACHE_MISSES])
+        self.user = User.objects.create(username="user_cache")
+        self.doc = models.PidProviderXML.objects.create(v3="V3CACHE", v2="V2")
+        self.doc.add_version("https://minio/1.xml", self.user, "a.xml", "1")
+
+    def test_get_many_reads_through_cache(self):
+        result = models.PidProviderXML.get_many(["V3CACHE", "V3NONE"])
+        self.assertEqual(["V3CACHE"], list(result.keys()))
+        self.assertEqual("https://minio/1.xml", result["V3CACHE"]["xml_uri"])
+        self.assertEqual("V2", result["V3CACHE"]["data"]["v2"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                "https://minio/1.xml", models.PidProviderXML.get_xml_uri("V3CACHE")
+            )
+        self.assertEqual(1, metrics.get(metrics.V3_CACHE_HITS))
+        self.assertEqual(2, metrics.get(metrics.V3_CACHE_MISSES))
+
+    def test_get_many_caches_the_article_id(self):
+        article = models.Article.objects.create()
+        self.doc.article = article
+        self.doc.save()
+
+        models.PidProviderXML.get_many(["V3CACHE"])
+        cached = cache.get(models._v3_cache_key("V3CACHE"))
+        self.assertEqual(article.pk, cached["data"]["article"])
+
+    def test_set_synchronized_invalidates_cache(self):
+        updated = models.PidProviderXML.get_data("V3CACHE")["updated"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.set_synchronized(True, self.user)
+        self.assertNotEqual(
+            updated, models.PidProviderXML.get_data("V3CACHE")["updated"]
+        )
+
+    def test_add_version_invalidates_cache(self):
+        self.assertEqual(
+            "https://minio/1.xml", models.PidProviderXML.get_xml_uri("V3CACHE")
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.add_version("https://minio/2.xml", self.user, "a.xml", "2")
+        self.assertEqual(
+            "https://minio/2.xml", models.PidProviderXML.get_xml_uri("V3CACHE")
+        )
+
+
+class PidProviderXMLGetRegistrationDemandsTest(TestCase):
+    def test_get_registration_demands(self):
+        user = User.objects.create(username="user_demand")
+        doc = models.PidProviderXML.objects.create(
+            v3="V3DEMAND", identity_key="KEY", aop_identity_key="AOPKEY"
+        )
+        doc.add_version("https://minio/1.xml", user, "a.xml", "FP")
+        doc.set_synchronized(True, user)
+
+        items = [
+            {"query_list": query_list, "finger_print": finger_print}
+            for query_list, finger_print in (
+                (xml_sps_adapter.identity_query_list_from_keys("KEY", "A"), "FP"),
+                (xml_sps_adapter.identity_query_list_from_keys(None, "AOPKEY"), "X"),
+                (xml_sps_adapter.identity_query_list_from_keys("OTHER", "A"), "FP"),
+            )
+        ]
+        with self.assertNumQueries(1):
+            result = models.PidProviderXML.get_registration_demands(items)
+
+        self.assertEqual("V3DEMAND", result[0]["registered"]["v3"])
+        self.assertFalse(result[0]["required_local"])
+        self.assertFalse(result[0]["required_remote"])
+        self.assertEqual("V3DEMAND", result[1]["registered"]["v3"])
+        self.assertTrue(result[1]["required_local"])
+        self.assertEqual({}, result[2]["registered"])
+        self.assertTrue(result[2]["required_local"])
+        self.assertTrue(result[2]["required_remote"])
+
+
+@skipUnless(connection.vendor == "postgresql", "requires PostgreSQL advisory locks")
+class PidProviderXMLRegisterConcurrentlyTest(TransactionTestCase):
+    def _register_concurrently(self, paths):
+        user = User.objects.create(username="user_concurrent")
+        barrier = threading.Barrier(len(paths))
+
+        def push_xml_content(filename, subdirs, content, finger_print):
+            # amplia o intervalo entre a consulta e a criação do registro
+            time.sleep(0.2)
+            return {"uri": f"https://minio/{finger_print}/{filename}"}
+
+        def register(path):
+            try:
+                for item in get_xml_items(path):
+                    barrier.wait()
+                    return models.PidProviderXML.register(
+                        item["xml_with_pre"], item["filename"], user, push_xml_content
+                    )
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            return list(executor.map(register, paths))
+
+    def tearDown(self):
+        # os registros efetivados neste teste são removidos ao final
+        models.XMLJournal.interned.clear()
+        models.XMLIssue.interned.clear()
+
+    def test_same_document_is_registered_once(self):
+        path = (
+            "./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip"
+        )
+        results = self._register_concurrently([path] * 4)
+
+        self.assertEqual(1, models.PidProviderXML.objects.count())
+        self.assertEqual(
+            ["created", "retrieved", "retrieved", "retrieved"],
+            sorted(result.get("record_status") for result in results),
+        )
+        self.assertEqual(1, len({result["v3"] for result in results}))
+
+
+class XMLJournalXMLIssueInternedTest(TestCase):
+    def setUp(self):
+        models.XMLJournal.interned.clear()
+        models.XMLIssue.interned.clear()
+
+    def tearDown(self):
+        # os registros são desfeitos ao final do teste
+        models.XMLJournal.interned.clear()
+        models.XMLIssue.interned.clear()
+
+    def test_get_or_create_are_interned_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            journal = models.XMLJournal.get_or_create("1234-5678", None)
+            issue = models.XMLIssue.get_or_create(journal, "1", None, None, "2020")
+
+        with self.assertNumQueries(0):
+            self.assertIs(journal, models.XMLJournal.get_or_create("1234-5678", None))
+            self.assertIs(
+                issue,
+                models.XMLIssue.get_or_create(journal, "1", None, None, "2020"),
+            )
+
+    def test_get_or_create_are_not_interned_if_rolled_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    models.XMLJournal.get_or_create("1234-5678", None)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertIsNone(models.XMLJournal.interned.get(("1234-5678", None)))
+
+    def test_interned_size_is_limited(self):
+        interned = LRUCache(2)
+        interned.set("a", 1)
+        interned.set("b", 2)
+        interned.get("a")
+        interned.set("c", 3)
+        self.assertEqual(1, interned.get("a"))
+        self.assertIsNone(interned.get("b"))
+        self.assertEqual(2, len(interned))
+
+
+class PidProviderXMLAddRelatedItemsInBulkTest(TestCase):
+    def test_add_related_items_in_bulk(self):
+        user = User.objects.create(username="user_related")
+        doc1 = models.PidProviderXML.objects.create(v3="V3RELATED1")
+        doc2 = models.PidProviderXML.objects.create(v3="V3RELATED2")
+        models.XMLRelatedItem.get_or_create("doi-1", user)
+
+        # consulta e criação dos itens, nova consulta e inserção das associações
+        with self.assertNumQueries(4):
+            models.PidProviderXML._add_related_items_in_bulk(
+                [(doc1, ["doi-1", "doi-2"]), (doc2, ["doi-2", "doi-3"])], user
+            )
+        models.PidProviderXML._add_related_items_in_bulk([(doc1, ["doi-1"])], user)
+
+        self.assertEqual(3, models.XMLRelatedItem.objects.count())
+        self.assertEqual(
+            ["doi-1", "doi-2"],
+            sorted(doc1.related_items.values_list("main_doi", flat=True)),
+        )
+        self.assertEqual(
+            ["doi-2", "doi-3"],
+            sorted(doc2.related_items.values_list("main_doi", flat=True)),
+        )
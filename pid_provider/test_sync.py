@@ -0,0 +1,164 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from pid_provider import exceptions, models, sync
+
+User = get_user_model()
+
+
+class CentralPidProviderStubHandler(BaseHTTPRequestHandler):
+    """
+    Pid provider central: serve os XML (GET) e responde aos registros (POST)
+    conforme o nome do arquivo
+    """
+
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(200, b"<article/>", "application/xml")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        filename = self.headers["Content-Disposition"].split("filename=")[-1]
+        self.requests.append(filename)
+        if filename == "unavailable.zip" and self.requests.count(filename) == 1:
+            self._respond(503, b"")
+        elif filename == "invalid.zip":
+            result = [{"error_type": "ERROR", "error_message": "invalid"}]
+            self._respond(200, json.dumps(result).encode("utf-8"))
+        else:
+            result = [{"v3": "V3", "record_status": "created"}]
+            self._respond(201, json.dumps(result).encode("utf-8"))
+
+
+class SynchronizeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), CentralPidProviderStubHandler
+        )
+        cls.uri = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        CentralPidProviderStubHandler.requests = []
+        self.user = User.objects.create(username="user_sync")
+        self.client = sync.CentralPidProviderClient(
+            uri=f"{self.uri}/pid_provider/", max_workers=2, backoff_factor=0
+        )
+
+    def _create_doc(self, v3, basename=None, synchronized=False):
+        doc = models.PidProviderXML.objects.create(v3=v3, synchronized=synchronized)
+        if basename:
+            doc.add_version(f"{self.uri}/{basename}", self.user, basename, v3)
+        return doc
+
+    def test_synchronize(self):
+        ok = self._create_doc("V3OK", "ok.xml")
+        unavailable = self._create_doc("V3UNAVAILABLE", "unavailable.xml")
+        invalid = self._create_doc("V3INVALID", "invalid.xml")
+        without_version = self._create_doc("V3NOVERSION")
+        synchronized = self._create_doc("V3SYNC", "synchronized.xml", True)
+
+        summary = sync.synchronize(self.user, self.client, batch_size=2)
+
+        self.assertEqual({"total": 4, "synchronized": 2, "failures": 2}, summary)
+        for doc in (ok, unavailable, invalid, without_version, synchronized):
+            doc.refresh_from_db()
+        self.assertTrue(ok.synchronized)
+        self.assertTrue(unavailable.synchronized)
+        self.assertFalse(invalid.synchronized)
+        self.assertIn("invalid", invalid.sync_failure.exception_msg)
+        self.assertFalse(without_version.synchronized)
+        self.assertIsNotNone(without_version.sync_failure)
+        self.assertEqual(
+            ["invalid.zip", "ok.zip", "unavailable.zip", "unavailable.zip"],
+            sorted(CentralPidProviderStubHandler.requests),
+        )
+
+    def test_synchronize_requests_outside_transaction(self):
+        doc = self._create_doc("V3OK", "ok.xml")
+        atomic_blocks = len(connection.atomic_blocks)
+        client = Mock()
+
+        def synchronize_many(docs):
+            self.assertEqual(atomic_blocks, len(connection.atomic_blocks))
+            self.assertIsNotNone(
+                models.PidProviderXML.objects.get(pk=doc.pk).sync_started
+            )
+            return [None]
+
+        client.synchronize_many.side_effect = synchronize_many
+
+        summary = sync.synchronize(self.user, client)
+
+        self.assertEqual({"total": 1, "synchronized": 1, "failures": 0}, summary)
+        doc.refresh_from_db()
+        self.assertTrue(doc.synchronized)
+        self.assertIsNone(doc.sync_started)
+
+    def test_synchronize_ignores_the_changed_documents(self):
+        doc = self._create_doc("V3OK", "ok.xml")
+        client = Mock()
+
+        def synchronize_many(docs):
+            models.PidProviderXML.objects.get(pk=doc.pk).add_version(
+                f"{self.uri}/ok.xml", self.user, "ok.xml", "NEW"
+            )
+            return [None]
+
+        client.synchronize_many.side_effect = synchronize_many
+
+        summary = sync.synchronize(self.user, client)
+
+        self.assertEqual({"total": 1, "synchronized": 0, "failures": 0}, summary)
+        doc.refresh_from_db()
+        self.assertFalse(doc.synchronized)
+        self.assertIsNone(doc.sync_started)
+
+    def test_synchronize_claims_the_stale_documents(self):
+        stale = self._create_doc("V3STALE", "stale.xml")
+        running = self._create_doc("V3RUNNING", "running.xml")
+        models.PidProviderXML.objects.filter(pk=stale.pk).update(
+            sync_started=timezone.now() - timedelta(hours=2)
+        )
+        models.PidProviderXML.objects.filter(pk=running.pk).update(
+            sync_started=timezone.now()
+        )
+
+        summary = sync.synchronize(self.user, self.client)
+
+        self.assertEqual({"total": 1, "synchronized": 1, "failures": 0}, summary)
+        self.assertEqual(["stale.zip"], CentralPidProviderStubHandler.requests)
+
+    def test_register_raises_error_after_retries(self):
+        client = sync.CentralPidProviderClient(
+            uri="http://127.0.0.1:1/pid_provider/", max_retries=1, backoff_factor=0
+        )
+        with self.assertRaises(exceptions.APIPidProviderPostError):
+            client.register("a.xml", b"<article/>")
@@ -0,0 +1,281 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from pid_provider import metrics, models
+from pid_provider.views import (
+    PidProviderJobViewSet,
+    PidProviderMetricsViewSet,
+    PidProviderRegistrationDemandViewSet,
+    PidProviderViewSet,
+)
+
+User = get_user_model()
+
+
+def _post(accept):
+    request = APIRequestFactory().post(
+        "/pid_provider/",
+        data=b"zip content",
+        content_type="application/zip",
+        HTTP_CONTENT_DISPOSITION="attachment; filename=pkg_test_views.zip",
+        HTTP_ACCEPT=accept,
+    )
+    force_authenticate(request, user=User(username="user"))
+    return request
+
+
+@patch(
+    "pid_provider.views.PidProviderViewSet.pid_provider",
+    new_callable=mock.PropertyMock,
+)
+class PidProviderViewSetCreateTest(TestCase):
+    def _mock_results(self, mock_pid_provider, results):
+        def provide_pid_for_xml_zip(zip_xml_file_path, user):
+            self.zip_xml_file_path = zip_xml_file_path
+            yield from results
+
+        mock_pid_provider.return_value = Mock(
+            provide_pid_for_xml_zip=provide_pid_for_xml_zip
+        )
+
+    def test_create_streams_ndjson(self, mock_pid_provider):
+        self._mock_results(
+            mock_pid_provider,
+            [
+                {"v3": "V3A", "record_status": "created"},
+                {"v3": "V3B", "record_status": "retrieved"},
+                {"error_type": "ERROR", "error_message": "MESSAGE"},
+            ],
+        )
+        view = PidProviderViewSet.as_view({"post": "create"})
+        response = view(_post("application/x-ndjson"))
+
+        self.assertEqual("application/x-ndjson", response["Content-Type"])
+        lines = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [
+                {"v3": "V3A", "record_status": "created"},
+                {"v3": "V3B", "record_status": "retrieved"},
+                {"error_type": "ERROR", "error_message": "MESSAGE"},
+                {
+                    "summary": {
+                        "total": 3,
+                        "errors": 1,
+                        "created": 1,
+                        "retrieved": 1,
+                    }
+                },
+            ],
+            lines,
+        )
+        self.assertFalse(FileSystemStorage().exists(self.zip_xml_file_path))
+
+    def test_create_returns_json_list(self, mock_pid_provider):
+        self._mock_results(
+            mock_pid_provider,
+            [{"v3": "V3A", "record_status": "created"}],
+        )
+        view = PidProviderViewSet.as_view({"post": "create"})
+        response = view(_post("application/json"))
+
+        self.assertEqual(201, response.status_code)
+        self.assertEqual([{"v3": "V3A", "record_status": "created"}], response.data)
+        self.assertFalse(FileSystemStorage().exists(self.zip_xml_file_path))
+
+
+@patch("pid_provider.views.tasks.provide_pid_for_job.apply_async")
+class PidProviderViewSetCreateAsyncTest(TestCase):
+    def test_create_async_returns_job(self, mock_apply_async):
+        user = User.objects.create(username="user_async")
+        request = APIRequestFactory().post(
+            "/pid_provider/?async=true",
+            data=b"zip content",
+            content_type="application/zip",
+            HTTP_CONTENT_DISPOSITION="attachment; filename=pkg_test_views.zip",
+        )
+        force_authenticate(request, user=user)
+        view = PidProviderViewSet.as_view({"post": "create"})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = view(request)
+
+        self.assertEqual(202, response.status_code)
+        self.assertEqual("queued", response.data["status"])
+        job = models.PidProviderJob.objects.get(pk=response.data["id"])
+        mock_apply_async.assert_called_once_with(args=(job.id, user.id))
+        job.file.delete()
+
+
+class PidProviderJobViewSetTest(TestCase):
+    def test_retrieve_returns_job_data_of_the_user(self):
+        user = User.objects.create(username="user_job")
+        job = models.PidProviderJob.objects.create(
+            filename="pkg.zip", creator=user, total=2, processed=1
+        )
+        other = models.PidProviderJob.objects.create(
+            filename="pkg.zip", creator=User.objects.create(username="other")
+        )
+        view = PidProviderJobViewSet.as_view({"get": "retrieve"})
+
+        request = APIRequestFactory().get("/pid_provider_jobs/")
+        force_authenticate(request, user=user)
+        response = view(request, pk=job.id)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, response.data["total"])
+        self.assertEqual(1, response.data["processed"])
+
+        request = APIRequestFactory().get("/pid_provider_jobs/")
+        force_authenticate(request, user=user)
+        response = view(request, pk=other.id)
+        self.assertEqual(404, response.status_code)
+
+
+class PidProviderViewSetListTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="user_feed")
+        for i in range(5):
+            models.PidProviderXML.objects.create(v3=f"V3{i}")
+
+    def _get(self, url, accept="application/json"):
+        request = APIRequestFactory().get(url, HTTP_ACCEPT=accept)
+        force_authenticate(request, user=self.user)
+        return PidProviderViewSet.as_view({"get": "list"})(request)
+
+    def test_list_is_paginated_by_cursor(self):
+        response = self._get("/pid_provider/?page_size=2")
+        self.assertEqual(["V30", "V31"], [i["v3"] for i in response.data["results"]])
+
+        v3s = []
+        next_url = response.data["next"]
+        while next_url:
+            response = self._get(next_url)
+            v3s.extend(i["v3"] for i in response.data["results"])
+            next_url = response.data["next"]
+        self.assertEqual(["V32", "V33", "V34"], v3s)
+
+    def test_list_without_pagination_parameters_returns_all_items(self):
+        response = self._get("/pid_provider/")
+        self.assertEqual(
+            ["V30", "V31", "V32", "V33", "V34"], [i["v3"] for i in response.data]
+        )
+
+    def test_list_page_size_is_limited(self):
+        with self.settings(PID_PROVIDER_XML_FEED_MAX_PAGE_SIZE=3):
+            response = self._get("/pid_provider/?page_size=100")
+        self.assertEqual(3, len(response.data["results"]))
+        self.assertIsNotNone(response.data["next"])
+
+    def test_list_invalid_cursor(self):
+        response = self._get("/pid_provider/?cursor=invalid")
+        self.assertEqual(400, response.status_code)
+
+    def test_list_streams_ndjson(self):
+        with self.settings(PID_PROVIDER_XML_FEED_MAX_PAGE_SIZE=2):
+            response = self._get("/pid_provider/", "application/x-ndjson")
+            lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(
+            ["V30", "V31", "V32", "V33", "V34"],
+            [json.loads(line)["v3"] for line in lines],
+        )
+
+
+class PidProviderRegistrationDemandViewSetTest(TestCase):
+    def test_create_with_identities(self):
+        models.PidProviderXML.objects.create(v3="V3DEMAND", identity_key="KEY")
+        request = APIRequestFactory().post(
+            "/pid_provider_registration_demand/",
+            data=[["KEY", "AOPKEY", "FP"], ["KEY"]],
+            format="json",
+        )
+        force_authenticate(request, user=User(username="user"))
+        view = PidProviderRegistrationDemandViewSet.as_view({"post": "create"})
+        response = view(request)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(["KEY", "AOPKEY", "FP"], response.data[0]["identity"])
+        self.assertEqual("V3DEMAND", response.data[0]["registered"]["v3"])
+        self.assertTrue(response.data[0]["required_local"])
+        self.assertEqual(["KEY"], response.data[1]["identity"])
+        self.assertIn("error", response.data[1])
+
+
+class PidProviderMetricsViewSetTest(TestCase):
+    def test_list_returns_prometheus_text(self):
+        metrics.reset_stages()
+        with metrics.document("a.xml"):
+            with metrics.stage(metrics.QUERY_DOCUMENT):
+                User.objects.count()
+            with metrics.stage(metrics.QUERY_DOCUMENT):
+                User.objects.count()
+        view = PidProviderMetricsViewSet.as_view({"get": "list"})
+
+        request = APIRequestFactory().get("/pid_provider_metrics/")
+        force_authenticate(request, user=User(username="user"))
+        response = view(request)
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        lines = response.content.decode("utf-8").splitlines()
+        self.assertIn(
+            'pid_provider_stage_seconds_count{stage="query_document"} 2', lines
+        )
+        self.assertIn(
+            'pid_provider_stage_queries_total{stage="query_document"} 2', lines
+        )
+        self.assertIn('pid_provider_stage_queries_total{stage="save"} 0', lines)
+
+
+class PidProviderMetricsTest(TestCase):
+    def test_increment_is_sent_to_the_cache_on_flush(self):
+        metrics.reset([metrics.V3_CACHE_HITS])
+        with self.settings(PID_PROVIDER_METRICS_FLUSH_INTERVAL=3600), patch(
+            "pid_provider.metrics.cache"
+        ) as mock_cache:
+            metrics.increment(metrics.V3_CACHE_HITS)
+            metrics.increment(metrics.V3_CACHE_HITS, 2)
+            mock_cache.incr.assert_not_called()
+
+            metrics.flush()
+            mock_cache.incr.assert_called_once_with(
+                "pid_provider:metrics:v3_cache_hits", 3
+            )
+
+    def test_get_includes_the_increments_of_the_process(self):
+        metrics.reset([metrics.V3_CACHE_HITS])
+        with self.settings(PID_PROVIDER_METRICS_FLUSH_INTERVAL=3600):
+            metrics.increment(metrics.V3_CACHE_HITS)
+            self.assertEqual(1, metrics.get(metrics.V3_CACHE_HITS))
+
+    def test_stage_counts_the_queries_of_the_autocommit_connection(self):
+        metrics.reset_stages()
+        with metrics.document("a.xml"):
+            with metrics.stage(metrics.COMPLETE_PIDS):
+                models._execute_in_autocommit("SELECT 1", [])
+                User.objects.count()
+        self.assertEqual(2, metrics.get_stages()[metrics.COMPLETE_PIDS]["queries"])
+
+    def test_stage_counts_the_queries_of_the_threads_using_its_context(self):
+        metrics.reset_stages()
+
+        def _run(ctx):
+            with metrics.use_context(ctx), metrics.stage(metrics.PUSH_XML_CONTENT):
+                models._execute_in_autocommit("SELECT 1", [])
+
+        with metrics.document("a.xml"):
+            with metrics.stage(metrics.REGISTER):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    list(executor.map(_run, [metrics.context()] * 2))
+
+        stages = metrics.get_stages()
+        self.assertEqual(2, stages[metrics.PUSH_XML_CONTENT]["count"])
+        self.assertEqual(2, stages[metrics.PUSH_XML_CONTENT]["queries"])
+        self.assertEqual(1, stages[metrics.REGISTER]["count"])
+        self.assertEqual(2, stages[metrics.REGISTER]["queries"])
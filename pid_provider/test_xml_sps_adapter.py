@@ -5,8 +5,17 @@ from django.test import TestCase
 from lxml import etree
 
 from pid_provider import exceptions
-from pid_provider.xml_sps_adapter import PidProviderXMLAdapter, _str_with_64_char
-from xmlsps.xml_sps_lib import XMLWithPre
+from pid_provider.xml_sps_adapter import (
+    PidProviderXMLAdapter,
+    _digest,
+    extract_record,
+    get_xml_adapters_from_zip_file,
+    identity_digest,
+    identity_lookup,
+    identity_query_list_from_keys,
+)
+from xmlsps.xml_sps_lib import XMLWithPre, get_xml_items
+from xmlsps.xml_sps_metadata import extract_metadata
 
 
 def _get_xml_adapter(xml=None):
@@ -44,6 +53,35 @@ class PidProviderXMLAdapterAbsentDataTest(TestCase):
         self.assertIsNone(self.xml_adapter.article_titles_texts)
 
 
+class PidProviderXMLAdapterCacheTest(TestCase):
+    def test_absent_data_is_obtained_once(self):
+        xml_adapter = _get_xml_adapter()
+        with patch(
+            "xmlsps.xml_sps_lib.extract_metadata", wraps=extract_metadata
+        ) as mock_extract_metadata, patch(
+            "pid_provider.xml_sps_adapter._digest", wraps=_digest
+        ) as mock_digest:
+            expected = xml_adapter.query_list
+            digest_calls = mock_digest.call_count
+            self.assertEqual(expected, xml_adapter.query_list)
+            xml_adapter.identity_key
+            xml_adapter.aop_identity_key
+        self.assertEqual(1, mock_extract_metadata.call_count)
+        self.assertEqual(digest_calls, mock_digest.call_count)
+
+    def test_v3_setter_invalidates_v3_and_serialization(self):
+        xml_adapter = _get_xml_adapter()
+        self.assertIsNone(xml_adapter.v3)
+        xml_bytes = xml_adapter.xml_bytes
+        metadata = xml_adapter.metadata
+
+        xml_adapter.v3 = "123456789012345678901v3"
+
+        self.assertEqual("123456789012345678901v3", xml_adapter.v3)
+        self.assertNotEqual(xml_bytes, xml_adapter.xml_bytes)
+        self.assertIs(metadata, xml_adapter.metadata)
+
+
 class PidProviderXMLAdapterIssnsTest(TestCase):
     def _get_xml_adapter(self, eissn=None, pissn=None):
         if eissn:
@@ -100,7 +138,7 @@ class PidProviderXMLAdapterLinksTest(TestCase):
     def test_links(self):
         self.assertEqual(
             "6b72bd4b527ccb19f6ccf9152c4e81abde3682d2d18e3cc15be939d16698f753",
-            self.xml_adapter.links,
+            self.xml_adapter.links.hex(),
         )
 
 
@@ -124,7 +162,7 @@ class PidProviderXMLAdapterCollabTest(TestCase):
     def test_collab(self):
         self.assertEqual(
             "1a6702665c1f2788424bf3859403b5faab1c5639497b231d5a04f24263dc1619",
-            self.xml_adapter.collab,
+            self.xml_adapter.collab.hex(),
         )
 
 
@@ -169,9 +207,20 @@ class PidProviderXMLAdapterContribGroupTest(TestCase):
         self.xml_adapter = _get_xml_adapter(xml)
 
     def test_surnames(self):
-        self.assertEqual(
-            _str_with_64_char("Torquato|Santis|Zanetti"), self.xml_adapter.surnames
-        )
+        self.assertEqual(_digest("Torquato|Santis|Zanetti"), self.xml_adapter.surnames)
+
+    @patch("xmlsps.xml_sps_lib.Authors")
+    def test_authors_are_obtained_with_packtools(self, mock_authors):
+        # contrib sem name e collab conforme packtools.sps.models.Authors
+        mock_authors.return_value.contribs = [
+            {"surname": "Torquato"},
+            {},
+            {"surname": "Zanetti"},
+        ]
+        mock_authors.return_value.collab = "Grupo"
+        xml_adapter = _get_xml_adapter()
+        self.assertEqual(_digest("Torquato||Zanetti"), xml_adapter.surnames)
+        self.assertEqual(_digest("Grupo"), xml_adapter.collab)
 
 
 class PidProviderXMLAdapterArticleTitlesTest(TestCase):
@@ -211,14 +260,14 @@ class PidProviderXMLAdapterArticleTitlesTest(TestCase):
     def test_one_title(self):
         xml_adapter = self._get_xml_adapter(main_title=True)
         self.assertEqual(
-            _str_with_64_char("Article title in English"),
+            _digest("Article title in English"),
             xml_adapter.article_titles_texts,
         )
 
     def test_article_titles_texts_en_pt(self):
         xml_adapter = self._get_xml_adapter(main_title=True, trans_titles=True)
         self.assertEqual(
-            _str_with_64_char("Article title in English|Título em português"),
+            _digest("Article title in English|Título em português"),
             xml_adapter.article_titles_texts,
         )
 
@@ -227,16 +276,14 @@ class PidProviderXMLAdapterArticleTitlesTest(TestCase):
             main_title=True, trans_titles=True, sub_article_titles=True
         )
         self.assertEqual(
-            _str_with_64_char(
-                "Article title in English|Título em português|título en español"
-            ),
+            _digest("Article title in English|Título em português|título en español"),
             xml_adapter.article_titles_texts,
         )
 
     def test_article_titles_texts_en_es(self):
         xml_adapter = self._get_xml_adapter(main_title=True, sub_article_titles=True)
         self.assertEqual(
-            _str_with_64_char("Article title in English|título en español"),
+            _digest("Article title in English|título en español"),
             xml_adapter.article_titles_texts,
         )
 
@@ -530,3 +577,168 @@ class PidProviderXMLAdapterQueryListTest(TestCase):
     def test_for_xml_is_not_aop(self):
         self.xml_adapter.is_aop = False
         self.assertEqual(2, len(self.xml_adapter.query_list))
+
+
+class IdentityDigestTest(TestCase):
+    def test_identity_digest_does_not_depend_on_params_order(self):
+        self.assertEqual(
+            identity_digest({"a": "1", "b": "2"}),
+            identity_digest({"b": "2", "a": "1"}),
+        )
+
+    def test_identity_digest_ignores_issue_isnull_and_none(self):
+        self.assertEqual(
+            identity_digest({"a": "1"}),
+            identity_digest({"a": "1", "b": None, "issue__isnull": True}),
+        )
+
+    def test_identity_digest_differs_for_different_values(self):
+        self.assertNotEqual(
+            identity_digest({"a": "1"}),
+            identity_digest({"a": "2"}),
+        )
+
+    def test_identity_digest_of_z_values_is_the_same_of_hex_values(self):
+        # os identificadores registrados quando os campos z_* eram
+        # armazenados em hexadecimal continuam válidos
+        digest = _digest("Silva|Santos")
+        expected = identity_digest({"z_surnames": digest.hex()})
+        self.assertEqual(32, len(digest))
+        self.assertEqual(expected, identity_digest({"z_surnames": digest}))
+        self.assertEqual(expected, identity_digest({"z_surnames": memoryview(digest)}))
+
+
+class IdentityLookupTest(TestCase):
+    def test_identity_lookup_for_aop_version(self):
+        params = {"a": "1", "issue__isnull": True}
+        self.assertEqual(
+            {"aop_identity_key": identity_digest(params), "issue__isnull": True},
+            identity_lookup(params),
+        )
+
+    def test_identity_lookup_filter_by_issue(self):
+        params = {"a": "1", "issue__volume": "2"}
+        self.assertEqual(
+            {"identity_key": identity_digest(params)},
+            identity_lookup(params),
+        )
+
+    def test_identity_lookup_without_issue_params(self):
+        params = {"a": "1"}
+        self.assertEqual(
+            {"aop_identity_key": identity_digest(params)},
+            identity_lookup(params),
+        )
+
+
+class IdentityQueryListFromKeysTest(TestCase):
+    def test_identity_query_list_from_keys(self):
+        self.assertEqual(
+            [
+                {"identity_key": "KEY"},
+                {"aop_identity_key": "AOPKEY", "issue__isnull": True},
+            ],
+            identity_query_list_from_keys("KEY", "AOPKEY"),
+        )
+
+    def test_identity_query_list_from_keys_of_aop(self):
+        self.assertEqual(
+            [{"aop_identity_key": "AOPKEY"}],
+            identity_query_list_from_keys(None, "AOPKEY"),
+        )
+
+    def test_compact_identity_matches_identity_query_list(self):
+        xml_adapter = _get_xml_adapter()
+        identity_key, aop_identity_key, finger_print = xml_adapter.compact_identity
+        self.assertEqual(xml_adapter.finger_print, finger_print)
+        self.assertEqual(
+            xml_adapter.identity_query_list,
+            identity_query_list_from_keys(identity_key, aop_identity_key),
+        )
+
+    def test_from_record_uses_record_data(self):
+        xml_adapter = _get_xml_adapter()
+        record = extract_record(xml_adapter)
+        record["volume"] = "10"
+        record["_surnames"] = "SURNAMES"
+
+        result = PidProviderXMLAdapter.from_record(
+            record, xml_adapter.tostring().encode("utf-8")
+        )
+        self.assertEqual("10", result.volume)
+        self.assertEqual("SURNAMES", result.surnames)
+        self.assertEqual(xml_adapter.finger_print, result.finger_print)
+
+    def test_from_record_reads_the_xml_only_if_required(self):
+        xml_adapter = _get_xml_adapter()
+        xml_adapter.v3 = "123456789012345678901v3"
+        record = extract_record(xml_adapter)
+        content = xml_adapter.tostring().encode("utf-8")
+
+        with patch(
+            "pid_provider.xml_sps_adapter.get_xml_with_pre"
+        ) as mock_get_xml_with_pre:
+            result = PidProviderXMLAdapter.from_record(
+                record, content, "pkg", raw_finger_print="RAW"
+            )
+            result.query_list
+            result.aop_identity_key
+            self.assertEqual("123456789012345678901v3", result.v3)
+            self.assertEqual(xml_adapter.finger_print, result.finger_print)
+            self.assertEqual("RAW", result.raw_finger_print)
+        mock_get_xml_with_pre.assert_not_called()
+
+        self.assertEqual(xml_adapter.tostring(), result.tostring())
+
+    def test_finger_print_is_updated_after_v3_update(self):
+        xml_adapter = _get_xml_adapter()
+        record = extract_record(xml_adapter)
+
+        result = PidProviderXMLAdapter.from_record(
+            record, xml_adapter.tostring().encode("utf-8"), raw_finger_print="RAW"
+        )
+        result.v3 = "123456789012345678901v3"
+        self.assertNotEqual(record["_finger_print"], result.finger_print)
+        self.assertEqual("123456789012345678901v3", result.v3)
+        self.assertIn("123456789012345678901v3", result.tostring())
+        self.assertEqual("RAW", result.xml_with_pre.raw_finger_print)
+
+
+class PidProviderXMLAdapterFingerPrintTest(TestCase):
+    def test_finger_print_and_tostring_serialize_the_tree_once(self):
+        xml_adapter = _get_xml_adapter()
+        with patch(
+            "pid_provider.xml_sps_adapter.etree.tostring", wraps=etree.tostring
+        ) as mock_tostring:
+            finger_print = xml_adapter.finger_print
+            self.assertEqual(finger_print, xml_adapter.finger_print)
+            xml_adapter.tostring()
+            xml_adapter.tostring()
+        self.assertEqual(1, mock_tostring.call_count)
+        self.assertEqual(xml_adapter.xml_with_pre.tostring(), xml_adapter.tostring())
+
+    def test_finger_print_is_reset_by_v3_setter(self):
+        xml_adapter = _get_xml_adapter()
+        finger_print = xml_adapter.finger_print
+        xml_adapter.v3 = "123456789012345678901v3"
+        self.assertNotEqual(finger_print, xml_adapter.finger_print)
+        self.assertIn("123456789012345678901v3", xml_adapter.tostring())
+
+
+class GetXMLAdaptersFromZipFileTest(TestCase):
+    def test_get_xml_adapters_from_zip_file(self):
+        path = (
+            "./pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip"
+        )
+        expected = [
+            (
+                item["filename"],
+                extract_record(PidProviderXMLAdapter(item["xml_with_pre"])),
+            )
+            for item in get_xml_items(path)
+        ]
+        result = [
+            (item["filename"], extract_record(item["xml_adapter"]))
+            for item in get_xml_adapters_from_zip_file(path, max_workers=2)
+        ]
+        self.assertEqual(expected, result)
@@ -2,10 +2,28 @@
 from django.conf.urls import include, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import PidProviderViewSet
+from .views import (
+    PidProviderJobViewSet,
+    PidProviderMetricsViewSet,
+    PidProviderRegistrationDemandViewSet,
+    PidProviderViewSet,
+)
 
 router = DefaultRouter()
 router.register("pid_provider", PidProviderViewSet, basename="pid_provider")
+router.register(
+    "pid_provider_jobs", PidProviderJobViewSet, basename="pid_provider_jobs"
+)
+router.register(
+    "pid_provider_registration_demand",
+    PidProviderRegistrationDemandViewSet,
+    basename="pid_provider_registration_demand",
+)
+router.register(
+    "pid_provider_metrics",
+    PidProviderMetricsViewSet,
+    basename="pid_provider_metrics",
+)
 
 
 app_name = "pid_provider"
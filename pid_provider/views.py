@@ -1,7 +1,13 @@
+import base64
+import json
 import logging
+from datetime import datetime
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.authentication import (
     BasicAuthentication,
@@ -15,13 +21,53 @@ from rest_framework.mixins import (
     RetrieveModelMixin,
     UpdateModelMixin,
 )
-from rest_framework.parsers import FileUploadParser
+from rest_framework.parsers import FileUploadParser, JSONParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import GenericViewSet
 
-from pid_provider import controller, models
-from pid_provider.serializer import PidProviderXMLSerializer
+from pid_provider import controller, metrics, models, tasks
+from pid_provider.serializers import PidProviderXMLSerializer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renderiza uma lista como JSON lines (um item por linha)
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, list):
+            data = [data]
+        return "".join(ndjson_line(item) for item in data)
+
+
+def ndjson_line(item):
+    return json.dumps(item, default=str) + "\n"
+
+
+def encode_cursor(item):
+    """
+    Cursor da paginação de xml_feed: (updated, id) do último item da página
+    """
+    value = json.dumps([item.updated.isoformat(), item.id])
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        updated, id = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        return datetime.fromisoformat(updated), int(id)
+    except (TypeError, ValueError):
+        raise ParseError(f"Invalid cursor: {cursor}")
 
 
 class PidProviderViewSet(
@@ -32,6 +78,7 @@ class PidProviderViewSet(
 ):  # handles GETs for many Companies
 
     parser_classes = (FileUploadParser,)
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
     http_method_names = ["post", "get", "head"]
 
     authentication_classes = [
@@ -67,22 +114,76 @@ class PidProviderViewSet(
         """
         List items filtered by from_date, issn, pub_year
 
+        Com os parâmetros `page_size` ou `cursor`, os itens são paginados por
+        cursor: a resposta contém no máximo `page_size` itens (limitado a
+        PID_PROVIDER_XML_FEED_MAX_PAGE_SIZE) e a URL da próxima página
+        em "next", com o parâmetro `cursor`
+
+        Com o cabeçalho "Accept: application/x-ndjson", todos os itens
+        (a partir de `cursor`, se informado) são enviados em JSON lines,
+        obtidos do banco de dados página a página
+
         Return
         ------
             list of dict
+            or, paginated,
+            {"next": str or None, "results": list of dict}
         """
-        from_ingress_date = request.query_params.get("from_ingress_date")
-        include_has_article = request.query_params.get("include_has_article")
-        issn = request.query_params.get("issn")
-        pub_year = request.query_params.get("pub_year")
-        queryset = models.PidProviderXML.xml_feed(
-            from_ingress_date,
-            issn,
-            pub_year,
-            include_has_article,
+        feed_params = dict(
+            from_ingress_date=request.query_params.get("from_ingress_date"),
+            issn=request.query_params.get("issn"),
+            pub_year=request.query_params.get("pub_year"),
+            include_has_article=request.query_params.get("include_has_article"),
+            after=decode_cursor(request.query_params.get("cursor")),
         )
-        serializer = PidProviderXMLSerializer(queryset, many=True)
-        return Response(serializer.data)
+        max_page_size = getattr(settings, "PID_PROVIDER_XML_FEED_MAX_PAGE_SIZE", 1000)
+        try:
+            page_size = int(
+                request.query_params.get("page_size")
+                or getattr(settings, "PID_PROVIDER_XML_FEED_PAGE_SIZE", 100)
+            )
+        except ValueError:
+            raise ParseError("page_size must be an integer")
+        page_size = max(1, min(page_size, max_page_size))
+
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                self._stream_xml_feed(feed_params, max_page_size),
+                content_type=NDJSONRenderer.media_type,
+            )
+
+        if not (
+            "page_size" in request.query_params or "cursor" in request.query_params
+        ):
+            # sem paginação, como antes da paginação por cursor
+            serializer = PidProviderXMLSerializer(
+                models.PidProviderXML.xml_feed(**feed_params), many=True
+            )
+            return Response(serializer.data)
+
+        # obtém um item a mais para saber se há próxima página
+        items = list(models.PidProviderXML.xml_feed(**feed_params, limit=page_size + 1))
+        next_url = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "cursor", encode_cursor(items[-1])
+            )
+        serializer = PidProviderXMLSerializer(items, many=True)
+        return Response({"next": next_url, "results": serializer.data})
+
+    def _stream_xml_feed(self, feed_params, page_size):
+        """
+        Gera uma linha JSON por item do xml_feed, consultando o banco de dados
+        a cada `page_size` itens
+        """
+        while True:
+            items = list(models.PidProviderXML.xml_feed(**feed_params, limit=page_size))
+            for item in items:
+                yield ndjson_line(PidProviderXMLSerializer(item).data)
+            if len(items) < page_size:
+                break
+            feed_params["after"] = (items[-1].updated, items[-1].id)
 
     def create(self, request, format="zip"):
         """
@@ -95,6 +196,14 @@ class PidProviderViewSet(
             --user "adm:adm" \
             127.0.0.1:8000/pid_provider/ --output output.txt
 
+        Com o parâmetro "async=true", o arquivo é registrado
+        assincronamente (tasks.provide_pid_for_job) e a resposta (202) contém
+        os dados do job, cujo progresso é consultado em /pid_provider_jobs/{id}/
+
+        Com o cabeçalho "Accept: application/x-ndjson", a resposta é
+        enviada em JSON lines, uma linha por XML assim que é processado,
+        seguida da linha de resumo {"summary": {...}}
+
         Return
         ------
             list of dict
@@ -124,6 +233,16 @@ class PidProviderViewSet(
         uploaded_file = request.FILES["file"]
         logging.info("Receiving file name %s" % uploaded_file.name)
 
+        if request.query_params.get("async") == "true":
+            job = models.PidProviderJob.create(uploaded_file, request.user)
+            # a tarefa é enviada somente após o registro do job ser efetivado
+            transaction.on_commit(
+                lambda: tasks.provide_pid_for_job.apply_async(
+                    args=(job.id, request.user.id)
+                )
+            )
+            return Response(job.data, status=status.HTTP_202_ACCEPTED)
+
         fs = FileSystemStorage()
         downloaded_file = fs.save(uploaded_file.name, uploaded_file)
         downloaded_file_path = fs.path(downloaded_file)
@@ -133,10 +252,166 @@ class PidProviderViewSet(
             zip_xml_file_path=downloaded_file_path,
             user=request.user,
         )
-        results = list(results)
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                self._stream_results(results, fs, downloaded_file),
+                content_type=NDJSONRenderer.media_type,
+            )
+
+        try:
+            results = list(results)
+        finally:
+            fs.delete(downloaded_file)
         for item in results:
             if item.get("record_status") == "created":
                 return Response(results, status=status.HTTP_201_CREATED)
             if item.get("error_type"):
                 return Response(results, status=status.HTTP_400_BAD_REQUEST)
             return Response(results, status=status.HTTP_200_OK)
+
+    def _stream_results(self, results, fs, downloaded_file):
+        """
+        Gera uma linha JSON por resultado e, por fim, a linha de resumo;
+        remove o arquivo temporário ao final
+        """
+        summary = {"total": 0, "errors": 0}
+        try:
+            try:
+                for item in results:
+                    summary["total"] += 1
+                    if item.get("error_type"):
+                        summary["errors"] += 1
+                    else:
+                        record_status = item.get("record_status")
+                        summary[record_status] = summary.get(record_status, 0) + 1
+                    yield ndjson_line(item)
+            except Exception as e:
+                # a resposta já foi iniciada, então o erro é informado em uma linha
+                logging.exception(e)
+                summary["errors"] += 1
+                yield ndjson_line({"error_type": str(type(e)), "error_message": str(e)})
+            yield ndjson_line({"summary": summary})
+        finally:
+            fs.delete(downloaded_file)
+
+
+class PidProviderRegistrationDemandViewSet(GenericViewSet):
+    """
+    Verifica, em conjunto, a necessidade de registro local e remoto
+    de vários documentos, antes de enviá-los
+    """
+
+    parser_classes = (JSONParser, FileUploadParser)
+    http_method_names = ["post"]
+
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        TokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request):
+        """
+        Receive a zip file which contains XML file(s) or a JSON list of
+        [identity_key, aop_identity_key, finger_print]
+        (see PidProviderXMLAdapter.compact_identity)
+
+        curl -X POST -S \
+            -H "Content-Type: application/json" \
+            -d '[["identity_key", "aop_identity_key", "finger_print"]]' \
+            --user "adm:adm" \
+            127.0.0.1:8000/pid_provider_registration_demand/
+
+        Return
+        ------
+            list of dict
+                {
+                    "filename" or "identity": ...,
+                    "registered": dict,
+                    "required_local": bool,
+                    "required_remote": bool,
+                }
+                or
+                {"filename" or "identity": ..., "error": str}
+        """
+        if isinstance(request.data, list):
+            return Response(
+                controller.PidProvider.get_registration_demands_for_identities(
+                    request.data
+                )
+            )
+
+        try:
+            uploaded_file = request.FILES["file"]
+        except KeyError:
+            raise ParseError("Expected a zip file or a list of identities")
+
+        fs = FileSystemStorage()
+        downloaded_file = fs.save(uploaded_file.name, uploaded_file)
+        try:
+            results = controller.PidProvider.get_registration_demands_for_xml_zip(
+                fs.path(downloaded_file)
+            )
+        finally:
+            fs.delete(downloaded_file)
+        return Response(results)
+
+
+class PidProviderJobViewSet(
+    GenericViewSet,
+    RetrieveModelMixin,
+    ListModelMixin,
+):
+    """
+    Consulta o progresso e os resultados dos registros assíncronos
+    (PidProviderViewSet.create com "async=true") do usuário
+    """
+
+    http_method_names = ["get", "head"]
+
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        TokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return models.PidProviderJob.objects.filter(creator=self.request.user).order_by(
+            "-id"
+        )
+
+    def retrieve(self, request, pk=None):
+        return Response(self.get_object().data)
+
+    def list(self, request):
+        return Response(
+            [
+                {key: value for key, value in job.data.items() if key != "results"}
+                for job in self.get_queryset()
+            ]
+        )
+
+
+class PidProviderMetricsViewSet(GenericViewSet):
+    """
+    Expõe os contadores e as etapas do registro (metrics)
+    no formato de texto do Prometheus
+
+    curl --user "adm:adm" 127.0.0.1:8000/pid_provider_metrics/
+    """
+
+    http_method_names = ["get", "head"]
+
+    authentication_classes = [
+        SessionAuthentication,
+        BasicAuthentication,
+        TokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        return HttpResponse(
+            metrics.prometheus_text(), content_type="text/plain; version=0.0.4"
+        )
@@ -1,22 +1,91 @@
 import hashlib
 import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile
 
 from django.utils.translation import gettext as _
 from lxml import etree
 
 from files_storage.utils import generate_finger_print
 from pid_provider import exceptions
+from xmlsps.xml_sps_lib import (
+    cached_property,
+    clear_cached_properties,
+    get_raw_finger_print,
+    get_xml_with_pre,
+)
 
 LOGGER = logging.getLogger(__name__)
 LOGGER_FMT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 
+# dados obtidos de XMLWithPre que compõem o registro extraído do XML
+# (extract_record), usados por PidProviderXML.register
+RECORD_FIELDS = (
+    "journal_issn_electronic",
+    "journal_issn_print",
+    "volume",
+    "number",
+    "suppl",
+    "fpage",
+    "fpage_seq",
+    "lpage",
+    "elocation_id",
+    "pub_year",
+    "article_pub_year",
+    "main_doi",
+    "main_toc_section",
+    "is_aop",
+    "v2_prefix",
+    "related_items",
+)
+# propriedades de PidProviderXMLAdapter cujos valores ficam em cache
+RECORD_CACHED_FIELDS = (
+    "v2",
+    "v3",
+    "aop_pid",
+    "links",
+    "collab",
+    "surnames",
+    "article_titles_texts",
+    "partial_body",
+    "finger_print",
+)
+
 
 class PidProviderXMLAdapter:
     def __init__(self, xml_with_pre, pkg_name=None):
-        self.xml_with_pre = xml_with_pre
+        self._xml_with_pre = xml_with_pre
+        self._content = None
+        self._raw_finger_print = None
         self.pkg_name = pkg_name
 
+    @classmethod
+    def from_record(cls, record, content, pkg_name=None, raw_finger_print=None):
+        """
+        Cria o adaptador com os dados previamente extraídos (extract_record)
+        do XML `content` (bytes), que somente é lido (xml_with_pre) se
+        necessário, por exemplo, para ser serializado (tostring) ou para
+        ter os PIDs atualizados
+        """
+        obj = cls(None, pkg_name)
+        obj._content = content
+        obj._raw_finger_print = raw_finger_print
+        obj.__dict__.update(record)
+        return obj
+
+    @property
+    def xml_with_pre(self):
+        if self._xml_with_pre is None:
+            self._xml_with_pre = get_xml_with_pre(self._content)
+            self._xml_with_pre.raw_finger_print = self._raw_finger_print
+            self._content = None
+        return self._xml_with_pre
+
     def __getattr__(self, name):
+        # os atributos de cache (_links, _collab, ...) são consultados em
+        # self.__dict__ para não obter os de mesmo nome de self.xml_with_pre
         logging.debug(type(self.xml_with_pre))
         try:
             return getattr(self.xml_with_pre, name)
@@ -26,74 +95,92 @@ class PidProviderXMLAdapter:
                 f"Unable to get PidProviderXMLAdapter.{name} {type(e)} {e}"
             )
 
-    @property
+    @cached_property
+    def xml_bytes(self):
+        """
+        XML (sem o texto anterior ao elemento root) serializado uma única vez,
+        até que os setters de v2, v3 ou aop_pid alterem a árvore
+        """
+        return etree.tostring(self.xmltree, encoding="utf-8")
+
+    @cached_property
     def finger_print(self):
-        return generate_finger_print(etree.tostring(self.xmltree, encoding="utf-8"))
+        return generate_finger_print(self.xml_bytes)
 
     @property
+    def raw_finger_print(self):
+        """
+        sha256 do conteúdo original do XML, se obtido de arquivo compactado
+        """
+        return self._raw_finger_print or getattr(
+            self.xml_with_pre, "raw_finger_print", None
+        )
+
+    def tostring(self):
+        return self.xml_content
+
+    @cached_property
+    def xml_content(self):
+        return self.xmlpre + self.xml_bytes.decode("utf-8")
+
+    def _reset_serialization(self):
+        clear_cached_properties(self, "xml_bytes", "finger_print", "xml_content")
+
+    @cached_property
     def v2(self):
         return self.xml_with_pre.v2
 
     @v2.setter
     def v2(self, value):
         self.xml_with_pre.v2 = value
+        self._reset_serialization()
 
-    @property
+    @cached_property
     def v3(self):
         return self.xml_with_pre.v3
 
     @v3.setter
     def v3(self, value):
         self.xml_with_pre.v3 = value
+        self._reset_serialization()
 
-    @property
+    @cached_property
     def aop_pid(self):
         return self.xml_with_pre.aop_pid
 
     @aop_pid.setter
     def aop_pid(self, value):
         self.xml_with_pre.aop_pid = value
+        self._reset_serialization()
 
-    @property
+    @cached_property
     def links(self):
-        if not hasattr(self, "_links") or not self._links:
-            self._links = _str_with_64_char("|".join(self.xml_with_pre.links))
-        return self._links
+        return _digest("|".join(self.xml_with_pre.links))
 
-    @property
+    @cached_property
     def collab(self):
-        if not hasattr(self, "_collab") or not self._collab:
-            self._collab = _str_with_64_char(self.xml_with_pre.collab)
-        return self._collab
+        return _digest(self.xml_with_pre.collab)
 
-    @property
+    @cached_property
     def surnames(self):
-        if not hasattr(self, "_surnames") or not self._surnames:
-            self._surnames = _str_with_64_char(
-                "|".join(
-                    [
-                        _standardize(person.get("surname"))
-                        for person in self.authors.get("person")
-                    ]
-                )
+        return _digest(
+            "|".join(
+                [
+                    _standardize(person.get("surname"))
+                    for person in self.xml_with_pre.authors.get("person")
+                ]
             )
-        return self._surnames
+        )
 
-    @property
+    @cached_property
     def article_titles_texts(self):
-        if not hasattr(self, "_article_titles_texts") or not self._article_titles_texts:
-            self._article_titles_texts = None
-            if self.xml_with_pre.article_titles_texts:
-                self._article_titles_texts = _str_with_64_char(
-                    "|".join(sorted(self.xml_with_pre.article_titles_texts))
-                )
-        return self._article_titles_texts
+        if self.xml_with_pre.article_titles_texts:
+            return _digest("|".join(sorted(self.xml_with_pre.article_titles_texts)))
+        return None
 
-    @property
+    @cached_property
     def partial_body(self):
-        if not hasattr(self, "_partial_body") or not self._partial_body:
-            self._partial_body = _str_with_64_char(self.xml_with_pre.partial_body)
-        return self._partial_body
+        return _digest(self.xml_with_pre.partial_body)
 
     def query_params(self, filter_by_issue=False, aop_version=False):
         """
@@ -167,25 +254,230 @@ class PidProviderXMLAdapter:
             items.append(params)
         return items
 
+    @property
+    def identity_key(self):
+        return identity_digest(self.query_params(filter_by_issue=True))
+
+    @property
+    def aop_identity_key(self):
+        return identity_digest(self.query_params(aop_version=True))
+
+    @property
+    def identity_query_list(self):
+        return [identity_lookup(params) for params in self.query_list]
+
+    @property
+    def compact_identity(self):
+        """
+        Identificação compacta do documento, usada na verificação em lote
+        da necessidade de registro (identity_query_list_from_keys)
+
+        Returns
+        -------
+        tuple (identity_key ou None, se aop, aop_identity_key, finger_print)
+        """
+        identity_key = None if self.is_aop else self.identity_key
+        return (identity_key, self.aop_identity_key, self.finger_print)
+
+
+def identity_digest(query_params):
+    """
+    Gera o identificador canônico (sha256) do documento a partir dos
+    parâmetros de consulta (query_params), desconsiderando `issue__isnull`
+    e os parâmetros sem valor
+
+    Arguments
+    ---------
+    query_params : dict
+
+    Returns
+    -------
+    str (64 caracteres)
+    """
+    items = sorted(
+        f"{name}={_hex(value)}"
+        for name, value in query_params.items()
+        if name != "issue__isnull" and value is not None
+    )
+    return hashlib.sha256("\n".join(items).encode("utf-8")).hexdigest()
+
+
+def _hex(value):
+    # os valores z_* (bytes ou, obtidos do banco de dados, memoryview)
+    # são representados em hexadecimal
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return value
+
+
+def identity_lookup(query_params):
+    """
+    Converte os parâmetros de consulta (query_params) na consulta
+    equivalente pelos identificadores canônicos
+
+    - com dados de fascículo: identity_key
+    - sem dados de fascículo: aop_identity_key (e issue__isnull, se presente)
+
+    Arguments
+    ---------
+    query_params : dict
+
+    Returns
+    -------
+    dict
+    """
+    digest = identity_digest(query_params)
+    if "issue__isnull" in query_params:
+        return {
+            "aop_identity_key": digest,
+            "issue__isnull": query_params["issue__isnull"],
+        }
+    if any(name.startswith("issue__") for name in query_params):
+        return {"identity_key": digest}
+    return {"aop_identity_key": digest}
+
+
+def identity_query_list_from_keys(identity_key, aop_identity_key):
+    """
+    Retorna o equivalente a PidProviderXMLAdapter.identity_query_list
+    a partir dos identificadores canônicos do documento
+
+    Arguments
+    ---------
+    identity_key : str
+        None, se o documento é aop
+    aop_identity_key : str
+
+    Returns
+    -------
+    list of dict
+    """
+    if identity_key:
+        return [
+            {"identity_key": identity_key},
+            {"aop_identity_key": aop_identity_key, "issue__isnull": True},
+        ]
+    return [{"aop_identity_key": aop_identity_key}]
+
+
+def as_xml_adapter(xml_with_pre, pkg_name=None):
+    """
+    Retorna PidProviderXMLAdapter de xml_with_pre (XMLWithPre ou
+    PidProviderXMLAdapter, por exemplo, de get_xml_adapters_from_zip_file)
+
+    pkg_name (nome do arquivo XML sem extensão) faz parte da identidade
+    (query_params) dos documentos que não têm outros dados que os
+    identifiquem e deve ser o mesmo registrado em PidProviderXML.pkg_name
+    """
+    if isinstance(xml_with_pre, PidProviderXMLAdapter):
+        if pkg_name:
+            xml_with_pre.pkg_name = pkg_name
+        return xml_with_pre
+    return PidProviderXMLAdapter(xml_with_pre, pkg_name)
+
+
+def extract_record(xml_adapter):
+    """
+    Extrai de xml_adapter os dados usados no registro (dict serializável)
+    """
+    record = {name: getattr(xml_adapter, name) for name in RECORD_FIELDS}
+    for name in RECORD_CACHED_FIELDS:
+        record[f"_{name}"] = getattr(xml_adapter, name)
+    return record
+
+
+def _get_record(content):
+    # executado nos processos de get_xml_adapters_from_zip_file
+    return extract_record(PidProviderXMLAdapter(get_xml_with_pre(content)))
+
+
+def get_xml_adapters_from_zip_file(
+    xml_sps_file_path, filenames=None, max_workers=None, retrieve=None
+):
+    """
+    Obtém os XML do arquivo compactado, extraindo os dados de registro
+    (extract_record) em `max_workers` processos
+
+    Os itens são retornados na ordem do arquivo compactado, à medida que
+    são processados, enquanto os próximos são processados. O processo
+    principal somente lê o XML se necessário
+    (PidProviderXMLAdapter.from_record)
+
+    Arguments
+    ---------
+    xml_sps_file_path : str
+    filenames : str list
+    max_workers : int
+    retrieve : callable
+        recebe o sha256 do conteúdo original do XML e retorna os dados
+        do registro correspondente ou None; os XML com registro
+        não são processados
+
+    Returns
+    -------
+    dict iterator which keys are filename and xml_adapter
+    or filename and registered
+    """
+    max_workers = max_workers or os.cpu_count()
+    with ZipFile(xml_sps_file_path) as zf:
+        filenames = iter(
+            filenames or [item for item in zf.namelist() if item.endswith(".xml")]
+        )
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+
+            def submit():
+                filename = next(filenames, None)
+                if filename:
+                    content = zf.read(filename)
+                    raw_finger_print = get_raw_finger_print(content)
+                    registered = retrieve and retrieve(raw_finger_print)
+                    future = None
+                    if not registered:
+                        future = executor.submit(_get_record, content)
+                    pending.append(
+                        (filename, raw_finger_print, content, future, registered)
+                    )
+
+            # limita a quantidade de XML em memória
+            for i in range(max_workers * 2):
+                submit()
+
+            while pending:
+                (
+                    filename,
+                    raw_finger_print,
+                    content,
+                    future,
+                    registered,
+                ) = pending.popleft()
+                submit()
+                if registered:
+                    yield {"filename": filename, "registered": registered}
+                    continue
+                yield {
+                    "filename": filename,
+                    "xml_adapter": PidProviderXMLAdapter.from_record(
+                        future.result(),
+                        content,
+                        os.path.splitext(os.path.basename(filename))[0],
+                        raw_finger_print,
+                    ),
+                }
+
 
 def _standardize(text):
     return (text or "").strip().upper()
 
 
-def _str_with_64_char(text):
+def _digest(text):
     """
-    >>> import hashlib
-    >>> m = hashlib.sha256()
-    >>> m.update(b"Nobody inspects")
-    >>> m.update(b" the spammish repetition")
-    >>> m.digest()
-    b'\x03\x1e\xdd}Ae\x15\x93\xc5\xfe\\\x00o\xa5u+7\xfd\xdf\xf7\xbcN\x84:\xa6\xaf\x0c\x95\x0fK\x94\x06'
-    >>> m.digest_size
-    32
-    >>> m.block_size
-    64
-    hashlib.sha224(b"Nobody inspects the spammish repetition").hexdigest()
+    sha256 (32 bytes) do texto padronizado, armazenado nos campos z_*
+    de PidProviderXML
+
+    >>> _digest("Nobody inspects the spammish repetition").hex()
+    'c7e82196ca81edf6b2c570c540f2618008c326f7169bce4fdb16401afe351c66'
     """
     if not text:
         return None
-    return hashlib.sha256(_standardize(text).encode("utf-8")).hexdigest()
+    return hashlib.sha256(_standardize(text).encode("utf-8")).digest()
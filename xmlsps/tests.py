@@ -1,13 +1,22 @@
 import os
+import threading
 from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tempfile import TemporaryDirectory
 from unittest.mock import MagicMock, patch
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
 from django.test import TestCase
 from lxml import etree
+from packtools.sps.models.article_doi_with_lang import DoiWithLang
+from packtools.sps.models.article_titles import ArticleTitles
+from packtools.sps.models.dates import ArticleDates
+from packtools.sps.models.front_articlemeta_issue import ArticleMetaIssue
+from packtools.sps.models.front_journal_meta import ISSN
+from packtools.sps.models.related_articles import RelatedItems
 from requests import HTTPError
 
-from xmlsps import xml_sps_lib
+from xmlsps import uri_content, xml_sps_lib, xml_sps_metadata
 
 
 # Create your tests here.
@@ -22,7 +31,7 @@ class GetXmlItemsTest(TestCase):
     def test_xml(self, mock_open, mock_get_xml_with_pre):
         mock_get_xml_with_pre.return_value = "retorno"
         result = xml_sps_lib.get_xml_items("file.xml")
-        mock_open.assert_called_with("file.xml")
+        mock_open.assert_called_with("file.xml", "rb")
         self.assertListEqual(
             [{"filename": "file.xml", "xml_with_pre": "retorno"}], result
         )
@@ -65,25 +74,192 @@ class CreateXmlZipFileTest(TestCase):
                 result = xml_sps_lib.create_xml_zip_file(file_path, "<article/>")
 
 
+class UpdateZipFileXmlTest(TestCase):
+    def setUp(self):
+        self.dirname = TemporaryDirectory()
+        self.addCleanup(self.dirname.cleanup)
+        self.file_path = os.path.join(self.dirname.name, "package.zip")
+        with ZipFile(self.file_path, "w", compression=ZIP_DEFLATED) as zf:
+            zf.writestr("a.pdf", b"%PDF" + os.urandom(100000))
+            zf.writestr("a.xml", b"<article/>")
+            zf.writestr("a.jpg", os.urandom(1000), compress_type=ZIP_STORED)
+        with ZipFile(self.file_path) as zf:
+            self.infos = {info.filename: info for info in zf.infolist()}
+            self.contents = {name: zf.read(name) for name in zf.namelist()}
+
+    def test_update_zip_file_xml_replaces_only_the_xml(self):
+        result = xml_sps_lib.update_zip_file_xml(
+            self.file_path, "a.xml", b"<article>new</article>"
+        )
+        self.assertTrue(result)
+        with ZipFile(self.file_path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(["a.pdf", "a.xml", "a.jpg"], zf.namelist())
+            self.assertEqual(b"<article>new</article>", zf.read("a.xml"))
+            for name in ("a.pdf", "a.jpg"):
+                info = zf.getinfo(name)
+                self.assertEqual(self.contents[name], zf.read(name))
+                self.assertEqual(self.infos[name].compress_type, info.compress_type)
+                self.assertEqual(self.infos[name].compress_size, info.compress_size)
+                self.assertEqual(self.infos[name].date_time, info.date_time)
+        self.assertEqual(["package.zip"], os.listdir(self.dirname.name))
+
+    def test_update_zip_file_xml_adds_absent_xml(self):
+        xml_sps_lib.update_zip_file_xml(self.file_path, "b.xml", b"<article/>")
+        with ZipFile(self.file_path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(["a.pdf", "a.xml", "a.jpg", "b.xml"], zf.namelist())
+
+    def test_update_zip_file_xml_creates_the_file(self):
+        file_path = os.path.join(self.dirname.name, "new.zip")
+        self.assertTrue(
+            xml_sps_lib.update_zip_file_xml(file_path, "a.xml", b"<article/>")
+        )
+        with ZipFile(file_path) as zf:
+            self.assertEqual(b"<article/>", zf.read("a.xml"))
+
+    @patch("xmlsps.xml_sps_lib.copy_zip_member")
+    def test_update_zip_file_xml_keeps_the_file_if_it_fails(self, mock_copy_zip_member):
+        mock_copy_zip_member.side_effect = OSError()
+        with self.assertRaises(OSError):
+            xml_sps_lib.update_zip_file_xml(self.file_path, "a.xml", b"<article/>")
+        with ZipFile(self.file_path) as zf:
+            self.assertEqual(self.contents["a.xml"], zf.read("a.xml"))
+        self.assertEqual(["package.zip"], os.listdir(self.dirname.name))
+
+
 class GetXmlWithPreFromUriTest(TestCase):
-    @patch("xmlsps.xml_sps_lib.requests.get")
-    def test_get_xml_with_pre_from_uri(self, mock_get):
+    @patch("xmlsps.uri_content.get_session")
+    def test_get_xml_with_pre_from_uri(self, mock_get_session):
         class Resp:
             def __init__(self):
                 self.content = b"<article/>"
 
-        mock_get.return_value = Resp()
+            def raise_for_status(self):
+                pass
+
+        mock_get_session.return_value.get.return_value = Resp()
         result = xml_sps_lib.get_xml_with_pre_from_uri("URI")
         self.assertEqual(xml_sps_lib.XMLWithPre, type(result))
 
-    @patch("xmlsps.xml_sps_lib.requests.get")
-    def test_does_not_create_file(self, mock_get):
-        mock_get.side_effect = HTTPError()
+    @patch("xmlsps.uri_content.get_session")
+    def test_does_not_create_file(self, mock_get_session):
+        mock_get_session.return_value.get.side_effect = HTTPError()
         with self.assertRaises(xml_sps_lib.GetXmlWithPreFromURIError) as exc:
             result = xml_sps_lib.get_xml_with_pre_from_uri("URI")
         self.assertIn("URI", str(exc.exception))
 
 
+class XMLStubHandler(BaseHTTPRequestHandler):
+    """
+    Serve o XML de qualquer caminho, exceto /not_found.xml (404)
+    """
+
+    paths = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        if self.path == "/not_found.xml":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = f"<article><front>{self.path}</front></article>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GetXmlWithPreFromUriCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), XMLStubHandler)
+        cls.uri = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        XMLStubHandler.paths = []
+        self.dirname = TemporaryDirectory()
+        self.cache = uri_content.URIContentCache(
+            memory_size=1024, directory=self.dirname.name, disk_size=1024
+        )
+        patcher = patch("xmlsps.uri_content.get_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.dirname.cleanup)
+
+    def test_cached_uri_is_requested_once(self):
+        uri = f"{self.uri}/a.xml"
+        results = [
+            xml_sps_lib.get_xml_with_pre_from_uri(uri, cache=True) for i in range(3)
+        ]
+        # outro processo, com o mesmo diretório
+        self.cache._items.clear()
+        results.append(xml_sps_lib.get_xml_with_pre_from_uri(uri, cache=True))
+
+        self.assertEqual(["/a.xml"], XMLStubHandler.paths)
+        for result in results:
+            self.assertEqual(
+                "<article><front>/a.xml</front></article>", result.tostring()
+            )
+        # XMLWithPre distintos, que podem ser alterados
+        self.assertIsNot(results[0].xmltree, results[1].xmltree)
+
+    def test_uri_is_not_cached_by_default(self):
+        uri = f"{self.uri}/a.xml"
+        xml_sps_lib.get_xml_with_pre_from_uri(uri)
+        xml_sps_lib.get_xml_with_pre_from_uri(uri)
+        self.assertEqual(["/a.xml", "/a.xml"], XMLStubHandler.paths)
+
+    def test_error_is_not_cached(self):
+        uri = f"{self.uri}/not_found.xml"
+        for i in range(2):
+            with self.assertRaises(xml_sps_lib.GetXmlWithPreFromURIError):
+                xml_sps_lib.get_xml_with_pre_from_uri(uri, cache=True)
+        self.assertEqual(["/not_found.xml", "/not_found.xml"], XMLStubHandler.paths)
+        self.assertIsNone(self.cache.get(uri))
+
+
+class URIContentCacheTest(TestCase):
+    def test_least_recently_used_items_are_discarded_from_memory(self):
+        cache = uri_content.URIContentCache(memory_size=20)
+        cache.set("a", b"a" * 10)
+        cache.set("b", b"b" * 10)
+        cache.get("a")
+        cache.set("c", b"c" * 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(b"a" * 10, cache.get("a"))
+        self.assertEqual(b"c" * 10, cache.get("c"))
+
+    def test_least_recently_used_items_are_discarded_from_disk(self):
+        with TemporaryDirectory() as dirname:
+            cache = uri_content.URIContentCache(
+                memory_size=0, directory=dirname, disk_size=30
+            )
+            for mtime, uri in enumerate(("a", "b", "c"), 1):
+                cache.set(uri, uri.encode("utf-8") * 10)
+                os.utime(cache._path(uri), (mtime, mtime))
+            cache.get("a")
+            cache.set("d", b"d" * 10)
+
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNone(cache.get("c"))
+            self.assertEqual(b"a" * 10, cache.get("a"))
+            self.assertEqual(b"d" * 10, cache.get("d"))
+
+
 class GetXmlWithPreTest(TestCase):
     def test_get_xml_with_pre(self):
         result = xml_sps_lib.get_xml_with_pre("<article/>")
@@ -98,6 +274,38 @@ class GetXmlWithPreTest(TestCase):
             result = xml_sps_lib.get_xml_with_pre("<?proc<article/>")
         print(exc.exception)
 
+    def test_get_xml_with_pre_from_bytes_is_equal_to_from_str(self):
+        items = xml_sps_lib.get_xml_raw_items_from_zip_file(
+            "xmlsps/fixtures/artigo.xml.zip"
+        )
+        content = list(items)[0]["content"]
+        expected = xml_sps_lib.get_xml_with_pre(content.decode("utf-8"))
+        for xml_content in (content, memoryview(content)):
+            result = xml_sps_lib.get_xml_with_pre(xml_content)
+            self.assertEqual(expected.xmlpre, result.xmlpre)
+            self.assertEqual(expected.tostring(), result.tostring())
+
+    def test_get_xml_with_pre_from_bytes_keeps_encoding(self):
+        xml_content = (
+            '\ufeff<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+            '<!DOCTYPE article [<!ENTITY sect "§">]>\n'
+            "<!-- comment --><article>Título</article>"
+        ).encode("ISO-8859-1", errors="ignore")
+        result = xml_sps_lib.get_xml_with_pre(b"\xef\xbb\xbf" + xml_content)
+        self.assertEqual("ISO-8859-1", result.encoding)
+        self.assertEqual(
+            '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+            '<!DOCTYPE article [<!ENTITY sect "§">]>\n'
+            "<!-- comment -->",
+            result.xmlpre,
+        )
+        self.assertEqual(xml_content, result.tobytes())
+
+    def test_get_xml_with_pre_from_bytes_without_pre(self):
+        result = xml_sps_lib.get_xml_with_pre(b"  <article/>")
+        self.assertEqual("", result.xmlpre)
+        self.assertEqual("<article/>", result.tostring())
+
 
 class SplitProcessingInstructionDoctypeDeclarationAndXmlTest(TestCase):
     def test_processing_instruction_is_absent(self):
@@ -215,6 +423,57 @@ class XMLWithPreIdsTest(TestCase):
         self.assertTrue(xml_with_pre.is_aop)
 
 
+class XMLWithPreCacheTest(TestCase):
+    def _get_xml_with_pre(self):
+        # aop, sem volume, número, suplemento, collab e body
+        xml = """
+        <article>
+        <front>
+        <article-meta>
+        <article-id specific-use="scielo-v3">123456789012345678901v3</article-id>
+        </article-meta>
+        </front>
+        </article>
+        """
+        return xml_sps_lib.XMLWithPre("", etree.fromstring(xml))
+
+    def test_absent_data_is_obtained_once(self):
+        xml_with_pre = self._get_xml_with_pre()
+        with patch(
+            "xmlsps.xml_sps_lib.extract_metadata",
+            wraps=xml_sps_metadata.extract_metadata,
+        ) as mock_extract_metadata:
+            for i in range(2):
+                self.assertIsNone(xml_with_pre.volume)
+                self.assertIsNone(xml_with_pre.number)
+                self.assertIsNone(xml_with_pre.suppl)
+                self.assertIsNone(xml_with_pre.collab)
+                self.assertIsNone(xml_with_pre.partial_body)
+                self.assertIsNone(xml_with_pre.article_publication_date)
+                self.assertIsNone(xml_with_pre.article_pub_year)
+                self.assertTrue(xml_with_pre.is_aop)
+        self.assertEqual(1, mock_extract_metadata.call_count)
+
+    def test_pid_setter_invalidates_only_the_pid(self):
+        xml_with_pre = self._get_xml_with_pre()
+        with patch(
+            "xmlsps.xml_sps_lib.ArticleIds", wraps=xml_sps_lib.ArticleIds
+        ) as mock_article_ids:
+            self.assertEqual("123456789012345678901v3", xml_with_pre.v3)
+            self.assertIsNone(xml_with_pre.v2)
+            self.assertEqual("123456789012345678901v3", xml_with_pre.v3)
+            self.assertIsNone(xml_with_pre.v2)
+            self.assertEqual(2, mock_article_ids.call_count)
+            metadata = xml_with_pre.metadata
+
+            xml_with_pre.v3 = "123456789012345678902v3"
+
+            self.assertEqual("123456789012345678902v3", xml_with_pre.v3)
+            self.assertIsNone(xml_with_pre.v2)
+            self.assertEqual(3, mock_article_ids.call_count)
+        self.assertIs(metadata, xml_with_pre.metadata)
+
+
 class XMLWithPrePublicationDateTest(TestCase):
     def _get_xml_with_pre(self, date_type=None, year=None, month=None, day=None):
         xml_year = year and f"<year>{year}</year>" or ""
@@ -321,3 +580,102 @@ class XMLWithPreBodyTest(TestCase):
     def test_body(self):
         xml_with_pre = self._get_xml_with_pre("")
         self.assertIsNone(xml_with_pre.partial_body)
+
+
+class ExtractMetadataTest(TestCase):
+    def _get_expected(self, xmltree):
+        # dados obtidos com os modelos de packtools
+        article_meta_issue = ArticleMetaIssue(xmltree)
+        toc_section = xmltree.find('.//subj-group[@subj-group-type="heading"]')
+        return {
+            "issns": {item["type"]: item["value"] for item in ISSN(xmltree).data},
+            "main_doi": DoiWithLang(xmltree).main_doi,
+            "main_toc_section": (
+                None if toc_section is None else toc_section.findtext("./subject")
+            ),
+            "volume": article_meta_issue.volume,
+            "number": article_meta_issue.number,
+            "suppl": article_meta_issue.suppl,
+            "fpage": article_meta_issue.fpage,
+            "fpage_seq": article_meta_issue.fpage_seq,
+            "lpage": article_meta_issue.lpage,
+            "elocation_id": article_meta_issue.elocation_id,
+            "collection_date": article_meta_issue.collection_date,
+            "article_date": ArticleDates(xmltree).article_date,
+            "article_titles_texts": [
+                item["text"] for item in ArticleTitles(xmltree).data if item["text"]
+            ],
+            "related_items": RelatedItems(xmltree).related_articles,
+        }
+
+    def _assert_equal_to_packtools(self, xml):
+        xmltree = etree.fromstring(xml)
+        self.assertEqual(
+            self._get_expected(xmltree),
+            xml_sps_metadata.extract_metadata(xmltree).as_dict(),
+        )
+
+    def test_extract_metadata_from_fixtures(self):
+        for path in (
+            "xmlsps/fixtures/artigo.xml.zip",
+            "pid_provider/fixtures/sub-article/2236-8906-hoehnea-49-e1082020.xml.zip",
+        ):
+            for item in xml_sps_lib.get_xml_items(path):
+                with self.subTest(item["filename"]):
+                    xmltree = item["xml_with_pre"].xmltree
+                    expected = self._get_expected(xmltree)
+                    result = xml_sps_metadata.extract_metadata(xmltree)
+                    self.assertEqual(expected, result.as_dict())
+                    self.assertEqual("2236-8906", result.issns["epub"])
+
+    def test_extract_metadata_aop(self):
+        self._assert_equal_to_packtools(
+            """
+            <article xml:lang="en">
+            <front>
+            <journal-meta><issn pub-type="epub">1234-0987</issn></journal-meta>
+            <article-meta>
+            <article-id pub-id-type="doi">10.1590/aop</article-id>
+            <title-group><article-title>Title <italic>AOP</italic></article-title>
+            </title-group>
+            <contrib-group>
+            <contrib><collab>Grupo</collab></contrib>
+            </contrib-group>
+            <pub-date date-type="pub"><day>9</day><month>1</month><year>2023</year>
+            </pub-date>
+            <elocation-id>e1</elocation-id>
+            </article-meta>
+            </front>
+            </article>
+            """
+        )
+
+    def test_extract_metadata_suppl_and_translations(self):
+        self._assert_equal_to_packtools(
+            """
+            <article xmlns:xlink="http://www.w3.org/1999/xlink" xml:lang="pt">
+            <front>
+            <journal-meta><issn pub-type="ppub">1234-0987</issn></journal-meta>
+            <article-meta>
+            <article-categories><subj-group subj-group-type="heading">
+            <subject>Artigos</subject></subj-group></article-categories>
+            <title-group><article-title>Título</article-title>
+            <trans-title-group xml:lang="en"><trans-title>Title</trans-title>
+            </trans-title-group></title-group>
+            <contrib-group><contrib><name><surname>Silva</surname>
+            <given-names>Ana</given-names></name></contrib></contrib-group>
+            <pub-date pub-type="collection"><year>2022</year></pub-date>
+            <volume>10</volume><issue>4 suppl 1</issue>
+            <fpage seq="a">1</fpage><lpage>10</lpage>
+            <related-article related-article-type="corrected-article"
+              ext-link-type="doi" xlink:href="10.1590/corrected"/>
+            </article-meta>
+            </front>
+            <body><p> </p><sec><p>Primeiro <bold>parágrafo</bold></p></sec></body>
+            <sub-article article-type="translation" xml:lang="es">
+            <front-stub><title-group><article-title>Título es</article-title>
+            </title-group></front-stub>
+            </sub-article>
+            </article>
+            """
+        )
@@ -0,0 +1,255 @@
+"""
+Obtenção do conteúdo de URI com conexões reutilizadas (get_session)
+e, para URI imutáveis, cache em memória e em disco (URIContentCache)
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LOGGER = logging.getLogger(__name__)
+
+# respostas que são tentadas novamente
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+# sessão e cache do processo (os processos criados por fork não
+# compartilham as conexões do processo pai)
+_pid = None
+_session = None
+_cache = None
+
+
+def get_session():
+    """
+    Sessão HTTP do processo, que mantém as conexões abertas (keep-alive),
+    com até XMLSPS_HTTP_POOL_SIZE conexões por host, e repete as requisições,
+    com espera exponencial, em caso de falha de conexão ou de resposta
+    RETRY_STATUS
+
+    O conteúdo é solicitado comprimido (Accept-Encoding: gzip, deflate)
+    e descomprimido por requests
+    """
+    global _pid, _session
+    with _lock:
+        if _session is None or _pid != os.getpid():
+            pool_size = getattr(settings, "XMLSPS_HTTP_POOL_SIZE", 10)
+            adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=Retry(
+                    total=getattr(settings, "XMLSPS_HTTP_MAX_RETRIES", 3),
+                    backoff_factor=getattr(settings, "XMLSPS_HTTP_BACKOFF_FACTOR", 0.5),
+                    status_forcelist=RETRY_STATUS,
+                    raise_on_status=False,
+                ),
+            )
+            session = requests.Session()
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _pid = os.getpid()
+            _session = session
+        return _session
+
+
+class URIContentCache:
+    """
+    Cache do conteúdo (bytes) de URI imutáveis, em memória, limitado
+    a `memory_size` bytes, e em disco (`directory`), limitado a `disk_size`
+    bytes, que descartam os conteúdos usados há mais tempo
+
+    Em disco, cada conteúdo é um arquivo cujo nome é o sha256 da URI e
+    cuja data de modificação é atualizada a cada uso; o diretório pode ser
+    compartilhado por vários processos
+    """
+
+    def __init__(self, memory_size, directory=None, disk_size=None):
+        self.memory_size = memory_size
+        self.directory = directory
+        self.disk_size = disk_size
+        self._items = OrderedDict()
+        self._memory_used = 0
+        # obtido do diretório na primeira gravação
+        self._disk_used = None
+        self._lock = threading.Lock()
+
+    def _path(self, uri):
+        name = hashlib.sha256(uri.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def get(self, uri):
+        """
+        Returns
+        -------
+        bytes or None
+        """
+        with self._lock:
+            try:
+                self._items.move_to_end(uri)
+                return self._items[uri]
+            except KeyError:
+                pass
+        if not self.directory:
+            return None
+        path = self._path(uri)
+        try:
+            with open(path, "rb") as fp:
+                content = fp.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            LOGGER.exception(e)
+            return None
+        self._set_in_memory(uri, content)
+        return content
+
+    def set(self, uri, content):
+        self._set_in_memory(uri, content)
+        if self.directory:
+            try:
+                self._set_in_disk(uri, content)
+            except OSError as e:
+                # o cache em disco não deve interromper a obtenção do conteúdo
+                LOGGER.exception(e)
+
+    def _set_in_memory(self, uri, content):
+        if len(content) > self.memory_size:
+            return
+        with self._lock:
+            previous = self._items.pop(uri, None)
+            if previous is not None:
+                self._memory_used -= len(previous)
+            self._items[uri] = content
+            self._memory_used += len(content)
+            while self._memory_used > self.memory_size:
+                oldest_uri, oldest = self._items.popitem(last=False)
+                self._memory_used -= len(oldest)
+
+    def _set_in_disk(self, uri, content):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(content)
+            os.replace(tmp_path, self._path(uri))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = self._get_disk_usage()[0]
+            else:
+                self._disk_used += len(content)
+            if self.disk_size and self._disk_used > self.disk_size:
+                self._evict()
+
+    def _get_disk_usage(self):
+        total = 0
+        entries = []
+        with os.scandir(self.directory) as items:
+            for item in items:
+                if item.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    # removido por outro processo
+                    continue
+                total += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, item.path))
+        return total, entries
+
+    def _evict(self):
+        # descarta os arquivos usados há mais tempo, até que o cache
+        # ocupe no máximo 90% de disk_size
+        total, entries = self._get_disk_usage()
+        limit = self.disk_size * 0.9
+        for mtime, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_used = total
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._memory_used = 0
+            self._disk_used = None
+            if not self.directory or not os.path.isdir(self.directory):
+                return
+            with os.scandir(self.directory) as items:
+                for item in items:
+                    try:
+                        os.unlink(item.path)
+                    except FileNotFoundError:
+                        pass
+
+
+def get_cache():
+    """
+    Cache do processo (URIContentCache), configurado por
+    XMLSPS_URI_CACHE_MEMORY_SIZE, XMLSPS_URI_CACHE_DIR
+    e XMLSPS_URI_CACHE_DISK_SIZE
+    """
+    global _cache
+    with _lock:
+        if _cache is None:
+            _cache = URIContentCache(
+                memory_size=getattr(
+                    settings, "XMLSPS_URI_CACHE_MEMORY_SIZE", 64 * 1024 * 1024
+                ),
+                directory=getattr(
+                    settings,
+                    "XMLSPS_URI_CACHE_DIR",
+                    os.path.join(tempfile.gettempdir(), "xmlsps_uri_cache"),
+                ),
+                disk_size=getattr(
+                    settings, "XMLSPS_URI_CACHE_DISK_SIZE", 1024 * 1024 * 1024
+                ),
+            )
+        return _cache
+
+
+def get_uri_content(uri, timeout=30, cache=False):
+    """
+    Obtém o conteúdo de `uri`
+
+    Arguments
+    ---------
+    uri : str
+    timeout : int
+    cache : bool
+        True somente para URI cujo conteúdo não se altera (por exemplo,
+        as de XMLVersion, cujo nome contém o sha256 do conteúdo)
+
+    Returns
+    -------
+    bytes
+
+    Raises
+    ------
+    requests.RequestException
+    """
+    if cache:
+        content = get_cache().get(uri)
+        if content is not None:
+            return content
+    response = get_session().get(uri, timeout=timeout)
+    response.raise_for_status()
+    content = response.content
+    if cache:
+        get_cache().set(uri, content)
+    return content
@@ -1,12 +1,16 @@
 import hashlib
 import logging
 import os
-from copy import deepcopy
+import re
+import struct
+import tempfile
+import time
+import zipfile
+from copy import copy, deepcopy
 from datetime import date, datetime
 from shutil import copyfile
-from zipfile import BadZipFile, ZipFile
+from zipfile import ZIP64_LIMIT, BadZipFile, ZipFile, ZipInfo
 
-import requests
 from django.utils.translation import gettext as _
 from lxml import etree
 from packtools.sps.models.article_assets import ArticleAssets, SupplementaryMaterials
@@ -18,8 +22,9 @@ from packtools.sps.models.article_titles import ArticleTitles
 from packtools.sps.models.body import Body
 from packtools.sps.models.dates import ArticleDates
 from packtools.sps.models.front_articlemeta_issue import ArticleMetaIssue
-from packtools.sps.models.front_journal_meta import ISSN
-from packtools.sps.models.related_articles import RelatedItems
+
+from xmlsps.uri_content import get_uri_content
+from xmlsps.xml_sps_metadata import extract_metadata
 
 LOGGER = logging.getLogger(__name__)
 LOGGER_FMT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
@@ -45,6 +50,52 @@ class XMLWithPreArticlePublicationDateError(Exception):
     ...
 
 
+# valor ainda não obtido (cached_property)
+_NOT_CACHED = object()
+
+
+class cached_property:
+    """
+    Propriedade cujo valor é obtido uma única vez e mantido no atributo
+    `_<nome>` do objeto, inclusive quando vazio ou None
+
+    O valor é descartado somente pelo setter da propriedade, se houver,
+    ou por clear_cached_properties
+    """
+
+    def __init__(self, fget, fset=None):
+        self.fget = fget
+        self.fset = fset
+        self.attrname = f"_{fget.__name__}"
+        self.__doc__ = fget.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.attrname, _NOT_CACHED)
+        if value is _NOT_CACHED:
+            value = self.fget(instance)
+            instance.__dict__[self.attrname] = value
+        return value
+
+    def __set__(self, instance, value):
+        if self.fset is None:
+            raise AttributeError(f"can't set attribute {self.fget.__name__}")
+        self.fset(instance, value)
+        instance.__dict__.pop(self.attrname, None)
+
+    def setter(self, fset):
+        return type(self)(self.fget, fset)
+
+
+def clear_cached_properties(instance, *names):
+    """
+    Descarta os valores das propriedades `names` (cached_property) de `instance`
+    """
+    for name in names:
+        instance.__dict__.pop(f"_{name}", None)
+
+
 def get_xml_items(xml_sps_file_path, filenames=None):
     """
     Get XML items from XML file or Zip file
@@ -66,7 +117,7 @@ def get_xml_items(xml_sps_file_path, filenames=None):
         if ext == ".zip":
             return get_xml_items_from_zip_file(xml_sps_file_path, filenames)
         if ext == ".xml":
-            with open(xml_sps_file_path) as fp:
+            with open(xml_sps_file_path, "rb") as fp:
                 xml = get_xml_with_pre(fp.read())
                 item = os.path.basename(xml_sps_file_path)
             return [{"filename": item, "xml_with_pre": xml}]
@@ -98,14 +149,10 @@ def get_xml_items_from_zip_file(xml_sps_file_path, filenames=None):
     str
     """
     try:
-        with ZipFile(xml_sps_file_path) as zf:
-            filenames = filenames or zf.namelist() or []
-            for item in filenames:
-                if item.endswith(".xml"):
-                    yield {
-                        "filename": item,
-                        "xml_with_pre": get_xml_with_pre(zf.read(item).decode("utf-8")),
-                    }
+        for item in get_xml_raw_items_from_zip_file(xml_sps_file_path, filenames):
+            xml_with_pre = get_xml_with_pre(item["content"])
+            xml_with_pre.raw_finger_print = item["raw_finger_print"]
+            yield {"filename": item["filename"], "xml_with_pre": xml_with_pre}
     except Exception as e:
         LOGGER.exception(e)
         raise GetXMLItemsFromZipFileError(
@@ -115,30 +162,178 @@ def get_xml_items_from_zip_file(xml_sps_file_path, filenames=None):
         )
 
 
+def get_xml_raw_items_from_zip_file(xml_sps_file_path, filenames=None):
+    """
+    Return the XML contents (bytes) of the Zip file, without parsing them.
+
+    Arguments
+    ---------
+        xml_sps_file_path: str
+        filenames: str list
+
+    Return
+    ------
+    dict iterator which keys are filename, content and raw_finger_print
+    """
+    with ZipFile(xml_sps_file_path) as zf:
+        filenames = filenames or zf.namelist() or []
+        for item in filenames:
+            if item.endswith(".xml"):
+                content = zf.read(item)
+                yield {
+                    "filename": item,
+                    "content": content,
+                    "raw_finger_print": get_raw_finger_print(content),
+                }
+
+
+def get_raw_finger_print(content):
+    """
+    Return the sha256 of the XML content exactly as received (bytes)
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_xml_zip_filenames(xml_sps_file_path):
+    """
+    Return the XML file names of the Zip file.
+
+    Arguments
+    ---------
+        xml_sps_file_path: str
+
+    Return
+    ------
+    str list
+    """
+    with ZipFile(xml_sps_file_path) as zf:
+        return [item for item in zf.namelist() if item.endswith(".xml")]
+
+
 def update_zip_file_xml(xml_sps_file_path, xml_file_path, content):
     """
-    Save XML content in a Zip file.
-    Return saved zip file path
+    Substitui o conteúdo do XML `xml_file_path` do arquivo compactado
+    (ou o acrescenta, se ausente), mantendo os demais arquivos
+
+    Os demais arquivos são copiados sem serem descompactados e recompactados
+    (copy_zip_member) para um arquivo temporário, no mesmo diretório,
+    que substitui o original somente ao final (os.replace)
 
     Arguments
     ---------
         xml_sps_file_path: str
+        xml_file_path: str
         content: bytes
 
     Return
     ------
-    str
+    bool
     """
-    with ZipFile(xml_sps_file_path, "w") as zf:
-        LOGGER.debug(
-            "Try to write xml %s %s %s"
-            % (xml_sps_file_path, xml_file_path, content[:100])
-        )
-        zf.writestr(xml_file_path, content)
-
+    LOGGER.debug(
+        "Try to write xml %s %s %s" % (xml_sps_file_path, xml_file_path, content[:100])
+    )
+    if not os.path.isfile(xml_sps_file_path):
+        with ZipFile(xml_sps_file_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(xml_file_path, content)
+        return os.path.isfile(xml_sps_file_path)
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(xml_sps_file_path)), suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        with ZipFile(xml_sps_file_path) as source, ZipFile(tmp_path, "w") as target:
+            target.comment = source.comment
+            replaced = False
+            for info in source.infolist():
+                if info.filename != xml_file_path:
+                    copy_zip_member(source, target, info)
+                    continue
+                zinfo = ZipInfo(xml_file_path, time.localtime(time.time())[:6])
+                zinfo.compress_type = info.compress_type
+                zinfo.external_attr = info.external_attr
+                target.writestr(zinfo, content)
+                replaced = True
+            if not replaced:
+                target.writestr(
+                    xml_file_path, content, compress_type=zipfile.ZIP_DEFLATED
+                )
+        os.chmod(tmp_path, os.stat(xml_sps_file_path).st_mode)
+        os.replace(tmp_path, xml_sps_file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
     return os.path.isfile(xml_sps_file_path)
 
 
+# cabeçalho local dos arquivos compactados
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+# extra field zip64
+_ZIP64_EXTRA_ID = 1
+# data descriptor (CRC e tamanhos após o conteúdo)
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def copy_zip_member(source, target, info):
+    """
+    Copia o arquivo `info` de `source` (ZipFile aberto para leitura)
+    para `target` (ZipFile aberto para escrita) sem descompactá-lo
+    e recompactá-lo
+
+    zipfile não oferece a cópia do conteúdo compactado, então o cabeçalho
+    local é gravado diretamente em target.fp e `info` é incluído nos
+    registros de target, que compõem o diretório central ao final
+    """
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        raise BadZipFile(f"Truncated file header: {info.filename}")
+    header = struct.unpack(zipfile.structFileHeader, header)
+    # o tamanho de extra do cabeçalho local pode ser diferente do
+    # registrado no diretório central
+    source.fp.seek(
+        info.header_offset
+        + zipfile.sizeFileHeader
+        + header[_FH_FILENAME_LENGTH]
+        + header[_FH_EXTRA_FIELD_LENGTH]
+    )
+
+    zinfo = copy(info)
+    zinfo.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    zinfo.extra = _remove_extra_field(info.extra, _ZIP64_EXTRA_ID)
+    zinfo.header_offset = target.fp.tell()
+    zip64 = info.file_size > ZIP64_LIMIT or info.compress_size > ZIP64_LIMIT
+    target.fp.write(zinfo.FileHeader(zip64))
+
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.fp.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise BadZipFile(f"Truncated file data: {info.filename}")
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+
+
+def _remove_extra_field(extra, field_id):
+    # extra: sequência de (id, tamanho, dados)
+    items = []
+    i = 0
+    while i + 4 <= len(extra):
+        _id, size = struct.unpack("<HH", extra[i : i + 4])
+        if _id != field_id:
+            items.append(extra[i : i + 4 + size])
+        i += 4 + size
+    return b"".join(items)
+
+
 def create_xml_zip_file(xml_sps_file_path, content):
     """
     Save XML content in a Zip file.
@@ -169,17 +364,37 @@ def create_xml_zip_file(xml_sps_file_path, content):
     return os.path.isfile(xml_sps_file_path)
 
 
-def get_xml_with_pre_from_uri(uri, timeout=30):
+def get_xml_with_pre_from_uri(uri, timeout=30, cache=False):
+    """
+    Obtém XMLWithPre do XML de `uri`
+
+    Arguments
+    ---------
+    uri : str
+    timeout : int
+    cache : bool
+        True somente para URI cujo conteúdo não se altera
+        (uri_content.get_uri_content)
+    """
     try:
-        response = requests.get(uri, timeout=timeout)
-        xml_content = response.content.decode("utf-8")
+        xml_content = get_uri_content(uri, timeout=timeout, cache=cache)
     except Exception as e:
         raise GetXmlWithPreFromURIError(_("Unable to get xml from {}").format(uri))
     return get_xml_with_pre(xml_content)
 
 
 def get_xml_with_pre(xml_content):
+    """
+    Arguments
+    ---------
+    xml_content : str or bytes-like (bytes, bytearray, memoryview)
+        o conteúdo em bytes é processado sem ser decodificado e copiado
+        (get_xml_with_pre_from_bytes)
+    """
     try:
+        if not isinstance(xml_content, str):
+            return get_xml_with_pre_from_bytes(xml_content)
+
         # return etree.fromstring(xml_content)
         pref, xml = split_processing_instruction_doctype_declaration_and_xml(
             xml_content
@@ -227,6 +442,59 @@ def split_processing_instruction_doctype_declaration_and_xml(xml_content):
     return "", xml_content
 
 
+# declaração XML, instruções de processamento, comentários e DOCTYPE
+# (com ou sem subconjunto interno) anteriores ao elemento root
+PROLOG = re.compile(
+    rb"(?:\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE(?:[^\[>]|\[.*?\])*>)*", re.DOTALL
+)
+BOM = b"\xef\xbb\xbf"
+
+
+class _BufferReader:
+    """
+    Leitura em partes de um bytes-like, sem copiá-lo integralmente,
+    para etree.parse (etree.fromstring aceita somente str e bytes)
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        self.position = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self.buffer) - self.position
+        chunk = self.buffer[self.position : self.position + size]
+        self.position += len(chunk)
+        return bytes(chunk)
+
+
+def get_xml_with_pre_from_bytes(xml_content):
+    """
+    Obtém XMLWithPre do conteúdo XML em bytes, sem decodificá-lo:
+    o lxml obtém a codificação da declaração XML e o texto anterior
+    ao elemento root (xmlpre) é identificado em uma única leitura do prólogo
+
+    Arguments
+    ---------
+    xml_content : bytes-like (bytes, bytearray, memoryview)
+
+    Returns
+    -------
+    XMLWithPre
+    """
+    start = len(BOM) if xml_content[: len(BOM)] == BOM else 0
+    end = PROLOG.match(xml_content, start).end()
+
+    if isinstance(xml_content, bytes):
+        xmltree = etree.fromstring(xml_content)
+    else:
+        xmltree = etree.parse(_BufferReader(xml_content)).getroot()
+
+    xmlpre = bytes(xml_content[start:end]).lstrip()
+    xmlpre = xmlpre.decode(xmltree.getroottree().docinfo.encoding) if xmlpre else ""
+    return XMLWithPre(xmlpre, xmltree)
+
+
 class XMLWithPre:
     """
     Preserva o texto anterior ao elemento `root`
@@ -235,6 +503,16 @@ class XMLWithPre:
     def __init__(self, xmlpre, xmltree):
         self.xmlpre = xmlpre or ""
         self.xmltree = xmltree
+        # sha256 do conteúdo original, quando obtido de arquivo compactado
+        self.raw_finger_print = None
+
+    @cached_property
+    def metadata(self):
+        """
+        Dados usados pelo pid provider, obtidos em uma única leitura
+        da árvore (xml_sps_metadata.XMLMetadata)
+        """
+        return extract_metadata(self.xmltree)
 
     @property
     def article_id_parent(self):
@@ -253,23 +531,43 @@ class XMLWithPre:
             front.append(parent)
             return parent
 
+    @property
+    def encoding(self):
+        """
+        Codificação declarada no XML (UTF-8, se ausente)
+        """
+        return self.xmltree.getroottree().docinfo.encoding or "utf-8"
+
     def tostring(self):
         return self.xmlpre + etree.tostring(self.xmltree, encoding="utf-8").decode(
             "utf-8"
         )
 
+    def tobytes(self):
+        """
+        Retorna o XML em bytes, na codificação declarada (encoding),
+        mantendo o texto anterior ao elemento root
+        """
+        encoding = self.encoding
+        return self.xmlpre.encode(encoding) + etree.tostring(
+            self.xmltree, encoding=encoding, xml_declaration=False
+        )
+
     def update_ids(self, v3, v2, aop_pid):
         """
         Atualiza todos os elementos article-id (v2, v3, aop_pid)
         """
-        self.article_ids.v3 = v3
-        self.article_ids.v2 = v2
-        if aop_pid:
-            self.article_ids.aop_pid = aop_pid
+        try:
+            self.article_ids.v3 = v3
+            self.article_ids.v2 = v2
+            if aop_pid:
+                self.article_ids.aop_pid = aop_pid
+        finally:
+            clear_cached_properties(self, "v3", "v2", "aop_pid")
 
     @property
     def related_items(self):
-        return RelatedItems(self.xmltree).related_articles
+        return self.metadata.related_items
 
     @property
     def links(self):
@@ -279,15 +577,15 @@ class XMLWithPre:
     def article_ids(self):
         return ArticleIds(self.xmltree)
 
-    @property
+    @cached_property
     def v3(self):
         return self.article_ids.v3
 
-    @property
+    @cached_property
     def v2(self):
         return self.article_ids.v2
 
-    @property
+    @cached_property
     def aop_pid(self):
         return self.article_ids.aop_pid
 
@@ -362,25 +660,14 @@ class XMLWithPre:
             f"S{self.journal_issn_electronic or self.journal_issn_print}{self.pub_year}"
         )
 
-    @property
+    @cached_property
     def article_doi_with_lang(self):
-        if (
-            not hasattr(self, "_article_doi_with_lang")
-            or not self._article_doi_with_lang
-        ):
-            # [{"lang": "en", "value": "DOI"}]
-            doi_with_lang = DoiWithLang(self.xmltree)
-            self._main_doi = doi_with_lang.main_doi
-            self._article_doi_with_lang = doi_with_lang.data
-        return self._article_doi_with_lang
+        # [{"lang": "en", "value": "DOI"}]
+        return DoiWithLang(self.xmltree).data
 
     @property
     def main_doi(self):
-        if not hasattr(self, "_main_doi") or not self._main_doi:
-            # [{"lang": "en", "value": "DOI"}]
-            doi_with_lang = DoiWithLang(self.xmltree)
-            self._main_doi = doi_with_lang.main_doi
-        return self._main_doi
+        return self.metadata.main_doi
 
     @property
     def main_toc_section(self):
@@ -389,198 +676,126 @@ class XMLWithPre:
             <subject>Articles</subject>
         </subj-group>
         """
-        if not hasattr(self, "_main_toc_section") or not self._main_toc_section:
-            # [{"lang": "en", "value": "DOI"}]
-            node = self.xmltree.find('.//subj-group[@subj-group-type="heading"]')
-            if node is None:
-                self._main_toc_section = None
-            else:
-                self._main_toc_section = node.findtext("./subject")
-        return self._main_toc_section
+        return self.metadata.main_toc_section
 
     @property
     def issns(self):
-        if not hasattr(self, "_issns") or not self._issns:
-            # [{"type": "epub", "value": "1234-9876"}]
-            issns = ISSN(self.xmltree)
-            self._issns = {item["type"]: item["value"] for item in issns.data}
-        return self._issns
+        # {"epub": "1234-9876", "ppub": "0987-1234"}
+        return self.metadata.issns
 
     @property
     def is_aop(self):
-        if not hasattr(self, "_is_aop") or not self._is_aop:
-            items = (
-                self.article_meta_issue.volume,
-                self.article_meta_issue.number,
-                self.article_meta_issue.suppl,
-            )
-            self._is_aop = not any(items)
-        return self._is_aop
+        return not any((self.volume, self.number, self.suppl))
 
-    @property
+    @cached_property
     def xml_dates(self):
-        if not hasattr(self, "_xml_dates") or not self._xml_dates:
-            # ("year", "month", "season", "day")
-            self._xml_dates = ArticleDates(self.xmltree)
-        return self._xml_dates
+        # ("year", "month", "season", "day")
+        return ArticleDates(self.xmltree)
 
-    @property
+    @cached_property
     def article_meta_issue(self):
         # artigos podem ser publicados sem estarem associados a um fascículo
         # Neste caso, não há volume, número, suppl, fpage, fpage_seq, lpage
         # Mas deve ter ano de publicação em qualquer caso
-        if not hasattr(self, "_article_meta_issue") or not self._article_meta_issue:
-            self._article_meta_issue = ArticleMetaIssue(self.xmltree)
-        return self._article_meta_issue
+        return ArticleMetaIssue(self.xmltree)
 
     @property
     def volume(self):
-        if not hasattr(self, "_volume") or not self._volume:
-            self._volume = self.article_meta_issue.volume
-        return self._volume
+        return self.metadata.volume
 
     @property
     def number(self):
-        if not hasattr(self, "_number") or not self._number:
-            self._number = self.article_meta_issue.number
-        return self._number
+        return self.metadata.number
 
     @property
     def suppl(self):
-        if not hasattr(self, "_suppl") or not self._suppl:
-            self._suppl = self.article_meta_issue.suppl
-        return self._suppl
+        return self.metadata.suppl
 
     @property
     def fpage(self):
-        if not hasattr(self, "_fpage") or not self._fpage:
-            self._fpage = self.article_meta_issue.fpage
-        return self._fpage
+        return self.metadata.fpage
 
     @property
     def fpage_seq(self):
-        if not hasattr(self, "_fpage_seq") or not self._fpage_seq:
-            self._fpage_seq = self.article_meta_issue.fpage_seq
-        return self._fpage_seq
+        return self.metadata.fpage_seq
 
     @property
     def lpage(self):
-        if not hasattr(self, "_lpage") or not self._lpage:
-            self._lpage = self.article_meta_issue.lpage
-        return self._lpage
+        return self.metadata.lpage
 
     @property
     def elocation_id(self):
-        if not hasattr(self, "_elocation_id") or not self._elocation_id:
-            self._elocation_id = self.article_meta_issue.elocation_id
-        return self._elocation_id
+        return self.metadata.elocation_id
 
     @property
     def pub_year(self):
-        if not hasattr(self, "_pub_year") or not self._pub_year:
-            try:
-                self._pub_year = self.article_meta_issue.collection_date.get("year")
-            except AttributeError:
-                return None
-        return self._pub_year
+        return self.metadata.collection_date.get("year")
 
-    @property
+    @cached_property
     def authors(self):
-        if not hasattr(self, "_authors") or not self._authors:
-            authors = Authors(self.xmltree)
-            self._authors = {
-                "person": authors.contribs,
-                "collab": authors.collab or None,
-            }
-        return self._authors
+        authors = Authors(self.xmltree)
+        return {
+            "person": authors.contribs,
+            "collab": authors.collab or None,
+        }
 
-    @property
+    @cached_property
     def article_titles(self):
-        if not hasattr(self, "_article_titles") or not self._article_titles:
-            # list of dict which keys are lang and text
-            article_titles = ArticleTitles(self.xmltree)
-            self._article_titles = article_titles.data
-        return self._article_titles
+        # list of dict which keys are lang and text
+        return ArticleTitles(self.xmltree).data
 
-    @property
+    @cached_property
     def partial_body(self):
-        if not hasattr(self, "_partial_body") or not self._partial_body:
-            self._partial_body = None
-            try:
-                body = Body(self.xmltree)
-                for text in body.main_body_texts:
-                    if text:
-                        self._partial_body = text
-                        break
-            except AttributeError:
-                self._partial_body = None
-        return self._partial_body
+        # primeiro texto não vazio de body (packtools), que compõe
+        # z_partial_body dos documentos registrados
+        try:
+            for text in Body(self.xmltree).main_body_texts:
+                if text:
+                    return text
+        except AttributeError:
+            pass
+        return None
 
     @property
     def collab(self):
-        if not hasattr(self, "_collab") or not self._collab:
-            self._collab = self.authors.get("collab")
-        return self._collab
+        return self.authors.get("collab")
 
     @property
     def journal_issn_print(self):
-        if not hasattr(self, "_journal_issn_print") or not self._journal_issn_print:
-            # list of dict which keys are
-            # href, ext-link-type, related-article-type
-            self._journal_issn_print = self.issns.get("ppub")
-        return self._journal_issn_print
+        return self.issns.get("ppub")
 
     @property
     def journal_issn_electronic(self):
-        if (
-            not hasattr(self, "_journal_issn_electronic")
-            or not self._journal_issn_electronic
-        ):
-            # list of dict which keys are
-            # href, ext-link-type, related-article-type
-            self._journal_issn_electronic = self.issns.get("epub")
-        return self._journal_issn_electronic
+        return self.issns.get("epub")
 
-    @property
+    @cached_property
     def article_publication_date(self):
-        if (
-            not hasattr(self, "_article_publication_date")
-            or not self._article_publication_date
-        ):
-            # ("year", "month", "season", "day")
-            self._article_publication_date = None
-            _date = self.xml_dates.article_date
-            if _date:
-                try:
-                    d = date(
-                        int(_date["year"]),
-                        int(_date["month"]),
-                        int(_date["day"]),
-                    )
-                except (ValueError, TypeError, KeyError) as e:
-                    raise XMLWithPreArticlePublicationDateError(
-                        _(
-                            "Unable to get XMLWithPre.article_publication_date {} {} {}"
-                        ).format(_date, type(e), e)
-                    )
-                else:
-                    self._article_publication_date = f"{_date['year']}-{_date['month'].zfill(2)}-{_date['day'].zfill(2)}"
-        return self._article_publication_date
+        # ("year", "month", "season", "day")
+        _date = self.metadata.article_date
+        if not _date:
+            return None
+        try:
+            d = date(
+                int(_date["year"]),
+                int(_date["month"]),
+                int(_date["day"]),
+            )
+        except (ValueError, TypeError, KeyError) as e:
+            raise XMLWithPreArticlePublicationDateError(
+                _("Unable to get XMLWithPre.article_publication_date {} {} {}").format(
+                    _date, type(e), e
+                )
+            )
+        return f"{_date['year']}-{_date['month'].zfill(2)}-{_date['day'].zfill(2)}"
 
-    @property
+    @cached_property
     def article_pub_year(self):
-        if not hasattr(self, "_article_pub_year") or not self._article_pub_year:
-            # ("year", "month", "season", "day")
-            try:
-                self._article_pub_year = self.xml_dates.article_date["year"]
-            except (ValueError, TypeError, KeyError) as e:
-                return None
-        return self._article_pub_year
+        # ("year", "month", "season", "day")
+        try:
+            return self.metadata.article_date["year"]
+        except (ValueError, TypeError, KeyError) as e:
+            return None
 
     @property
     def article_titles_texts(self):
-        if not hasattr(self, "_article_titles_texts") or not self._article_titles_texts:
-            self._article_titles_texts = [
-                item["text"] for item in self.article_titles if item["text"]
-            ]
-        return self._article_titles_texts
+        return self.metadata.article_titles_texts
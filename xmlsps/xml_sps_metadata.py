@@ -0,0 +1,205 @@
+"""
+Dados do XML usados pelo pid provider, obtidos em uma única leitura da árvore
+
+Equivalem aos obtidos com os modelos de packtools (ISSN, ArticleMetaIssue,
+ArticleDates, ArticleTitles, DoiWithLang e RelatedItems), que percorrem
+a árvore a cada propriedade
+
+Os autores (surnames, collab) e o início do texto (partial_body) continuam
+sendo obtidos com packtools (Authors e Body, em XMLWithPre), pois as regras
+de packtools para contrib sem name, collab e parágrafos vazios compõem
+os identificadores (z_*) dos documentos já registrados
+"""
+from lxml import etree
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# elementos a partir dos quais os dados são obtidos (_ANCHOR_TAGS),
+# localizados em uma única leitura da árvore
+_ANCHOR_TAGS = (
+    "journal-meta",
+    "article-meta",
+    "subj-group",
+    "related-article",
+    "sub-article",
+)
+
+# consultas relativas aos elementos de _ANCHOR_TAGS
+_ISSNS = etree.XPath(".//issn")
+_SUB_ARTICLE_TITLES = etree.XPath(".//front-stub//article-title")
+
+# filhos de article-meta com texto
+_ARTICLE_META_TEXTS = {
+    "volume": "volume",
+    "issue": "issue",
+    "supplement": "supplement",
+    "fpage": "fpage",
+    "lpage": "lpage",
+    "elocation-id": "elocation_id",
+}
+
+_DATE_PARTS = ("year", "month", "season", "day")
+
+
+class XMLMetadata:
+    """
+    Dados do XML usados pelo pid provider (extract_metadata)
+    """
+
+    __slots__ = (
+        "issns",
+        "main_doi",
+        "main_toc_section",
+        "volume",
+        "number",
+        "suppl",
+        "fpage",
+        "fpage_seq",
+        "lpage",
+        "elocation_id",
+        "collection_date",
+        "article_date",
+        "article_titles_texts",
+        "related_items",
+    )
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def __repr__(self):
+        return f"XMLMetadata({self.as_dict()})"
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def extract_metadata(xmltree):
+    """
+    Obtém de `xmltree` os dados usados pelo pid provider
+
+    Os elementos journal-meta, front/article-meta, subj-group (heading),
+    related-article e sub-article (translation) são localizados em uma
+    única leitura da árvore e os dados são obtidos somente destes elementos
+
+    Returns
+    -------
+    XMLMetadata
+    """
+    texts = dict.fromkeys(_ARTICLE_META_TEXTS.values())
+    issns = {}
+    main_doi = None
+    main_toc_section = None
+    has_toc_section = False
+    fpage_seq = None
+    collection_date = None
+    article_date = None
+    titles = []
+    trans_titles = []
+    sub_article_titles = []
+    related_items = []
+
+    for node in xmltree.iter(_ANCHOR_TAGS):
+        tag = node.tag
+        if tag == "article-meta":
+            parent = node.getparent()
+            if parent is None or parent.tag != "front":
+                continue
+            for child in node:
+                child_tag = child.tag
+                name = _ARTICLE_META_TEXTS.get(child_tag)
+                if name:
+                    if texts[name] is None:
+                        texts[name] = child.text or ""
+                        if child_tag == "fpage":
+                            fpage_seq = child.get("seq") or None
+                elif child_tag == "article-id":
+                    if main_doi is None and child.get("pub-id-type") == "doi":
+                        main_doi = child.text or ""
+                elif child_tag == "pub-date":
+                    date_type = child.get("date-type")
+                    pub_type = child.get("pub-type")
+                    if article_date is None and (
+                        date_type == "pub" or pub_type == "epub"
+                    ):
+                        article_date = _get_date(child)
+                    if collection_date is None and (
+                        date_type == "collection" or pub_type == "collection"
+                    ):
+                        collection_date = _get_date(child)
+                elif child_tag == "title-group":
+                    for item in child:
+                        if item.tag == "article-title":
+                            titles.append(_normalize(item.itertext()))
+                        elif item.tag == "trans-title-group":
+                            trans_titles.append(
+                                _normalize(item.findtext("trans-title") or "")
+                            )
+        elif tag == "journal-meta":
+            for item in _ISSNS(node):
+                issns[item.get("pub-type")] = item.text
+        elif tag == "subj-group":
+            if not has_toc_section and node.get("subj-group-type") == "heading":
+                has_toc_section = True
+                main_toc_section = node.findtext("./subject")
+        elif tag == "related-article":
+            related_items.append(
+                {
+                    "href": node.get(XLINK_HREF),
+                    "ext-link-type": node.get("ext-link-type"),
+                    "related-article-type": node.get("related-article-type"),
+                }
+            )
+        elif node.get("article-type") == "translation":
+            for item in _SUB_ARTICLE_TITLES(node):
+                sub_article_titles.append(_normalize(item.itertext()))
+
+    number, suppl = _get_number_and_suppl(texts["issue"], texts["supplement"])
+    return XMLMetadata(
+        issns=issns,
+        main_doi=main_doi,
+        main_toc_section=main_toc_section,
+        volume=texts["volume"],
+        number=number,
+        suppl=suppl,
+        fpage=texts["fpage"],
+        fpage_seq=fpage_seq,
+        lpage=texts["lpage"],
+        elocation_id=texts["elocation_id"],
+        collection_date=collection_date or {},
+        article_date=article_date,
+        article_titles_texts=[
+            text for text in titles + trans_titles + sub_article_titles if text
+        ],
+        related_items=related_items,
+    )
+
+
+def _normalize(texts):
+    return " ".join("".join(texts).split())
+
+
+def _get_date(node):
+    date = {}
+    for name in _DATE_PARTS:
+        value = node.findtext(name)
+        if value:
+            date[name] = value
+    return date
+
+
+def _get_number_and_suppl(issue, supplement):
+    """
+    Obtém número e suplemento de issue ("4", "4 suppl 1", "suppl 1", ...)
+    e supplement
+    """
+    number = issue
+    suppl = supplement or None
+    if issue and "suppl" in issue.lower():
+        parts = issue.split()
+        number = parts[0] if "sup" not in parts[0].lower() else None
+        if not suppl:
+            suppl = (
+                parts[-1] if len(parts) > 1 and "sup" not in parts[-1].lower() else "0"
+            )
+    return number, suppl